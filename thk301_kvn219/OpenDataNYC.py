@@ -14,18 +14,67 @@ import matplotlib.pyplot as plt
 from matplotlib import rcParams
 import numpy as np
 import sys
+import os
+import shutil
+import tempfile
 
+from keeperStore import KeeperStore     #keeperStore.py
+from analysisGraph import LazyAnalysis, step     #analysisGraph.py
+from aggregationEngine import ViolationAggregates, shardedAggregates     #aggregationEngine.py
+from chartCache import PREVIEW, drawnWith     #chartCache.py
+from timeline import InspectionTimeline     #timeline.py
+from stageTimer import stage     #stageTimer.py
+import frameCleaner     #frameCleaner.py
+from topIndex import TopIndex     #topIndex.py
+from heatGrid import SparseGrid, gridPlotter, tickLabels     #heatGrid.py
+from compactTable import extendedColumn     #compactTable.py
 
 
-class RestaurantData(object):
+CHART_FILES = {"AssessPopularRestaurantsViolations": "AssessPopularRestaurantsViolations", "RiskyHotSpots": "Heatmap",
+               "AssessPopularCuisinesViolations": "AssessPopularCuisinesViolations", "plotUserRestaurantGradeAndScore": "UserRestaurantAndScore",
+               "plotUserCuisineAndCriticalFlag": "UserCuisinesAndScore"}     #chart method -> name of its file
+
+
+def chartExtension(outputPath):
+
+    """File format of a chart, from the extension of `outputPath`."""
+
+    return os.path.splitext(outputPath)[1][1:].lower() or rcParams["savefig.format"]
+
+
+def chartShower(previewPath):
+
+    """Show a chart rendered earlier (an image file) in a window of the same size."""
+
+    image = plt.imread(previewPath)
+    plt.figure(figsize=(image.shape[1] / 100.0, image.shape[0] / 100.0), dpi=100)
+    plt.imshow(image)
+    plt.axis("off")
+    plt.subplots_adjust(left=0, right=1, bottom=0, top=1)
+    plt.show()
+    plt.close("all")
+
+
+def cleanFrame(nyc_data, rules=frameCleaner.CLEANING_RULES):
+
+    """Clean a dataframe of inspection rows (see RestaurantData.setUpNYCRestaurantData) with the rules of frameCleaner.py."""
+
+    return frameCleaner.cleanFrame(nyc_data, rules)
+
+
+class RestaurantData(LazyAnalysis):
 
     '''
     RestaurantData performs the analysis and visualization for the
     the program (both user input and overall NYC restaurant inspection
     data from 2013-01-02 to 2014-12-31).
+
+    The analysis steps are evaluated lazily (analysisGraph.py): a plot only computes
+    the steps it needs, the first time it needs them, and a step is computed again only
+    after its inputs changed (e.g. new data given to setNYCData()).
     '''
 
-    def __init__(self, clean_nyc_restaurant_data):
+    def __init__(self, clean_nyc_restaurant_data, chart_cache=None, workers=1):
 
         """RestaurantData constructor.
 
@@ -43,11 +92,74 @@ class RestaurantData(object):
           nyc_data (Pandas DataFrame): `nyc_data` is a pandas dataframe that is used in this class to represent New City's overall resurants inspection data from 2013-01-02 to 2014-12-31.
           user_restaurant_list (Pandas DataFrame): 'user_restaurant_list' is data scraped from www.yelp.com and merged with DOHMH_New_York_City_Restaurant_Inspection_Results.csv data into a Pandas DataFrame.
           clean_nyc_restaurant_data (None): `clean_nyc_restaurant_data` will be used as a global variable for exploratory analysis after it is prepared with the method setUpNYCRestaurantData().
+          chart_cache (ChartCache): rendered charts are kept there and reused while their data and code do not change (chartCache.py), None renders every time.
+          workers (int): processes aggregating a large dataset in blocks of rows (aggregationEngine.shardedAggregates), None uses every core.
+          keeper (KeeperStore): the Restaurant Keeper of the user charts, set by restaurant.py. While it is None a chart opens the default store and closes it.
+
+        """
+        LazyAnalysis.__init__(self)
+        self.setInput("nyc_data", clean_nyc_restaurant_data)
+        self.clean_nyc_restaurant_data = None
+        self.chart_cache = chart_cache
+        self.workers = workers
+        self.keeper = None
 
+    def setNYCData(self, nyc_data):
+
+        """Replace the inspection data, every derived result is computed again on next use."""
+
+        self.setInput("nyc_data", nyc_data)
+
+    def useAggregates(self, aggregates):
+
+        """Analyse aggregates computed elsewhere (e.g. by streamReader.py from a file read in chunks) instead of inspection rows.
+
+        The charts of the city data only need the aggregates; the steps that need the rows themselves are not available.
         """
-        self.nyc_data = clean_nyc_restaurant_data
+
+        self.setInput("nyc_data", None)
         self.clean_nyc_restaurant_data = None
+        self.markComputed("clean_nyc_restaurant_data")
+        self.aggregates = aggregates
+        self.markComputed("aggregates")
 
+    def applyDelta(self, nyc_data, replaced, replacedRows, replacingRows, addedRows):
+
+        """Bring the clean data and the aggregates up to date with new or changed inspection rows.
+
+        Only the delta rows are cleaned and aggregated: the rows they replace are subtracted from
+        the aggregates and the new rows are added. The clean columns grow by the delta rows
+        (compactTable.extendedColumn), a column they do not change is kept as it is. Results derived
+        from the aggregates (top 20 list, mean scores) are recomputed from them on next use.
+
+        Args:
+          nyc_data (Pandas DataFrame): the updated inspection data, `replaced` rows overwritten and `addedRows` appended.
+          replaced (np.array): positions of the changed rows.
+          replacedRows (Pandas DataFrame): the changed rows before the change.
+          replacingRows (Pandas DataFrame): the changed rows after the change.
+          addedRows (Pandas DataFrame): rows that are new.
+
+        """
+        if self.seen.get("aggregates") is None or self.isStale("aggregates"):     #nothing computed yet, no need to update
+            self.setNYCData(nyc_data)
+            return
+
+        clean_replacing = cleanFrame(replacingRows)
+        clean_added = cleanFrame(addedRows)
+        self.aggregates.merge(ViolationAggregates.fromFrame(cleanFrame(replacedRows)), sign=-1)
+        self.aggregates.merge(ViolationAggregates.fromFrame(pd.concat([clean_replacing, clean_added])))
+
+        clean = self.clean_nyc_restaurant_data
+        names = [column for column in clean.columns if column in clean_added.columns]     #columns added by later steps are computed again
+        columns = dict((column, extendedColumn(clean[column].values, replaced, clean_replacing[column].values, clean_added[column].values))
+                       for column in names)
+        self.clean_nyc_restaurant_data = pd.DataFrame(columns, index=xrange(len(clean) + len(clean_added)), columns=names)
+
+        self.setInput("nyc_data", nyc_data)
+        self.markComputed("clean_nyc_restaurant_data")     #both are up to date with the new nyc_data
+        self.markComputed("aggregates")
+
+    @step("clean_nyc_restaurant_data", "nyc_data")
     def setUpNYCRestaurantData(self):
 
         """Set up Restaurant Inspection Results data for analysis.
@@ -61,24 +173,25 @@ class RestaurantData(object):
 
         """
 
-        self.nyc_data = self.nyc_data.replace("Latin (Cuban, Dominican, Puerto Rican, South & Central American)", "Latin")
-        self.nyc_data["SCORE"] = self.nyc_data["SCORE"].astype("float")
-        self.nyc_data = self.nyc_data.replace("Missing", np.nan)
-        self.clean_nyc_restaurant_data = self.nyc_data.replace("Not Yet Graded", np.nan)
+        self.clean_nyc_restaurant_data = cleanFrame(self.nyc_data)
 
+    @step("flags", "clean_nyc_restaurant_data")
     def getFlags(self):
 
         """Create indicator dummies based on "CRITICAL FLAG" for sorting and plotting purposes.
 
         Key Argument Used:
-          pd.get_dummies()
+          np.ndarray comparison of "CRITICAL FLAG" ("Not Applicable" rows get 0 in both)
 
         Return Attribute:
           - Data frame with two new columns: "Critical" and "Non-Critical"
 
         """
-        self.clean_nyc_restaurant_data[["Critical", "Non-Critical"]] = pd.get_dummies(self.clean_nyc_restaurant_data["CRITICAL FLAG"])
+        flags = self.clean_nyc_restaurant_data["CRITICAL FLAG"].values
+        self.clean_nyc_restaurant_data["Critical"] = (flags == "Critical").astype(np.uint8)
+        self.clean_nyc_restaurant_data["Non-Critical"] = (flags == "Not Critical").astype(np.uint8)
 
+    @step("grouped_cuisine_and_boro", "clean_nyc_restaurant_data")
     def groupByCuisineAndBoro(self):
 
         """Groupby "CUISINE DESCRIPTION" and "BORO" columns.
@@ -92,22 +205,61 @@ class RestaurantData(object):
         """
         self.grouped_cuisine_and_boro = self.clean_nyc_restaurant_data.groupby(["CUISINE DESCRIPTION", "BORO"])
 
+    @step("aggregates", "clean_nyc_restaurant_data")
+    def buildAggregates(self):
+
+        """Count and sum everything the charts need in one pass over the clean data.
+
+        Key Argument Used:
+          ViolationAggregates.fromFrame(): factorize DBA, CUISINE DESCRIPTION, BORO and CRITICAL FLAG once and np.bincount them.
+          shardedAggregates(): with more than one worker, blocks of rows are aggregated in parallel and merged.
+
+        Return Attribute:
+          - ViolationAggregates shared by every chart and by the top 20 and mean score steps
+        """
+        self.aggregates = shardedAggregates(self.clean_nyc_restaurant_data, self.workers)
+
+    @step("top_20_cuisines_list", "aggregates")
     def createTop20List(self):
 
         """Groupby "CUISINE DESCRIPTION" and "BORO" columns.
 
         Key Argument Used:
-          pd.value_counts()[:20]: Get the top 20 graded cuisine descriptions
-          pd.df.index.tolist():
+          ViolationAggregates.topCuisines(20): Get the top 20 graded cuisine descriptions from the cuisine counts (partial selection, no full sort)
 
         Return Attribute:
           - Data frame with the counts of the top 20 cuisine descriptions in New York City
           - List of restaurants names with the top 20 cuisine descriptions counts
 
         """
-        top_20_cuisines = self.clean_nyc_restaurant_data["CUISINE DESCRIPTION"].value_counts()[:20]
-        self.top_20_cuisines_list = top_20_cuisines.index.tolist()
+        self.top_20_cuisines_list = self.aggregates.topCuisines(20)
+
+    @step("top_index", "clean_nyc_restaurant_data")
+    def buildTopIndex(self):
+
+        """Index of the clean data for the top-K queries of topRanking() (topIndex.py).
+
+        Return Attribute:
+          - TopIndex of the codes of DBA, CUISINE DESCRIPTION, BORO and ZIPCODE
+        """
+
+        self.top_index = TopIndex.fromFrame(self.clean_nyc_restaurant_data)
+
+    def topRanking(self, dimension="DBA", by="critical", k=10, boro=None, cuisine=None, minRows=1):
+
+        """The k values of `dimension` (DBA, CUISINE DESCRIPTION, BORO or ZIPCODE) with the most critical flags, violations or the highest mean score ("critical", "violations", "score").
+
+        Args:
+          boro, cuisine (str): only count the rows of this borough and/or this cuisine, e.g. topRanking("DBA", "critical", 50, "BROOKLYN", "Pizza").
+          minRows (int): skip the values with fewer inspection rows (a mean score of one row says little).
+
+        Return Attribute:
+          - Data frame with one row per value, largest first: dimension, TOTAL CRITICAL, VIOLATIONS, SCORE (mean) and ROWS WITH SCORE
+        """
 
+        return self.require("top_index").top(dimension, by, k, boro, cuisine, minRows)
+
+    @step("top_20_cuisines_dataframe", "flags", "top_20_cuisines_list")
     def filterTop20Cuisines(self):
 
         """Take restaurants only in the top 20 list.
@@ -121,18 +273,35 @@ class RestaurantData(object):
 
         self.top_20_cuisines_dataframe = self.clean_nyc_restaurant_data[self.clean_nyc_restaurant_data["CUISINE DESCRIPTION"].isin(self.top_20_cuisines_list)]
 
+    @step("cuisine_and_boro_group", "aggregates")
     def getGroupByCuisineAndBoro(self):
 
         """Generate groupby aggregation results for "CUISINE DESCRIPTION" and "BORO" with numpy.
 
         Key Argument Used:
-          pd.DataFrame.agg([np.mean, np.count_nonzero, np.std])
+          ViolationAggregates.scoreStats(): mean, count_nonzero and std from the counts, sums and sums of squares of SCORE
 
         Return Attribute:
           - Data frame of the mean, std, and count of the restaurant scores grouped by "CUISINE DESCRIPTION" and "BORO".
         """
-        self.cuisine_and_boro_group = pd.DataFrame(self.grouped_cuisine_and_boro["SCORE"].agg([np.mean, np.count_nonzero, np.std]))
+        self.cuisine_and_boro_group = self.aggregates.scoreStats()
+
+    @step("score_quantiles", "aggregates")
+    def getScoreQuantiles(self):
+
+        """Median, 90th and 99th percentile of the restaurant scores grouped by "CUISINE DESCRIPTION" and "BORO".
+
+        The mean of skewed scores hides the worst inspections; the quantiles show the tail.
+
+        Key Argument Used:
+          ViolationAggregates.scoreQuantiles(): quantiles of the mergeable score sketches (scoreSketch.py), no score is sorted
+
+        Return Attribute:
+          - Data frame of the "median", "p90" and "p99" scores grouped by "CUISINE DESCRIPTION" and "BORO".
+        """
+        self.score_quantiles = self.aggregates.scoreQuantiles()
 
+    @step("restaurant_cuisine_trends", "cuisine_and_boro_group")
     def UnstackDataset(self):
 
         """Unstack cuisine_and_boro_group for plotting purposes.
@@ -145,6 +314,7 @@ class RestaurantData(object):
         """
         self.restaurant_cuisine_trends = self.cuisine_and_boro_group.unstack()
 
+    @step("restaurant_trends_mean", "restaurant_cuisine_trends")
     def createMeanSeries(self):
 
         """Create a Pandas series with the mean scores.
@@ -158,6 +328,7 @@ class RestaurantData(object):
 
         self.restaurant_trends_mean = self.restaurant_cuisine_trends["mean"]
 
+    @step("identified_dirty_restaurants_mean", "restaurant_trends_mean", "top_20_cuisines_list")
     def getAverageScores(self):
 
         """Filter the restaurant trend series (mean) for the top 20 restaurants identified earlier.
@@ -171,118 +342,256 @@ class RestaurantData(object):
 
         self.identified_dirty_restaurants_mean = self.restaurant_trends_mean[self.restaurant_trends_mean.index.isin(self.top_20_cuisines_list)]
 
-    def AssessPopularCuisinesViolations(self):
+    @step("timeline", "nyc_data")
+    def buildTimeline(self):
+
+        """Date index of the inspection rows (timeline.py).
+
+        Return Attribute:
+          - Row positions sorted by INSPECTION DATE, parsed once
+        """
+
+        self.timeline = InspectionTimeline.fromFrame(self.nyc_data)
+
+    def dateRange(self, start=None, end=None):
+
+        """Clean inspection rows from `start` to `end` (both days included, e.g. "2014-01-31"), found by binary search."""
+
+        return self.require("timeline").window(self.require("clean_nyc_restaurant_data"), start, end)
+
+    def lastDays(self, days=90):
+
+        """Clean inspection rows of the last `days` days of the data."""
+
+        return self.dateRange(*self.require("timeline").lastDays(days))
+
+    def monthlyTrends(self, start=None, end=None):
+
+        """Rows, mean SCORE and critical violation rate per cuisine, borough and month, from `start` to `end`."""
+
+        return self.require("timeline").monthlyTrends(self.require("clean_nyc_restaurant_data"), start, end)
+
+    def rollingTrends(self, days=90, start=None, end=None):
+
+        """Mean SCORE and critical violation rate per cuisine and borough over a rolling window of `days` days.
+
+        Return Attribute:
+          - A dictionary of two dataframes, "mean" and "critical_rate", with one row per day and one column per cuisine and borough
+        """
+
+        return self.require("timeline").rollingTrends(self.require("clean_nyc_restaurant_data"), days, start, end)
+
+    def chartKey(self, chart, frame, outputPath):
+
+        """Cache key of the chart method `chart` plotting `frame` into a file like `outputPath` (None without a chart cache).
+
+        The code part of the key is the chart and the functions it declares with @drawnWith.
+        """
+
+        if self.chart_cache is None:
+            return None
+        return self.chart_cache.chartKey(chart, frame, getattr(RestaurantData, chart).chartCode, format=chartExtension(outputPath))
+
+    def chartServer(self, key, outputPath, show):
+
+        """Copy a cached chart to `outputPath` (and show it if asked) instead of drawing it again.
+
+        Return Attribute:
+          - True when the chart was served from the cache, False when it has to be drawn
+        """
+
+        if key is None:
+            return False
+        cached = self.chart_cache.fetch(key, chartExtension(outputPath))
+        preview = self.chart_cache.fetch(key, PREVIEW) if show else None
+        if cached is None or (show and preview is None):
+            return False
+        if os.path.abspath(cached) != os.path.abspath(outputPath):
+            shutil.copyfile(cached, outputPath)
+        if show:
+            chartShower(preview)
+        return True
+
+    @stage()
+    def chartSaver(self, key, outputPath, show):
+
+        """Save the current figure to `outputPath` (the format follows its extension) and to the chart cache, show it if asked, then free it."""
+
+        plt.savefig(outputPath)
+        if key is not None:
+            self.chart_cache.store(key, chartExtension(outputPath), outputPath)
+            if show and chartExtension(outputPath) != PREVIEW:     #what chartServer() shows next time
+                previewFile, previewPath = tempfile.mkstemp(suffix="." + PREVIEW)
+                os.close(previewFile)
+                plt.savefig(previewPath)
+                self.chart_cache.store(key, PREVIEW, previewPath)
+                os.remove(previewPath)
+        if show:
+            plt.show()
+        plt.close("all")     #a long running batch renders many figures
+
+    @drawnWith(chartSaver)
+    @stage()
+    def AssessPopularCuisinesViolations(self, outputPath=None, show=True):
 
         """Stacked bar chart of targeted cuisines and their count of violations.
 
         Key Argument Used:
-          pd.crosstab.value_counts().plot()
+          ViolationAggregates.crosstab().plot()
 
         Return Attribute:
-          - A pop up of the graph
-          - A pdf graph saved as 'AssessPopularCuisinesViolations.pdf'
+          - A pop up of the graph, unless `show` is False
+          - A pdf graph saved as 'AssessPopularCuisinesViolations.pdf', or as `outputPath` (its extension picks the format)
         """
 
-        trends = pd.DataFrame(pd.crosstab(self.top_20_cuisines_dataframe["CUISINE DESCRIPTION"], self.top_20_cuisines_dataframe["CRITICAL FLAG"]))
+        outputPath = outputPath or 'AssessPopularCuisinesViolations.pdf'
+        self.require("top_20_cuisines_list")
+        trends = self.aggregates.crosstab("CUISINE DESCRIPTION").loc[sorted(self.top_20_cuisines_list)]
+        key = self.chartKey("AssessPopularCuisinesViolations", trends, outputPath)
+        if self.chartServer(key, outputPath, show):
+            return
         trends.sort(["Critical", "Not Critical"]).plot(kind="barh", stacked=True, figsize=(14,8))
         plt.ylabel("Cuisine \n")
         plt.xlabel('Number of Critical Flags')
         plt.title(r'Popular Restaurant Cuisines and Inspection Violations' )
         plt.tight_layout()  #This will generate UserWarning "UserWarning: tight_layout : falling back to Agg renderer" on Mac OS X
-        plt.savefig('AssessPopularCuisinesViolations.pdf')
-        plt.show()
+        self.chartSaver(key, outputPath, show)
 
 
-    def AssessPopularRestaurantsViolations(self):
+    @drawnWith(chartSaver)
+    @stage()
+    def AssessPopularRestaurantsViolations(self, outputPath=None, show=True):
 
         """Stacked bar chart of targeted restaurants and their count of violations.
 
         Key Argument Used:
-          pd.crosstab.value_counts().plot()
+          ViolationAggregates.topRows().plot(): the 20 restaurants with the most critical flags, picked without sorting every restaurant
 
         Return Attribute:
-          - A pop up of the graph
-          - A pdf graph saved as "AssessPopularRestaurantsViolations.pdf".
+          - A pop up of the graph, unless `show` is False
+          - A pdf graph saved as "AssessPopularRestaurantsViolations.pdf", or as `outputPath` (its extension picks the format)
         """
 
-        trends = pd.DataFrame(pd.crosstab(self.clean_nyc_restaurant_data["DBA"], self.clean_nyc_restaurant_data["CRITICAL FLAG"]))
-        trends.sort(["Critical", "Not Critical" ], ascending=False)[:20].plot(kind="barh", stacked=True, figsize=(14,8))
+        outputPath = outputPath or 'AssessPopularRestaurantsViolations.pdf'
+        trends = self.require("aggregates").topRows("DBA", 20)
+        key = self.chartKey("AssessPopularRestaurantsViolations", trends, outputPath)
+        if self.chartServer(key, outputPath, show):
+            return
+        trends.plot(kind="barh", stacked=True, figsize=(14,8))
         plt.ylabel("Restaurant \n")
         plt.xlabel("Number of Critical Flags")
         plt.tick_params(labelsize=8)
         plt.title(r'Popular Restaurants and their Inspection Violations' )
         plt.tight_layout()    #This will generate UserWarning "UserWarning: tight_layout : falling back to Agg renderer" on Mac OS X
-        plt.savefig('AssessPopularRestaurantsViolations.pdf')
-        plt.show()
+        self.chartSaver(key, outputPath, show)
+
+    @drawnWith(chartSaver, gridPlotter, tickLabels)
+    @stage()
+    def RiskyHotSpots(self, outputPath=None, show=True, rows="CUISINE DESCRIPTION", columns="BORO", top=20, minCount=1):
 
-    def RiskyHotSpots(self):
+        """Heatmap of the mean violation scores of two dimensions, by default the targeted cuisines and the NYC boroughs.
 
-        """Heatmap of NYC boroughs, targeted cuisines, and their mean violation scores.
+        Any two of CUISINE DESCRIPTION, BORO, ZIPCODE, DBA, GRADE and MONTH (of the inspection date) can be
+        used, e.g. RiskyHotSpots(rows="ZIPCODE", columns="CUISINE DESCRIPTION", top=None, minCount=5).
+
+        Key Argument Used:
+          heatGrid.SparseGrid: count and mean of the non-empty cells only; the cuisine x borough grid comes from the aggregates.
+          heatGrid.gridPlotter(): draws the non-empty cells, labels taken from the data.
+
+        Args:
+          top (int): only the `top` rows with the most inspection rows (the top 20 cuisines by default), None keeps every row.
+          minCount (int): cells with fewer known scores are left empty.
 
         Return Attribute:
-          - A pop up of the graph
-          - A pdf graph saved as "Heatmap.pdf".
+          - A pop up of the graph, unless `show` is False
+          - A pdf graph saved as "Heatmap.pdf", or as `outputPath` (its extension picks the format)
         """
-        print self.identified_dirty_restaurants_mean
-        fig, ax = plt.subplots()
-        heatmap =ax.pcolor(self.identified_dirty_restaurants_mean, cmap=plt.cm.Blues)
+        outputPath = outputPath or "Heatmap.pdf"
+        if (rows, columns) == ("CUISINE DESCRIPTION", "BORO"):
+            grid = SparseGrid.fromAggregates(self.require("aggregates"))
+        elif self.require("clean_nyc_restaurant_data") is None:
+            raise ValueError("a %s x %s heatmap needs the inspection rows, they are not kept in streaming mode" % (rows, columns))
+        else:
+            grid = SparseGrid.fromFrame(self.clean_nyc_restaurant_data, rows, columns)
+        if top:
+            grid = grid.restricted(self.require("aggregates").topCuisines(top) if rows == "CUISINE DESCRIPTION" else grid.topRows(top))
+        grid = grid.masked(minCount)
+        if show:
+            print grid.frame() if len(grid.rowLabels) * len(grid.columnLabels) <= 10000 else grid.cells()     #a large grid is printed by cell
+        key = self.chartKey("RiskyHotSpots", grid.cells(), outputPath)
+        if self.chartServer(key, outputPath, show):
+            return
+        fig, ax = plt.subplots(figsize=(max(8, min(16, 0.2 * len(grid.columnLabels) + 4)), max(6, min(20, 0.15 * len(grid.rowLabels) + 3))))
+        heatmap = gridPlotter(grid, ax, plt.cm.Blues)
         fig.colorbar(heatmap)
         plt.title("Check The Grades Before You Dine - Especially Ones With Darker Shades!")
-        plt.xlabel("Borough")
-        plt.ylabel("Cuisine")
-        ax.set_xticks(np.arange(5) + 0.5, minor=False)
-        ax.set_yticks(np.arange(20) + 0.5, minor=False)
-        borou=[item for item in self.identified_dirty_restaurants_mean]
-        cusine=['American ', 'Asian', 'Bakery', 'Cafe/Coffee/Tea', 'Caribbean', 'Chicken', 'Chinese', 'Delicatessen', 'Donuts', 'French',\
-                 'Hamburgers', 'Indian','Italian', 'Japanese', 'Latin', 'Mexican', 'Pizza', 'Pizza/Italian', 'Sandwiches', 'Spanish']
-        ax.set_xticklabels(borou, minor=False)
-        ax.set_yticklabels(cusine, minor=False)
+        plt.xlabel(grid.columnName.title())
+        plt.ylabel(grid.rowName.title())
         plt.tick_params(labelsize=8)
         plt.tight_layout()   #This will generate UserWarning "UserWarning: tight_layout : falling back to Agg renderer" on Mac OS X
-        plt.savefig("Heatmap.pdf")
-        plt.show()
+        self.chartSaver(key, outputPath, show)
+
+
+    def keeperFlagCounts(self, column):
+
+        """Critical flag counts of the restaurants in the Restaurant Keeper per value of `column`, see KeeperStore.flagCounts()."""
 
+        if self.keeper is not None:
+            return self.keeper.flagCounts(column)
+        keeper = KeeperStore()
+        try:
+            return keeper.flagCounts(column)
+        finally:
+            keeper.close()
 
-    def plotUserRestaurantGradeAndScore(self):
+    @drawnWith(chartSaver)
+    @stage()
+    def plotUserRestaurantGradeAndScore(self, outputPath=None, show=True):
 
         """User graph of resturants and violations.
 
         Key Argument Used:
-        pd.crosstab().sort().plot()
+          keeperFlagCounts("DBA").sort(["Critical", "Not Critical"]).plot()
 
         Return Attribute:
-          - A pop up of the graph
-          - A pdf graph saved as "UserRestaurantAndScore.pdf".
+          - A pop up of the graph, unless `show` is False
+          - A pdf graph saved as "UserRestaurantAndScore.pdf", or as `outputPath` (its extension picks the format)
         """
-        user_restaurant_list = pd.io.parsers.read_csv('restaurant_list.csv',sep="\t")
-        user_trends_restaurants = pd.DataFrame(pd.crosstab(user_restaurant_list["DBA"], user_restaurant_list["CRITICAL FLAG"]))
+        outputPath = outputPath or 'UserRestaurantAndScore.pdf'
+        user_trends_restaurants = self.keeperFlagCounts("DBA")
+        key = self.chartKey("plotUserRestaurantGradeAndScore", user_trends_restaurants, outputPath)
+        if self.chartServer(key, outputPath, show):
+            return
         user_trends_restaurants.sort(["Critical", "Not Critical" ], ascending=False).plot(kind="barh", stacked=True, figsize=(14,8))
         plt.ylabel("Restaurant \n")
         plt.xlabel("Number of Violations")
         plt.tick_params(labelsize=8)
         plt.title(r'User Restaurants and Inspection Violations' )
         plt.tight_layout()   #This will generate UserWarning "UserWarning: tight_layout : falling back to Agg renderer" on Mac OS X
-        plt.savefig('UserRestaurantAndScore.pdf')
-        plt.show()
+        self.chartSaver(key, outputPath, show)
 
-    def plotUserCuisineAndCriticalFlag(self):
+    @drawnWith(chartSaver)
+    @stage()
+    def plotUserCuisineAndCriticalFlag(self, outputPath=None, show=True):
 
         """User graph of restaurants cuisine and inspection violations.
 
         Key Argument Used:
-        pd.crosstab().sort().plot()
+          keeperFlagCounts("CUISINE DESCRIPTION").sort(["Critical", "Not Critical"]).plot()
 
         Return Attribute:
-          - A pop up of the graph
-          - A pdf graph saved as "UserCuisinesAndScore.pdf".
+          - A pop up of the graph, unless `show` is False
+          - A pdf graph saved as "UserCuisinesAndScore.pdf", or as `outputPath` (its extension picks the format)
         """
-        user_restaurant_list = pd.io.parsers.read_csv('restaurant_list.csv',sep="\t")
-        user_trends_cuisines = pd.DataFrame(pd.crosstab(user_restaurant_list["CUISINE DESCRIPTION"], user_restaurant_list["CRITICAL FLAG"]))
+        outputPath = outputPath or 'UserCuisinesAndScore.pdf'
+        user_trends_cuisines = self.keeperFlagCounts("CUISINE DESCRIPTION")
+        key = self.chartKey("plotUserCuisineAndCriticalFlag", user_trends_cuisines, outputPath)
+        if self.chartServer(key, outputPath, show):
+            return
         user_trends_cuisines.sort(["Critical", "Not Critical"], ascending=False).plot(kind="barh", stacked=True, figsize=(14,8))
         plt.ylabel("Restaurant Cuisines \n")
         plt.xlabel("Number of Violations")
         plt.tick_params(labelsize=8)
         plt.title(r'User Restaurants Cuisines and Inspection Violations' )
         plt.tight_layout()    #This will generate UserWarning "UserWarning: tight_layout : falling back to Agg renderer" on Mac OS X
-        plt.savefig('UserCuisinesAndScore.pdf')
-        plt.show()
+        self.chartSaver(key, outputPath, show)
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  aggregationEngine.py
+#
+#  Single pass aggregation engine for the charts of RestaurantData (OpenDataNYC.py).
+#  DBA, CUISINE DESCRIPTION, BORO and CRITICAL FLAG are factorized into integer codes once,
+#  and every count, sum and sum of squares the charts need is computed with np.bincount, as well
+#  as the histograms of the SCORE quantile sketches (scoreSketch.py).
+#  The results are plain counts and sums, so two aggregates (e.g. of two files, two chunks or
+#  two workers) can be merged by adding them. shardedAggregates() splits a large frame into
+#  blocks of rows aggregated by forked worker processes and merges their results.
+#
+##########################################################################################
+
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+from scoreSketch import SCORE_BINS, QUANTILES, scoreBins, sketchQuantiles, quantileName     #scoreSketch.py
+
+DIMENSIONS = ["DBA", "CUISINE DESCRIPTION", "BORO", "CRITICAL FLAG"]
+AXES = DIMENSIONS + ["SCORE BIN"]     #SCORE BIN: the fixed bins of the quantile sketches
+SHARD_ROWS = 250000     #smallest block worth a worker process
+
+shardJob = {}     #frame being aggregated by shardedAggregates(), inherited by the forked workers
+
+
+def factorized(series):
+    """Integer codes (-1 for missing values) and labels of a column, categorical or not."""
+    if str(series.dtype) == 'category':
+        return np.asarray(series.cat.codes, dtype=np.int64), np.asarray(series.cat.categories, dtype=object)
+    codes, labels = pd.factorize(series.values)
+    return np.asarray(codes, dtype=np.int64), np.asarray(labels, dtype=object)
+
+
+def pairCounts(rows, columns, shape, weights=None):
+    """2-D histogram of two code arrays (rows with a missing code are skipped) in one np.bincount."""
+    valid = (rows >= 0) & (columns >= 0)
+    if weights is not None:
+        weights = weights[valid]
+    counts = np.bincount(rows[valid] * shape[1] + columns[valid], weights=weights, minlength=shape[0] * shape[1])
+    return counts.reshape(shape)
+
+
+def alignLabels(labels, otherLabels):
+    """Union of two label arrays, and the position of every label of otherLabels in the union."""
+    otherLabels = np.asarray(otherLabels, dtype=object)
+    otherPositions = np.asarray(pd.Index(labels).get_indexer(otherLabels), dtype=np.int64)     #labels are distinct, as factorize returns them
+    new = otherPositions < 0
+    otherPositions[new] = len(labels) + np.arange(new.sum())
+    return np.concatenate([np.asarray(labels, dtype=object), otherLabels[new]]), otherPositions
+
+
+def topPositions(keys, labels, k):
+    """Positions of the k largest values of keys[0] (ties broken by the larger keys[1], ..., then by label), largest first.
+
+    np.argpartition finds the k largest in linear time and only those (and the values tied
+    with the last of them) are sorted, instead of sorting every row. The candidates are sorted
+    by np.lexsort, labels by their rank among the candidates.
+    """
+    first = np.asarray(keys[0], dtype=np.float64)
+    first = np.where(np.isnan(first), -np.inf, first)     #a missing value is the smallest
+    if k <= 0 or len(first) == 0:
+        return np.array([], dtype=np.int64)
+    if k < len(first):
+        candidates = np.argpartition(-first, k - 1)[:k]
+        candidates = np.where(first >= first[candidates].min())[0]     #keep the ties of the k-th value
+    else:
+        candidates = np.arange(len(first))
+    labelRank = np.empty(len(candidates), dtype=np.int64)
+    labelRank[np.argsort(np.asarray(labels, dtype=object)[candidates], kind='mergesort')] = np.arange(len(candidates))
+    sortKeys = [labelRank] + [-np.asarray(key)[candidates] for key in reversed(list(keys[1:]))] + [-first[candidates]]     #np.lexsort sorts by the last key first
+    return candidates[np.lexsort(sortKeys)][:k].astype(np.int64)
+
+
+def grown(table, shape):
+    """Copy of a 1-D or 2-D table padded with zeros to a larger shape."""
+    result = np.zeros(shape, dtype=table.dtype)
+    result[tuple(slice(0, size) for size in table.shape)] = table
+    return result
+
+
+class ViolationAggregates(object):
+
+    """Counts and score sums of the inspection data, by code.
+
+    Attributes:
+      labels (dict): dimension -> array of labels, the code of a label is its position.
+      dbaFlagCounts (np.array): rows per DBA x CRITICAL FLAG.
+      cuisineFlagCounts (np.array): rows per CUISINE DESCRIPTION x CRITICAL FLAG.
+      cuisineCounts (np.array): rows per CUISINE DESCRIPTION.
+      groupRows (np.array): rows per CUISINE DESCRIPTION x BORO.
+      scoreCount, scoreSum, scoreSquares (np.array): count, sum and sum of squares of the known SCOREs per CUISINE DESCRIPTION x BORO.
+      scoreNonzero (np.array): SCOREs other than 0 per CUISINE DESCRIPTION x BORO (np.count_nonzero counts NaN too).
+      scoreHistogram (np.array): quantile sketch of the known SCOREs per CUISINE DESCRIPTION x BORO (scoreSketch.py), its counts per SCORE BIN.
+
+    """
+
+    TABLES = {"dbaFlagCounts": ("DBA", "CRITICAL FLAG"), "cuisineFlagCounts": ("CUISINE DESCRIPTION", "CRITICAL FLAG"),
+              "cuisineCounts": ("CUISINE DESCRIPTION",), "groupRows": ("CUISINE DESCRIPTION", "BORO"),
+              "scoreCount": ("CUISINE DESCRIPTION", "BORO"), "scoreSum": ("CUISINE DESCRIPTION", "BORO"),
+              "scoreSquares": ("CUISINE DESCRIPTION", "BORO"), "scoreNonzero": ("CUISINE DESCRIPTION", "BORO"),
+              "scoreHistogram": ("CUISINE DESCRIPTION", "BORO", "SCORE BIN")}
+    FLOAT_TABLES = ("scoreSum", "scoreSquares")     #every other table holds counts
+
+    def __init__(self, labels, tables):
+        self.labels = labels
+        for name in self.TABLES:
+            setattr(self, name, tables[name])
+
+    @classmethod
+    def empty(cls):
+        labels = dict((dimension, np.array([], dtype=object)) for dimension in AXES)
+        tables = dict((name, np.zeros((0,) * len(dimensions), dtype=np.float64 if name in cls.FLOAT_TABLES else np.int64))
+                      for name, dimensions in cls.TABLES.items())
+        return cls(labels, tables)
+
+    @classmethod
+    def fromFrame(cls, frame):
+        """Aggregate a cleaned inspection dataframe (see RestaurantData.setUpNYCRestaurantData) in one pass."""
+        codes = {}
+        labels = {}
+        for dimension in DIMENSIONS:
+            codes[dimension], labels[dimension] = factorized(frame[dimension])
+        size = dict((dimension, len(labels[dimension])) for dimension in DIMENSIONS)
+        cuisine = codes["CUISINE DESCRIPTION"]
+        boro = codes["BORO"]
+        score = np.asarray(frame["SCORE"].values, dtype=np.float64)
+        known = np.isnan(score) == False
+        group = (size["CUISINE DESCRIPTION"], size["BORO"])
+        labels["SCORE BIN"] = np.arange(SCORE_BINS).astype(object)
+        bins = scoreBins(score)
+        sketched = (cuisine >= 0) & (boro >= 0) & known
+
+        tables = {
+            "dbaFlagCounts": pairCounts(codes["DBA"], codes["CRITICAL FLAG"], (size["DBA"], size["CRITICAL FLAG"])),
+            "cuisineFlagCounts": pairCounts(cuisine, codes["CRITICAL FLAG"], (size["CUISINE DESCRIPTION"], size["CRITICAL FLAG"])),
+            "cuisineCounts": np.bincount(cuisine[cuisine >= 0], minlength=size["CUISINE DESCRIPTION"]),
+            "groupRows": pairCounts(cuisine, boro, group),
+            "scoreCount": pairCounts(np.where(known, cuisine, -1), boro, group),
+            "scoreSum": pairCounts(np.where(known, cuisine, -1), boro, group, np.where(known, score, 0.0)),
+            "scoreSquares": pairCounts(np.where(known, cuisine, -1), boro, group, np.where(known, score * score, 0.0)),
+            "scoreNonzero": pairCounts(np.where(score != 0, cuisine, -1), boro, group),
+            "scoreHistogram": np.bincount((cuisine[sketched] * group[1] + boro[sketched]) * SCORE_BINS + bins[sketched],
+                                          minlength=group[0] * group[1] * SCORE_BINS).reshape(group + (SCORE_BINS,)),
+        }
+        return cls(labels, tables)
+
+    def merge(self, other, sign=1):
+        """Add (sign=1) or remove (sign=-1) the rows aggregated in other, in place."""
+        positions = {}
+        for dimension in AXES:
+            self.labels[dimension], positions[dimension] = alignLabels(self.labels[dimension], other.labels[dimension])
+        for name, dimensions in self.TABLES.items():
+            shape = tuple(len(self.labels[dimension]) for dimension in dimensions)
+            table = grown(getattr(self, name), shape)
+            table[np.ix_(*[positions[dimension] for dimension in dimensions])] += sign * getattr(other, name)
+            setattr(self, name, table)
+        return self
+
+    def crosstab(self, dimension):
+        """pd.crosstab(frame[dimension], frame["CRITICAL FLAG"]) for "DBA" or "CUISINE DESCRIPTION"."""
+        counts = self.dbaFlagCounts if dimension == "DBA" else self.cuisineFlagCounts
+        rows = np.where(counts.sum(axis=1) > 0)[0]
+        columns = np.where(counts.sum(axis=0) > 0)[0]
+        rows = rows[np.argsort(self.labels[dimension][rows], kind='mergesort')]
+        columns = columns[np.argsort(self.labels["CRITICAL FLAG"][columns], kind='mergesort')]
+        trends = pd.DataFrame(counts[np.ix_(rows, columns)], index=self.labels[dimension][rows], columns=self.labels["CRITICAL FLAG"][columns])
+        trends.index.name = dimension
+        trends.columns.name = "CRITICAL FLAG"
+        return trends
+
+    def topCuisines(self, n=20):
+        """The n most frequent cuisine descriptions, like value_counts()[:n].index.tolist() (ties by name)."""
+        order = topPositions([self.cuisineCounts], self.labels["CUISINE DESCRIPTION"], n)
+        order = order[self.cuisineCounts[order] > 0]
+        return self.labels["CUISINE DESCRIPTION"][order].tolist()
+
+    def topRows(self, dimension, n=20, flags=("Critical", "Not Critical")):
+        """crosstab(dimension).sort(list(flags), ascending=False)[:n], without sorting every label."""
+        counts = self.dbaFlagCounts if dimension == "DBA" else self.cuisineFlagCounts
+        keys = []
+        for flag in flags:
+            column = np.where(self.labels["CRITICAL FLAG"] == flag)[0]
+            keys.append(counts[:, column[0]] if len(column) else np.zeros(len(counts), dtype=np.int64))
+        rows = topPositions(keys, self.labels[dimension], n)
+        rows = rows[counts[rows].sum(axis=1) > 0]
+        columns = np.where(counts.sum(axis=0) > 0)[0]
+        columns = columns[np.argsort(self.labels["CRITICAL FLAG"][columns], kind='mergesort')]
+        trends = pd.DataFrame(counts[np.ix_(rows, columns)], index=self.labels[dimension][rows], columns=self.labels["CRITICAL FLAG"][columns])
+        trends.index.name = dimension
+        trends.columns.name = "CRITICAL FLAG"
+        return trends
+
+    def scoreStats(self):
+        """Mean, count_nonzero and std of SCORE by (CUISINE DESCRIPTION, BORO), like groupby().agg([np.mean, np.count_nonzero, np.std])."""
+        cuisine, boro = np.where(self.groupRows > 0)
+        count = self.scoreCount[cuisine, boro].astype(np.float64)
+        total = self.scoreSum[cuisine, boro]
+        squares = self.scoreSquares[cuisine, boro]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(count > 0, total / count, np.nan)
+            variance = np.where(count > 1, (squares - total * mean) / (count - 1), np.nan)
+        std = np.sqrt(np.clip(variance, 0, None))     #tiny negative values are rounding errors
+        index = pd.MultiIndex.from_arrays([self.labels["CUISINE DESCRIPTION"][cuisine], self.labels["BORO"][boro]], names=["CUISINE DESCRIPTION", "BORO"])
+        stats = pd.DataFrame({"mean": mean, "count_nonzero": self.scoreNonzero[cuisine, boro], "std": std}, index=index, columns=["mean", "count_nonzero", "std"])
+        return stats.sort_index()
+
+    def scoreQuantiles(self, quantiles=QUANTILES):
+        """Quantiles of SCORE by (CUISINE DESCRIPTION, BORO) from the sketches, one column per quantile ("median", "p90", "p99")."""
+        cuisine, boro = np.where(self.groupRows > 0)
+        values = sketchQuantiles(self.scoreHistogram[cuisine, boro], quantiles) if len(cuisine) else np.zeros((0, len(quantiles)))
+        index = pd.MultiIndex.from_arrays([self.labels["CUISINE DESCRIPTION"][cuisine], self.labels["BORO"][boro]], names=["CUISINE DESCRIPTION", "BORO"])
+        names = [quantileName(quantile) for quantile in quantiles]
+        return pd.DataFrame(values, index=index, columns=names).sort_index()
+
+
+def shardAggregator(bounds):
+    """Aggregates of the rows start:stop of the frame of the running job (in a worker)."""
+    start, stop = bounds
+    return ViolationAggregates.fromFrame(shardJob["frame"].iloc[start:stop])
+
+
+def shardedAggregates(frame, workers=1, shardRows=SHARD_ROWS):
+    """ViolationAggregates.fromFrame(frame), computed on blocks of rows by `workers` forked processes.
+
+    The workers inherit the frame when they fork, so it is not pickled, and only their
+    counts and sums come back. The blocks are merged in row order, so the labels, their
+    order and every table are the same as in the one pass aggregation.
+    """
+    workers = max(1, min(workers or multiprocessing.cpu_count(), len(frame) // max(shardRows, 1)))
+    if workers == 1:
+        return ViolationAggregates.fromFrame(frame)
+    edges = np.linspace(0, len(frame), workers + 1).astype(np.int64)
+    shardJob["frame"] = frame
+    pool = multiprocessing.Pool(workers)
+    try:
+        partials = pool.map(shardAggregator, zip(edges[:-1], edges[1:]), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+        shardJob.clear()
+    aggregates = partials[0]
+    for partial in partials[1:]:
+        aggregates.merge(partial)
+    return aggregates
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  analysisGraph.py
+#
+#  Lazy, memoized dependency graph for the analysis steps of RestaurantData (OpenDataNYC.py).
+#  Every step declares the attribute it produces and the attributes it needs.
+#  An attribute is computed the first time it is required and computed again only when
+#  one of its inputs changed since then.
+#
+##########################################################################################
+
+import functools
+
+import stageTimer     #stageTimer.py
+
+
+def step(artifact, *dependencies):
+
+    """Decorator for a method that sets the attribute `artifact` from the attributes `dependencies`.
+
+    Calling the method directly still works: its dependencies are brought up to date first
+    and the graph remembers that `artifact` is now computed.
+
+    Args:
+      artifact (str): name of the attribute set by the method.
+      dependencies (str): names of the attributes (inputs or other artifacts) read by the method.
+
+    """
+
+    def decorate(method):
+        @functools.wraps(method)
+        def run(self, *args, **kwargs):
+            for dependency in dependencies:
+                self.require(dependency)
+            if stageTimer.recorder.mode is None:
+                result = method(self, *args, **kwargs)
+            else:
+                with stageTimer.measure("step: " + artifact) as thisStage:     #timed apart from its dependencies
+                    result = method(self, *args, **kwargs)
+                    thisStage.rows = stageTimer.rowCount(getattr(self, artifact, None))
+            self.markComputed(artifact)
+            return result
+        run.artifact = artifact
+        run.dependencies = dependencies
+        return run
+    return decorate
+
+
+class LazyAnalysis(object):
+
+    """Base class that evaluates the @step methods of a subclass on demand.
+
+    Attributes:
+      versions (dict): attribute name -> number of times it was set or computed.
+      seen (dict): artifact name -> versions of its dependencies when it was last computed.
+
+    """
+
+    def __init__(self):
+        self.versions = {}
+        self.seen = {}
+
+    @classmethod
+    def producers(cls):
+        """Artifact name -> @step method producing it."""
+        if '_producers' not in cls.__dict__:
+            cls._producers = {}
+            for name in dir(cls):
+                method = getattr(cls, name)
+                if hasattr(method, "artifact"):
+                    cls._producers[method.artifact] = method
+        return cls._producers
+
+    def setInput(self, name, value):
+        """Set an input attribute, every artifact depending on it becomes stale."""
+        setattr(self, name, value)
+        self.versions[name] = self.versions.get(name, 0) + 1
+
+    def markComputed(self, artifact):
+        method = self.producers()[artifact]
+        self.seen[artifact] = tuple(self.versions.get(dependency, 0) for dependency in method.dependencies)
+        self.versions[artifact] = self.versions.get(artifact, 0) + 1
+
+    def isStale(self, artifact):
+        method = self.producers()[artifact]
+        for dependency in method.dependencies:
+            self.require(dependency)
+        return self.seen.get(artifact) != tuple(self.versions.get(dependency, 0) for dependency in method.dependencies)
+
+    def require(self, name):
+        """Return the attribute `name`, computing it and what it needs only if it is missing or stale."""
+        if name in self.producers() and self.isStale(name):
+            self.producers()[name](self)
+        return getattr(self, name, None)
+
+    def invalidate(self, artifact):
+        """Force `artifact` (and everything depending on it) to be computed again on next use."""
+        self.seen.pop(artifact, None)
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  benchmark.py
+#
+#  Benchmark of the load, analysis, lookup and render paths on synthetic inspection data.
+#  Csv files in the layout of DOHMH_New_York_City_Restaurant_Inspection_Results.csv are generated
+#  (100k, 1M and 10M rows by default) so neither the real file nor Yelp is needed.
+#  Every size runs in its own process, so its peak memory is measured on its own.
+#  The results are saved as JSON and can be compared with an earlier run to find regressions.
+#
+#  Usage: python benchmark.py [--sizes 100k 1M 10M] [--output results.json] [--baseline old.json] [--tolerance 0.25]
+#
+##########################################################################################
+
+import matplotlib
+matplotlib.use("Agg")     #the plots are rendered without a window
+
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import argparse
+import datetime
+import platform
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+import restaurant as rt     #restaurant.py
+import sourceCache     #sourceCache.py
+from OpenDataNYC import RestaurantData, CHART_FILES     #OpenDataNYC.py
+from phoneIndex import PhoneIndex     #phoneIndex.py
+from snapshotTable import SnapshotTable     #snapshotTable.py
+from fuzzyMatcher import TrigramIndex     #fuzzyMatcher.py
+from keeperStore import KeeperStore     #keeperStore.py
+from aggregationEngine import shardedAggregates     #aggregationEngine.py
+
+SIZES = ["100k", "1M", "10M"]
+FOLDER = ".benchmark"
+TOLERANCE = 0.25     #a stage slower than its baseline by more than this fraction is a regression
+MIN_SECONDS = 0.05     #differences below this are noise
+CHUNK_ROWS = 500000     #rows generated and written at a time
+
+SOURCE_COLUMNS = ["CAMIS", "DBA", "BORO", "BUILDING", "STREET", "ZIPCODE", "PHONE", "CUISINE DESCRIPTION", "INSPECTION DATE", "ACTION",
+                  "VIOLATION CODE", "VIOLATION DESCRIPTION", "CRITICAL FLAG", "SCORE", "GRADE", "GRADE DATE", "RECORD DATE", "INSPECTION TYPE"]
+BOROS = ["MANHATTAN", "BROOKLYN", "QUEENS", "BRONX", "STATEN ISLAND", "Missing"]
+CUISINES = ["American ", "Chinese", "Pizza", "Italian", "Latin (Cuban, Dominican, Puerto Rican, South & Central American)", "Cafe/Coffee/Tea",
+            "Mexican", "Japanese", "Caribbean", "Bakery", "Spanish", "Chicken", "Donuts", "Indian", "Delicatessen", "Hamburgers", "Asian",
+            "Pizza/Italian", "Sandwiches", "French", "Jewish/Kosher", "Thai", "Korean", "Mediterranean", "Irish", "Seafood", "Greek",
+            "Bagels/Pretzels", "Juice, Smoothies, Fruit Salads", "Ice Cream, Gelato, Yogurt, Ices", "Middle Eastern", "Vegetarian",
+            "Steak", "Soul Food", "Turkish", "Peruvian", "Vietnamese/Cambodian/Malaysia", "Russian", "Polish", "Other"]
+STREETS = ["BROADWAY", "WEST   42 STREET", "MAIN STREET", "FLATBUSH AVENUE", "ATLANTIC AVENUE", "3 AVENUE", "QUEENS BOULEVARD", "CANAL STREET",
+           "LEXINGTON AVENUE", "ROOSEVELT AVENUE", "GRAND CONCOURSE", "DUANE STREET", "BEDFORD AVENUE", "STEINWAY STREET"]
+WORDS = ["GOLDEN", "HAPPY", "NEW", "LITTLE", "ROYAL", "BLUE", "SUNNY", "BROOKLYN", "GRAND", "LUCKY", "FAMOUS", "ORIGINAL", "CITY", "PARK", "STAR"]
+KINDS = ["PIZZA", "DELI", "CAFE", "KITCHEN", "GRILL", "BAKERY", "DINER", "GARDEN", "HOUSE", "BISTRO", "EXPRESS", "TAQUERIA", "SUSHI"]
+GRADES = ["A", "A", "A", "A", "B", "C", "Not Yet Graded", "Z", "P"]
+VIOLATIONS = 60
+
+
+def rowCount(size):
+    '''
+    Number of rows of a size such as "100k" or "1M"
+    '''
+    multiplier = {"k": 1000, "m": 1000000}.get(size[-1].lower(), 1)
+    return int(float(size.rstrip("kKmM")) * multiplier)
+
+
+def syntheticChunk(random, rows, establishments, firstRow):
+    '''
+    Rows in the layout of the city data. Every row is a violation of one of the establishments.
+    '''
+    establishment = np.minimum(random.zipf(1.3, rows) - 1, establishments - 1)     #a few establishments have many violations
+    establishment = random.permutation(establishments).take(establishment)
+    popularity = 1.0 / np.arange(1, len(CUISINES) + 1)
+    cuisine = random.choice(len(CUISINES), establishments, p=popularity / popularity.sum()).take(establishment)
+
+    days = np.array([day.strftime("%m/%d/%Y") for day in pd.date_range("2011-01-01", "2015-05-31")], dtype=object)
+    day = random.randint(0, len(days), rows)
+    phones = np.array(["%010d" % (2120000000 + i) for i in xrange(establishments)], dtype=object)
+    phones[::50] = "__________"     #some establishments have no phone number
+    names = np.array(["%s %s %i" % (WORDS[i % len(WORDS)], KINDS[(i // len(WORDS)) % len(KINDS)], i) for i in xrange(establishments)], dtype=object)
+    flag = random.choice(["Critical", "Not Critical", "Not Applicable"], rows, p=[0.55, 0.43, 0.02])
+    violation = random.randint(0, VIOLATIONS, rows)
+
+    return pd.DataFrame({
+        "CAMIS": establishment + 30000000,
+        "DBA": names.take(establishment),
+        "BORO": np.array(BOROS, dtype=object).take(establishment % len(BOROS)),
+        "BUILDING": (establishment % 997) + 1,
+        "STREET": np.array(STREETS, dtype=object).take(establishment % len(STREETS)),
+        "ZIPCODE": 10001 + establishment % 400,
+        "PHONE": phones.take(establishment),
+        "CUISINE DESCRIPTION": np.array(CUISINES, dtype=object).take(cuisine),
+        "INSPECTION DATE": days.take(day),
+        "ACTION": "Violations were cited in the following area(s).",
+        "VIOLATION CODE": np.array(["%02i%s" % (i // 5 + 2, "ABCDE"[i % 5]) for i in xrange(VIOLATIONS)], dtype=object).take(violation),
+        "VIOLATION DESCRIPTION": np.array(["Violation number %i of the health code." % i for i in xrange(VIOLATIONS)], dtype=object).take(violation),
+        "CRITICAL FLAG": flag,
+        "SCORE": random.randint(0, 60, rows),
+        "GRADE": np.array(GRADES, dtype=object).take(random.randint(0, len(GRADES), rows)),
+        "GRADE DATE": days.take(day),
+        "RECORD DATE": "05/31/2015",
+        "INSPECTION TYPE": "Cycle Inspection / Initial Inspection",
+    }, columns=SOURCE_COLUMNS, index=np.arange(firstRow, firstRow + rows))
+
+
+def syntheticSource(rows, folder=FOLDER, seed=0):
+    '''
+    Path of a synthetic csv of rows rows, generated once and reused by later runs
+    '''
+    thisfile = os.path.join(folder, "synthetic_%i_%i.csv" % (rows, seed))
+    if os.path.exists(thisfile):
+        return thisfile
+    if os.path.exists(folder) == False:
+        os.makedirs(folder)
+    random = np.random.RandomState(seed)
+    establishments = max(100, rows // 20)
+    temporary = thisfile + ".tmp"
+    for firstRow in xrange(0, rows, CHUNK_ROWS):
+        chunk = syntheticChunk(random, min(CHUNK_ROWS, rows - firstRow), establishments, firstRow)
+        chunk.to_csv(temporary, index=False, header=firstRow == 0, mode="w" if firstRow == 0 else "a")
+    os.rename(temporary, thisfile)
+    return thisfile
+
+
+def peakMemory():
+    '''
+    Peak resident memory of this process in MB
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0     #bytes on OS X, kilobytes on Linux
+
+
+def timed(stages, errors, name, function, *args):
+    '''
+    Run function(*args), keep its wall time in stages (or its error in errors) and return its result
+    '''
+    start = time.time()
+    try:
+        result = function(*args)
+    except Exception as thisError:     #a broken stage is reported, the other stages still run
+        errors[name] = "%s: %s" % (type(thisError).__name__, thisError)
+        return None
+    stages[name] = time.time() - start
+    return result
+
+
+def stepOrder():
+    '''
+    Artifacts of RestaurantData, every one after the artifacts it needs
+    '''
+    producers = RestaurantData.producers()
+    order = []
+
+    def visit(artifact):
+        if artifact in order or artifact not in producers:
+            return
+        for dependency in producers[artifact].dependencies:
+            visit(dependency)
+        order.append(artifact)
+
+    for artifact in sorted(producers):
+        visit(artifact)
+    return order
+
+
+def benchmarkSize(size, folder=FOLDER, seed=0):
+    '''
+    Time every path on a synthetic csv of the given size (run in a process of its own)
+    '''
+    rows = rowCount(size)
+    start = time.time()
+    thisfile = os.path.abspath(syntheticSource(rows, folder, seed))
+    generated = time.time() - start
+    work = os.path.abspath(os.path.join(folder, "work_%s" % size))
+    if os.path.exists(work):
+        shutil.rmtree(work)
+    os.makedirs(work)
+    os.chdir(work)     #the Keeper store and the charts are written here
+
+    stages = {}
+    errors = {}
+    timed(stages, errors, "sourceReader (no cache)", rt.sourceReader, thisfile, False)
+    sourceCache.clearCache(thisfile)     #kept from an earlier run
+    timed(stages, errors, "sourceReader (cold cache)", rt.sourceReader, thisfile)
+    ratingList = timed(stages, errors, "sourceReader (warm cache)", rt.sourceReader, thisfile)
+    if ratingList is None:
+        return {"rows": rows, "stages": stages, "errors": errors, "peak_mb": peakMemory()}
+
+    app = RestaurantData(ratingList)
+    for artifact in stepOrder():
+        timed(stages, errors, "setup: %s" % artifact, app.require, artifact)
+
+    if app.clean_nyc_restaurant_data is not None:
+        workers = multiprocessing.cpu_count()
+        timed(stages, errors, "aggregates on %i workers" % workers, shardedAggregates, app.clean_nyc_restaurant_data, workers, 1)
+    phoneIndex = timed(stages, errors, "PhoneIndex.fromFrame", PhoneIndex.fromFrame, ratingList)
+    snapshots = timed(stages, errors, "SnapshotTable.fromFrame", SnapshotTable.fromFrame, ratingList)
+    matcher = timed(stages, errors, "TrigramIndex.fromFrame", TrigramIndex.fromFrame, ratingList)
+    random = np.random.RandomState(seed)
+    phones = [phone for phone in random.permutation(pd.unique(ratingList["PHONE"].values))[:1001] if phone != "__________"][:1000]     #distinct phones
+    if phoneIndex is not None:
+        timed(stages, errors, "phone lookups x1000", lambda: [phoneIndex.lookup(ratingList, phone) for phone in phones])
+    if snapshots is not None:
+        timed(stages, errors, "snapshot lookups x1000", lambda: [snapshots.lookup(phone) for phone in phones])
+
+        keeper = KeeperStore(os.path.join(work, "restaurant_list.db"))
+        entries = [({"DBA_fromYelp": "Restaurant %i" % i, "PHONE": phone}, snapshots.lookup(phone)) for i, phone in enumerate(phones[:200])]
+        timed(stages, errors, "Keeper add x200", keeper.add, entries)
+        timed(stages, errors, "Keeper hasPhone x1000", lambda: [keeper.hasPhone(phone) for phone in phones])
+        timed(stages, errors, "Keeper frame x200", lambda: [keeper.frame(phone=phone) for phone in phones[:200]])
+        keeper.close()
+    if matcher is not None:
+        queries = [(matcher.names[i].title(), matcher.addresses[i].title()) for i in random.randint(0, len(matcher), 100)]
+        timed(stages, errors, "fuzzy candidates x100", lambda: [matcher.candidates(name, address) for name, address in queries])
+
+    for chart in sorted(CHART_FILES):
+        timed(stages, errors, "plot: %s" % chart, getattr(app, chart), os.path.join(work, "%s.png" % CHART_FILES[chart]), False)
+    return {"rows": rows, "generated_seconds": generated, "stages": stages, "errors": errors, "peak_mb": peakMemory()}
+
+
+def sizeRunner(connection, size, folder, seed):
+    connection.send(benchmarkSize(size, folder, seed))
+    connection.close()
+
+
+def benchmarkRunner(sizes, folder=FOLDER, seed=0):
+    '''
+    Benchmark every size in a fresh process, return the results document
+    '''
+    results = {}
+    for size in sizes:
+        receiver, sender = multiprocessing.Pipe(False)
+        process = multiprocessing.Process(target=sizeRunner, args=(sender, size, os.path.abspath(folder), seed))     #not a pool worker, it may start its own workers
+        process.start()
+        sender.close()
+        results[size] = receiver.recv()
+        process.join()
+    return {"created": datetime.datetime.now().isoformat(), "python": platform.python_version(), "numpy": np.__version__,
+            "pandas": pd.__version__, "machine": platform.platform(), "cpus": multiprocessing.cpu_count(), "seed": seed, "results": results}
+
+
+def regressionFinder(document, baseline, tolerance=TOLERANCE):
+    '''
+    Stages slower than in baseline by more than tolerance, as (size, stage, baseline seconds, seconds)
+    '''
+    regressions = []
+    for size, result in sorted(document["results"].items()):
+        before = baseline.get("results", {}).get(size)
+        if before is None:
+            continue
+        for stage, seconds in sorted(result["stages"].items()):
+            old = before["stages"].get(stage)
+            if old is not None and seconds > old * (1 + tolerance) and seconds - old > MIN_SECONDS:
+                regressions.append((size, stage, old, seconds))
+    return regressions
+
+
+def benchmarkReport(document, baseline=None):
+    '''
+    Print the timings of every size, next to the baseline when there is one
+    '''
+    for size, result in sorted(document["results"].items(), key=lambda item: item[1]["rows"]):
+        before = (baseline or {}).get("results", {}).get(size, {"stages": {}})
+        print "*"*30
+        print "%s rows (%i), peak memory %.0f MB" % (size, result["rows"], result["peak_mb"])
+        for stage, seconds in sorted(result["stages"].items()):
+            old = before["stages"].get(stage)
+            change = "" if old is None or old == 0 else "  (baseline %.3f s, %+.0f%%)" % (old, 100.0 * (seconds - old) / old)
+            print "  %-48s %9.3f s%s" % (stage, seconds, change)
+        for stage, error in sorted(result["errors"].items()):
+            print "  %-48s FAILED ---> %s" % (stage, error)
+    print "*"*30
+
+
+def argumentParser():
+    parser = argparse.ArgumentParser(description="Benchmark the Restaurant Keeper on synthetic inspection data")
+    parser.add_argument("--sizes", nargs="+", default=SIZES, help="row counts such as 100k or 1M (default: %s)" % " ".join(SIZES))
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file of the results")
+    parser.add_argument("--baseline", default=None, help="JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown before a stage is a regression (0.25 = 25%%)")
+    parser.add_argument("--folder", default=FOLDER, help="where the synthetic files are generated and kept")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+if __name__ == '__main__':
+    options = argumentParser().parse_args()
+    document = benchmarkRunner(options.sizes, options.folder, options.seed)
+    with open(options.output, "w") as output:
+        json.dump(document, output, indent=2, sort_keys=True)
+
+    baseline = None
+    if options.baseline is not None:
+        with open(options.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+    benchmarkReport(document, baseline)
+    if baseline is not None:
+        regressions = regressionFinder(document, baseline, options.tolerance)
+        for size, stage, old, seconds in regressions:
+            print "REGRESSION %s %s: %.3f s -> %.3f s" % (size, stage, old, seconds)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  bulkImport.py
+#
+#  Concurrent fetching of many Yelp pages for the Restaurant Keeper (option 10 of restaurant.py).
+#  All threads share one keep-alive session, requests to the same host are spaced out,
+#  failed requests are retried with backoff and every link gets its own line in the report
+#  instead of stopping the program.
+#
+##########################################################################################
+
+import time
+import threading
+import urlparse
+import requests
+import requests.exceptions
+from requests.adapters import HTTPAdapter
+from multiprocessing.pool import ThreadPool
+
+WORKERS = 8     #pages fetched at the same time
+HOST_INTERVAL = 0.25     #seconds between two requests to the same host
+RETRIES = 3
+BACKOFF = 0.5     #seconds, doubled after every failed attempt
+TIMEOUT = 10
+RETRY_STATUS = (429, 500, 502, 503, 504)     #worth trying again, any other error status is final
+
+
+class HostRateLimiter(object):
+
+    '''
+    Keeps a minimum interval between two requests to the same host, shared by all threads.
+    '''
+
+    def __init__(self, interval=HOST_INTERVAL):
+        self.interval = interval
+        self.nextSlot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, thisAddress):
+        host = urlparse.urlparse(thisAddress).netloc
+        with self.lock:     #book the next free slot of the host, then sleep outside the lock
+            now = time.time()
+            slot = max(now, self.nextSlot.get(host, now))
+            self.nextSlot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def sessionMaker(workers=WORKERS):
+    '''
+    Session with a connection pool large enough for every worker thread
+    '''
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def pageFetcher(session, thisAddress, limiter, retries=RETRIES, backoff=BACKOFF, timeout=TIMEOUT, headers=None):
+    '''
+    Response of a page, retrying connection errors, timeouts and RETRY_STATUS with exponential backoff
+    '''
+    for attempt in xrange(retries + 1):
+        limiter.wait(thisAddress)
+        try:
+            page = session.get(thisAddress, timeout=timeout, headers=headers)
+            if page.status_code not in RETRY_STATUS:
+                page.raise_for_status()     #e.g. 404, retrying will not help
+                return page
+            failure = requests.exceptions.HTTPError("%i Server Error for url: %s" % (page.status_code, thisAddress), response=page)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as thisError:
+            failure = thisError
+        if attempt == retries:
+            raise failure
+        time.sleep(backoff * 2 ** attempt)
+
+
+def linkReader(thisFile):
+    '''
+    Links listed in a file, one per line. Blank lines and lines starting with # are skipped.
+    '''
+    with open(thisFile) as links:
+        return [line.strip().replace(" ", "") for line in links if line.strip() != "" and line.strip().startswith("#") == False]
+
+
+def bulkFetch(linkList, parser, workers=WORKERS, interval=HOST_INTERVAL, retries=RETRIES, backoff=BACKOFF, timeout=TIMEOUT, cache=None):
+    '''
+    Fetch and parse every link concurrently.
+    With a cache (responseCache.ResponseCache) pages that are already cached are not fetched again.
+
+    Returns one dictionary per link, in the order of linkList, with
+      "url": the link
+      "info": what parser returned for the page (None when it failed)
+      "error": None, or a short description of why the link failed
+    '''
+    session = sessionMaker(workers)
+    limiter = HostRateLimiter(interval)
+
+    def getter(thisAddress, headers=None):
+        return pageFetcher(session, thisAddress, limiter, retries, backoff, timeout, headers)
+
+    def fetchOne(thisAddress):
+        try:
+            if cache is None:
+                info = parser(getter(thisAddress).text)
+            else:
+                info = cache.lookup(thisAddress, getter, parser)
+            return {"url": thisAddress, "info": info, "error": None}
+        except Exception as thisError:     #reported per link, one bad link does not stop the others
+            return {"url": thisAddress, "info": None, "error": "%s: %s" % (type(thisError).__name__, thisError)}
+
+    pool = ThreadPool(max(1, min(workers, len(linkList))))
+    try:
+        return pool.map(fetchOne, linkList)
+    finally:
+        pool.close()
+        pool.join()
+        session.close()
+
+
+def importReport(results, added, alreadyStored):
+    '''
+    Print one line per link: added, already stored or the error
+    '''
+    added = set(added)
+    alreadyStored = set(alreadyStored)
+    print "*"*30
+    for result in results:
+        if result["error"] is not None:
+            print "FAILED    %s ---> %s" % (result["url"], result["error"])
+        elif result["info"][0] in alreadyStored:
+            print "STORED    %s ---> %s is already stored" % (result["url"], result["info"][0])
+        elif result["info"][0] in added:
+            print "ADDED     %s ---> %s" % (result["url"], result["info"][0])
+    failed = len([result for result in results if result["error"] is not None])
+    print "%i links: %i added, %i already stored, %i failed" % (len(results), len(added), len(alreadyStored), failed)
+    print "*"*30
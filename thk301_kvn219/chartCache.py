@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  chartCache.py
+#
+#  On-disk cache of the charts rendered by RestaurantData (OpenDataNYC.py).
+#  A chart is keyed by a fingerprint of the data it plots, its parameters (e.g. the file format)
+#  and the source code that draws it (declared next to the chart with drawnWith), so the same chart of the same data is copied from the
+#  cache instead of being laid out again, and a change of the data or of the code renders it anew.
+#
+##########################################################################################
+
+import os
+import shutil
+import inspect
+import hashlib
+import matplotlib
+
+CACHE_FOLDER = os.path.join(".restaurant_cache", "charts")
+MAX_BYTES = 100 * 1024 * 1024     #size limit of the cached charts
+PREVIEW = "png"     #format of the copy shown on screen when a cached chart is displayed
+
+
+def frameFingerprint(frame):
+    '''
+    md5 of the labels and the values of a dataframe
+    '''
+    return hashlib.md5(frame.to_csv().encode('utf-8')).hexdigest()
+
+
+def codeFingerprint(*functions):
+    '''
+    md5 of the source code of functions and of the matplotlib version that draws them
+    '''
+    md5 = hashlib.md5(matplotlib.__version__.encode('utf-8'))
+    for function in functions:
+        md5.update(inspect.getsource(getattr(function, "__wrapped__", function)).encode('utf-8'))     #not the code of a decorator
+    return md5.hexdigest()
+
+
+def drawnWith(*helpers):
+    '''
+    Decorator of a chart method naming the functions it draws with (e.g. chartSaver or a plotting helper of another module).
+    The chart and these functions make the code part of its key, so a change to any of them renders the chart anew.
+    '''
+    def decorate(chart):
+        chart.chartCode = (chart,) + helpers
+        return chart
+    return decorate
+
+
+class ChartCache(object):
+
+    '''
+    Rendered charts keyed by chartKey().
+
+    Attributes:
+      folder (str): where the charts are kept, one file per key and format.
+      maxBytes (int): size limit of the cached charts, least recently used charts are removed first.
+    '''
+
+    def __init__(self, folder=CACHE_FOLDER, maxBytes=MAX_BYTES):
+        self.folder = folder
+        self.maxBytes = maxBytes
+
+    def chartKey(self, chart, frame, code, **params):
+        '''
+        Key of a chart named chart, drawn from frame by the functions in code with params
+        '''
+        md5 = hashlib.md5(chart.encode('utf-8'))
+        md5.update(frameFingerprint(frame).encode('utf-8'))
+        md5.update(codeFingerprint(*code).encode('utf-8'))
+        md5.update(repr(sorted(params.items())).encode('utf-8'))
+        return md5.hexdigest()
+
+    def chartPath(self, key, extension):
+        return os.path.join(self.folder, "%s.%s" % (key, extension))
+
+    def fetch(self, key, extension):
+        '''
+        Path of the cached chart, or None when it is not cached
+        '''
+        thisPath = self.chartPath(key, extension)
+        if os.path.exists(thisPath) == False:
+            return None
+        try:
+            os.utime(thisPath, None)     #most recently used
+        except OSError:
+            pass
+        return thisPath
+
+    def store(self, key, extension, thisPath):
+        '''
+        Copy the rendered file thisPath into the cache
+        '''
+        try:
+            if os.path.exists(self.folder) == False:
+                os.makedirs(self.folder)
+            temporary = self.chartPath(key, extension) + ".%i.tmp" % os.getpid()     #report workers may store at the same time
+            shutil.copyfile(thisPath, temporary)
+            os.rename(temporary, self.chartPath(key, extension))
+            self.evict()
+        except (IOError, OSError):     #the cache is optional
+            pass
+
+    def evict(self):
+        charts = []
+        for name in os.listdir(self.folder):
+            if name.endswith(".tmp") == False:
+                stat = os.stat(os.path.join(self.folder, name))
+                charts.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for used, size, name in charts)
+        for used, size, name in sorted(charts):
+            if total <= self.maxBytes:
+                break
+            os.remove(os.path.join(self.folder, name))
+            total -= size
+
+    def clear(self):
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  compactTable.py
+#
+#  Typed, compact in-memory representation of the inspection data.
+#  Low cardinality text columns become categoricals, dates become datetime64,
+#  ZIPCODE and PHONE become integers and SCORE becomes a float.
+#
+#  To compare the memory use of both representations:
+#      python compactTable.py DOHMH_New_York_City_Restaurant_Inspection_Results.csv
+#
+##########################################################################################
+
+import sys
+import numpy as np
+import pandas as pd
+
+CATEGORY_COLUMNS = ['DBA', 'BORO', 'CUISINE DESCRIPTION', 'VIOLATION DESCRIPTION', 'CRITICAL FLAG', 'GRADE']
+DATE_COLUMNS = ['INSPECTION DATE', 'GRADE DATE']
+INTEGER_COLUMNS = {'ZIPCODE': np.int32, 'PHONE': np.int64}
+FLOAT_COLUMNS = ['SCORE']
+
+
+def toInteger(value):
+    '''
+    Integer of a text value, 0 when there are no digits (e.g. a phone number of "__________")
+    '''
+    digits = "".join(character for character in unicode(value) if character.isdigit())
+    if digits == "":
+        return 0
+    return int(digits)
+
+
+def toFloat(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def compactColumn(column, codes, values):
+    '''
+    Typed column built from integer codes and the distinct values they point to.
+    Every distinct value is converted only once, no matter how many rows use it.
+    '''
+    codes = np.asarray(codes)
+    if column in CATEGORY_COLUMNS:
+        return pd.Categorical.from_codes(codes, values)
+    if column in DATE_COLUMNS:
+        return pd.to_datetime(pd.Series(values)).values.take(codes)
+    if column in INTEGER_COLUMNS:
+        return np.array([toInteger(value) for value in values], dtype=INTEGER_COLUMNS[column]).take(codes)
+    if column in FLOAT_COLUMNS:
+        return np.array([toFloat(value) for value in values], dtype=np.float32).take(codes)
+    return np.asarray(values).astype(object).take(codes)
+
+
+def compactFrame(ratingList):
+    '''
+    Compact copy of a dataframe returned by sourceReader()
+    '''
+    columns = {}
+    for column in ratingList.columns:
+        codes, values = pd.factorize(ratingList[column].values)
+        columns[column] = compactColumn(column, codes, values)
+    return pd.DataFrame(columns, index=ratingList.index, columns=list(ratingList.columns))
+
+
+def extendedColumn(values, replaced, replacing, added):
+    '''
+    Values of a column with the rows at positions replaced overwritten by replacing and the rows of added appended.
+    A categorical column only grows its codes (and its categories by the values it did not have yet),
+    a column that does not change is returned as it is.
+    '''
+    if len(added) == 0:
+        old = np.asarray(values.take(replaced))
+        new = np.asarray(replacing)
+        if ((old == new) | (pd.isnull(old) & pd.isnull(new))).all():
+            return values
+    if isinstance(values, pd.Categorical):
+        newValues = np.concatenate([np.asarray(replacing, dtype=object), np.asarray(added, dtype=object)])
+        categories = pd.Index(values.categories)
+        unseen = pd.unique(newValues[pd.notnull(newValues)])
+        categories = categories.append(pd.Index(unseen[categories.get_indexer(unseen) == -1]))
+        newCodes = categories.get_indexer(newValues)     #a missing value gets -1
+        codes = np.concatenate([np.asarray(values.codes), newCodes[len(replaced):]])
+        codes[replaced] = newCodes[:len(replaced)]
+        return pd.Categorical.from_codes(codes, categories)
+    values = np.concatenate([np.asarray(values), np.asarray(added)])
+    values[replaced] = np.asarray(replacing)
+    return values
+
+
+def isCompact(ratingList):
+    '''
+    True when ratingList holds typed columns (compactFrame) rather than the text of the csv
+    Text columns may be categoricals (e.g. read from the source cache), only dates and numbers are typed
+    '''
+    return any(ratingList[column].dtype != object and str(ratingList[column].dtype) != 'category' for column in ratingList.columns)
+
+
+def textColumn(column, values):
+    '''
+    Text of the values of a column as the csv writes it (the inverse of compactColumn), text values are returned as they are.
+    A date or a number that is missing becomes NaN, a PHONE or ZIPCODE of no digits (0) becomes "".
+    '''
+    values = np.asarray(values)     #categorical values become their text
+    if values.dtype == object:
+        return values
+    codes, distinct = pd.factorize(values)
+    if column in DATE_COLUMNS:
+        text = [np.nan if pd.isnull(date) else pd.Timestamp(date).strftime("%m/%d/%Y") for date in distinct]
+    elif column in INTEGER_COLUMNS:
+        text = [u"%d" % number if number != 0 else u"" for number in distinct]
+    else:
+        text = [u"%g" % number for number in distinct]
+    return np.array(text + [np.nan], dtype=object).take(codes)     #code -1 (NaT, NaN) takes the NaN at the end
+
+
+def textFrame(ratingList):
+    '''
+    Copy of a dataframe returned by compactFrame() in the text of the csv (e.g. to save it in the source cache)
+    '''
+    columns = dict((column, textColumn(column, ratingList[column].values)) for column in ratingList.columns)
+    return pd.DataFrame(columns, index=ratingList.index, columns=list(ratingList.columns))
+
+
+def columnMemoryUsage(series):
+    '''
+    Bytes used by a column, including the Python objects it points to.
+    Objects shared by several rows are counted once.
+    '''
+    if str(series.dtype) == 'category':
+        categories = pd.Series(series.cat.categories)
+        return series.cat.codes.values.nbytes + columnMemoryUsage(categories)
+    values = series.values
+    if values.dtype != object:
+        return values.nbytes
+    distinct = {}
+    for value in values:
+        distinct[id(value)] = value
+    return values.nbytes + sum(sys.getsizeof(value) for value in distinct.itervalues())
+
+
+def frameMemoryUsage(frame):
+    '''
+    Series of the bytes used by every column of frame
+    '''
+    return pd.Series(dict((column, columnMemoryUsage(frame[column])) for column in frame.columns), index=frame.columns)
+
+
+def memoryReport(before, after):
+    '''
+    Print the memory use of two dataframes column by column and return the total ratio
+    '''
+    before = frameMemoryUsage(before)
+    after = frameMemoryUsage(after)
+    megabyte = 1024.0 * 1024.0
+    print "%-25s %12s %12s %8s" % ("Column", "Before (MB)", "After (MB)", "Ratio")
+    print "-" * 60
+    for column in before.index:
+        print "%-25s %12.2f %12.2f %7.1fx" % (column, before[column] / megabyte, after[column] / megabyte, before[column] / float(max(after[column], 1)))
+    print "-" * 60
+    ratio = before.sum() / float(max(after.sum(), 1))
+    print "%-25s %12.2f %12.2f %7.1fx" % ("Total", before.sum() / megabyte, after.sum() / megabyte, ratio)
+    return ratio
+
+
+if __name__ == '__main__':
+    import restaurant as rt
+    thisfile = sys.argv[1] if len(sys.argv) > 1 else "DOHMH_New_York_City_Restaurant_Inspection_Results.csv"
+    memoryReport(rt.sourceReader(thisfile, useCache=False), rt.sourceReader(thisfile, compact=True))
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  deltaIngest.py
+#
+#  Incremental ingest of new or changed inspection rows (option 11 of restaurant.py).
+#  DOHMH publishes new inspections every day. Instead of replacing the csv and recomputing
+#  everything, only the rows of a delta file are matched against the cached table (through the
+#  phone index), and the aggregates of RestaurantData are updated by removing the rows that
+#  changed and adding their new version (aggregationEngine.py). The cache, the phone index, the
+#  snapshots and the name index are patched with the delta rows instead of being built again.
+#
+##########################################################################################
+
+import numpy as np
+import pandas as pd
+
+import sourceCache     #sourceCache.py
+import compactTable     #compactTable.py
+from compactTable import textColumn     #compactTable.py
+from phoneIndex import normalizePhone     #phoneIndex.py
+
+ROW_KEY = ["PHONE", "INSPECTION DATE", "VIOLATION DESCRIPTION"]     #a delta row with the same key replaces the stored row
+
+
+def rowKeys(ratingList):
+    '''
+    Key (ROW_KEY, the phone number normalized) of every row of ratingList, compact or not
+    '''
+    rawCodes, rawPhones = pd.factorize(ratingList["PHONE"].values)
+    phones = np.array([normalizePhone(thisPhone) for thisPhone in textColumn("PHONE", rawPhones)], dtype=object).take(rawCodes)     #each distinct value is cleaned once
+    return zip(phones, *[textColumn(column, ratingList[column].values) for column in ROW_KEY[1:]])
+
+
+def deltaSplitter(ratingList, phoneIndex, delta):
+    '''
+    Match the rows of delta with the rows of ratingList.
+    Only the stored rows of the phone numbers in delta are looked at.
+    Returns (replaced, replacing, added, unchanged):
+      replaced: positions in ratingList of the rows that changed
+      replacing: the new version of these rows (dataframe, same order as replaced)
+      added: rows of delta that are new (dataframe)
+      unchanged: number of delta rows that are already stored as they are
+    When delta holds the same key twice, its last row wins.
+    '''
+    delta = delta[list(ratingList.columns)]
+    keys = rowKeys(delta)
+    last = sorted(dict((key, i) for i, key in enumerate(keys)).values())
+    delta = delta.iloc[last]
+    delta.index = xrange(len(delta))
+    keys = [keys[i] for i in last]
+
+    positions = np.concatenate([phoneIndex.rows(thisPhone) for thisPhone in set(key[0] for key in keys)] + [phoneIndex.order[:0]])
+    stored = dict(zip(rowKeys(ratingList.iloc[positions]), positions))
+    matches = np.array([stored.get(key, -1) for key in keys], dtype=np.int64)
+
+    found = np.where(matches >= 0)[0]
+    same = np.ones(len(found), dtype=bool)
+    for column in delta.columns:     #one vectorized comparison per column
+        old = np.asarray(ratingList[column].values.take(matches[found]))
+        new = np.asarray(delta[column].values.take(found))
+        same &= (old == new) | (pd.isnull(old) & pd.isnull(new))
+    changed = found[~same]
+    return matches[changed], delta.iloc[changed], delta.iloc[np.where(matches < 0)[0]], int(same.sum())
+
+
+def ingestDelta(thisfile, delta, ratingList, phoneIndex, snapshots, app, deltaId=None, matcher=None):
+    '''
+    Apply the rows of delta to the table read from thisfile, its phone index and its snapshots.
+    Nothing is built again from the whole table: every column grows by the delta rows (compactTable.extendedColumn),
+    the phone index, the snapshots and the name index (fuzzyMatcher.py, None when it is not built yet) are patched
+    with them, and only the delta rows are written to the cache of thisfile, with deltaId among its applied deltas.
+    app (OpenDataNYC.RestaurantData) updates its aggregates from the changed rows only.
+    Returns (updated table, its phone index, its snapshots, its name index, report dictionary).
+    report["saved"] is False when the cache could not be written: the indexes stored with it are then out of date.
+    New rows are appended at the end of the table.
+    A compact table (compactTable.py) stays compact, its cache is saved in the text of the csv.
+    '''
+    compact = compactTable.isCompact(ratingList)
+    if compact:     #typed like the table, so that the rows compare
+        delta = compactTable.compactFrame(delta)
+    replaced, replacing, added, unchanged = deltaSplitter(ratingList, phoneIndex, delta)
+
+    columns = dict((column, compactTable.extendedColumn(ratingList[column].values, replaced, replacing[column].values, added[column].values))
+                   for column in ratingList.columns)
+    updated = pd.DataFrame(columns, index=xrange(len(ratingList) + len(added)), columns=ratingList.columns)
+
+    app.applyDelta(updated, replaced, ratingList.iloc[replaced], replacing, added)
+
+    index = phoneIndex.extended(added, len(ratingList))     #a replaced row keeps its phone number, it is part of ROW_KEY
+    changedRows = pd.concat([replacing, added])
+    snapshots = snapshots.refreshed(updated, index, changedRows)
+    if matcher is not None:
+        matcher = matcher.extended(changedRows)
+
+    deltas = sourceCache.appliedDeltas(thisfile)
+    if deltaId is not None:
+        deltas = deltas + [deltaId]
+    if compact:     #the cache holds the text of the csv
+        replacing, added = compactTable.textFrame(replacing), compactTable.textFrame(added)
+    saved = sourceCache.appendCache(thisfile, len(ratingList), replaced, replacing, added, deltas)
+    if saved == False:     #no cache of ratingList to add to
+        saved = sourceCache.saveCache(thisfile, compactTable.textFrame(updated) if compact else updated, deltas)
+    if saved:
+        index.save(thisfile)
+        snapshots.save(thisfile)
+        if matcher is not None:
+            matcher.save(thisfile)
+
+    report = {"rows": len(delta), "added": len(added), "replaced": len(replaced), "unchanged": unchanged, "saved": saved}
+    return updated, index, snapshots, matcher, report
+
+
+def deltaReport(report):
+    '''
+    Print what a delta changed
+    '''
+    print "*"*30
+    print "%i rows read: %i added, %i updated, %i already stored" % (report["rows"], report["added"], report["replaced"], report["unchanged"])
+    if report["saved"] == False:
+        print "The cache of the city data could not be updated, the new records are kept until the program ends"
+    print "*"*30
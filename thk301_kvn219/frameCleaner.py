@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  frameCleaner.py
+#
+#  Cleaning of the inspection data for the analysis of RestaurantData (OpenDataNYC.py),
+#  driven by a table of rules. A rule only touches the columns it names, and it is applied
+#  to the distinct values of a column (its category codes), not to every cell, so cleaning
+#  costs one factorize and one take per column instead of full copies of the whole frame.
+#
+#  To add a rule, add a line to CLEANING_RULES: (column, kind, argument), where kind is
+#  "replace" (argument: {old value: new value}), "missing" (argument: values that mean
+#  "no value", they become NaN) or "float" (the column becomes a number, unparsable values NaN).
+#
+##########################################################################################
+
+import numpy as np
+import pandas as pd
+
+from compactTable import toFloat     #compactTable.py
+
+CLEANING_RULES = [
+    ("CUISINE DESCRIPTION", "replace", {"Latin (Cuban, Dominican, Puerto Rican, South & Central American)": "Latin"}),     #shorter label for plotting
+    ("SCORE", "float", None),
+    ("BORO", "missing", ["Missing"]),
+    ("GRADE", "missing", ["Not Yet Graded"]),
+]
+
+
+def replaceRule(labels, mapping):
+    return np.array([mapping.get(label, label) for label in labels], dtype=object)
+
+
+def missingRule(labels, values):
+    labels = labels.copy()
+    labels[np.in1d(labels, np.array(values, dtype=object))] = np.nan
+    return labels
+
+
+def floatRule(labels, argument):
+    return np.array([toFloat(label) for label in labels], dtype=np.float64)
+
+
+RULES = {"replace": replaceRule, "missing": missingRule, "float": floatRule}
+
+
+def columnCodes(series):
+    '''
+    Integer codes (-1 for missing values) and distinct values of a column, categorical or not
+    '''
+    if str(series.dtype) == 'category':
+        return np.asarray(series.cat.codes, dtype=np.int64), np.asarray(series.cat.categories, dtype=object)
+    codes, labels = pd.factorize(series.values)
+    return np.asarray(codes, dtype=np.int64), np.asarray(labels, dtype=object)
+
+
+def cleanColumn(series, rules):
+    '''
+    Values of a column after its rules, as a categorical when the column is one
+    '''
+    if str(series.dtype) != 'category' and series.dtype != object:     #already typed, e.g. SCORE of the compact mode
+        values = series.values
+        for kind, argument in rules:
+            if kind == "float":
+                values = values.astype(np.float64)
+        return values
+    codes, labels = columnCodes(series)
+    for kind, argument in rules:
+        labels = RULES[kind](labels, argument)
+    if labels.dtype != object:     #numbers
+        return np.append(labels, np.nan).take(codes)     #code -1 takes the NaN at the end
+    labelCodes, distinct = pd.factorize(labels)     #two labels may now be the same, NaN gets -1
+    codes = np.append(labelCodes, -1).take(codes)
+    if str(series.dtype) == 'category':
+        return pd.Categorical.from_codes(codes, distinct)
+    return np.append(np.asarray(distinct, dtype=object), np.nan).take(codes)
+
+
+def cleanFrame(nyc_data, rules=CLEANING_RULES):
+    '''
+    Dataframe of inspection rows with the rules applied, built once; nyc_data is not changed
+    '''
+    columnRules = {}
+    for column, kind, argument in rules:
+        if column in nyc_data.columns:
+            columnRules.setdefault(column, []).append((kind, argument))
+    values = dict((column, cleanColumn(nyc_data[column], columnRules[column]) if column in columnRules else nyc_data[column].values)
+                  for column in nyc_data.columns)
+    return pd.DataFrame(values, index=nyc_data.index, columns=nyc_data.columns)
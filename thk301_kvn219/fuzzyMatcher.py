@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  fuzzyMatcher.py
+#
+#  Fallback for a Yelp restaurant whose phone number is not in the city data:
+#  a trigram index over the name (DBA) and the address (BUILDING STREET) of every establishment.
+#  A query only reads the posting lists of its own trigrams and counts the shared trigrams of
+#  all establishments at once with np.bincount, so no name is compared to the query one by one.
+#
+##########################################################################################
+
+import re
+import numpy as np
+import pandas as pd
+
+import sourceCache     #sourceCache.py
+from snapshotTable import establishmentKeys     #snapshotTable.py
+
+NAME_WEIGHT = 0.6
+ADDRESS_WEIGHT = 0.3
+ZIPCODE_WEIGHT = 0.1
+ABBREVIATIONS = {"st": "street", "ave": "avenue", "av": "avenue", "blvd": "boulevard", "rd": "road", "pl": "place", "pkwy": "parkway",
+                 "hwy": "highway", "ln": "lane", "dr": "drive", "sq": "square", "ter": "terrace", "e": "east", "w": "west",
+                 "n": "north", "s": "south", "&": "and"}     #Yelp abbreviates, the city data does not
+
+
+def normalizeText(text):
+    '''
+    Lower case words of a name or an address, without punctuation and with the abbreviations spelled out
+    '''
+    words = re.findall(r"[0-9a-z&]+", unicode(text).lower().replace("'", ""))
+    return u" ".join(ABBREVIATIONS.get(word, word) for word in words)
+
+
+def trigrams(text):
+    '''
+    Distinct 3-letter pieces of a normalized text, padded so short words still have some
+    '''
+    text = u"  %s " % normalizeText(text)
+    return set(text[i:i + 3] for i in xrange(len(text) - 2))
+
+
+class TrigramIndex(object):
+
+    '''
+    Trigram posting lists of the names and addresses of the establishments.
+
+    Attributes:
+      keys (np.array): establishment key (snapshotTable.establishmentKeys) of every document.
+      names, addresses, zipcodes (np.array): DBA, "BUILDING STREET" and ZIPCODE of every document.
+      fields (dict): "name" / "address" -> (grams, starts, postings, sizes): sorted trigrams, start of the posting list
+                     of every trigram in postings (plus the end), document ids, and the number of trigrams of every document.
+    '''
+
+    def __init__(self, keys, names, addresses, zipcodes, fields):
+        self.keys = keys
+        self.names = names
+        self.addresses = addresses
+        self.zipcodes = zipcodes
+        self.fields = fields
+
+    @staticmethod
+    def postingLists(texts):
+        grams = [sorted(trigrams(text)) for text in texts]
+        sizes = np.array([len(documentGrams) for documentGrams in grams], dtype=np.int32)
+        documents = np.repeat(np.arange(len(grams), dtype=np.int32), sizes)
+        codes, labels = pd.factorize(np.array([gram for documentGrams in grams for gram in documentGrams], dtype=object))
+        labelOrder = np.argsort(labels)
+        ranks = np.empty(len(labels), dtype=np.int64)
+        ranks[labelOrder] = np.arange(len(labels))
+        codes = ranks.take(codes)     #codes of the sorted trigrams
+        order = np.argsort(codes, kind='mergesort')
+        starts = np.r_[0, np.cumsum(np.bincount(codes, minlength=len(labels)))]
+        return (np.asarray(labels, dtype=object)[labelOrder], starts, documents[order], sizes)
+
+    @staticmethod
+    def mergedPostings(stored, added, offset):
+        '''
+        Posting lists of the documents of stored and of added together, the document ids of added starting at offset
+        '''
+        grams, starts, postings, sizes = stored
+        addedGrams, addedStarts, addedPostings, addedSizes = added
+        allGrams = np.union1d(grams, addedGrams)
+        storedAt = np.searchsorted(allGrams, grams)
+        addedAt = np.searchsorted(allGrams, addedGrams)
+        storedCounts = np.zeros(len(allGrams), dtype=np.int64)
+        storedCounts[storedAt] = np.diff(starts)
+        addedCounts = np.zeros(len(allGrams), dtype=np.int64)
+        addedCounts[addedAt] = np.diff(addedStarts)
+        allStarts = np.r_[0, np.cumsum(storedCounts + addedCounts)]
+
+        allPostings = np.empty(allStarts[-1], dtype=np.int32)     #in every posting list the stored documents come first
+        allPostings[np.repeat(allStarts[storedAt] - starts[:-1], np.diff(starts)) + np.arange(len(postings))] = postings
+        allPostings[np.repeat(allStarts[addedAt] + storedCounts[addedAt] - addedStarts[:-1], np.diff(addedStarts)) + np.arange(len(addedPostings))] = addedPostings + offset
+        return (allGrams, allStarts, allPostings, np.concatenate([sizes, addedSizes]))
+
+    @staticmethod
+    def documents(ratingList):
+        '''
+        Key, DBA, "BUILDING STREET" and ZIPCODE of every distinct establishment of ratingList, from its first row, in key order
+        '''
+        keyCodes, labels = pd.factorize(establishmentKeys(ratingList))
+        first = np.unique(keyCodes, return_index=True)[1]
+        names = np.asarray(ratingList["DBA"].iloc[first].values, dtype=object)
+        addresses = np.array([u"%s %s" % (building, street) for building, street in
+                              zip(ratingList["BUILDING"].values.take(first), ratingList["STREET"].values.take(first))], dtype=object)
+        zipcodes = np.array([unicode(zipcode) for zipcode in ratingList["ZIPCODE"].values.take(first)], dtype=object)
+        return np.asarray(labels, dtype=object), names, addresses, zipcodes
+
+    @classmethod
+    def fromFrame(cls, ratingList):
+        '''
+        Index the distinct establishments of ratingList (one document per establishment key)
+        '''
+        keys, names, addresses, zipcodes = cls.documents(ratingList)
+        fields = {"name": cls.postingLists(names), "address": cls.postingLists(addresses)}
+        return cls(keys, names, addresses, zipcodes, fields)
+
+    def extended(self, rows):
+        '''
+        Index with a new document for every establishment of the dataframe rows that it does not have yet (e.g. the rows of a delta, deltaIngest.py).
+        Only the trigrams of the new documents are computed, their posting lists are merged with the stored ones.
+        The establishments already indexed keep the name and the address of their first row.
+        '''
+        keys, names, addresses, zipcodes = self.documents(rows)
+        new = pd.Index(self.keys).get_indexer(keys) == -1
+        if new.any() == False:
+            return self
+        names, addresses = names[new], addresses[new]
+        fields = {"name": self.mergedPostings(self.fields["name"], self.postingLists(names), len(self.keys)),
+                  "address": self.mergedPostings(self.fields["address"], self.postingLists(addresses), len(self.keys))}
+        return TrigramIndex(np.concatenate([self.keys, keys[new]]), np.concatenate([self.names, names]),
+                            np.concatenate([self.addresses, addresses]), np.concatenate([self.zipcodes, zipcodes[new]]), fields)
+
+    @classmethod
+    def forSource(cls, thisfile, ratingList):
+        '''
+        Index of ratingList read from thisfile, stored alongside the data cache of thisfile
+        '''
+        arrays = sourceCache.loadArrays(thisfile, "trigrams")
+        if arrays is not None:
+            fields = dict((field, (arrays[field + "_grams"].astype(object), arrays[field + "_starts"], arrays[field + "_postings"], arrays[field + "_sizes"]))
+                          for field in ["name", "address"])
+            return cls(arrays["keys"].astype(object), arrays["names"].astype(object), arrays["addresses"].astype(object), arrays["zipcodes"].astype(object), fields)
+        index = cls.fromFrame(ratingList)
+        index.save(thisfile)
+        return index
+
+    def save(self, thisfile):
+        '''
+        Store the index with the data cache of thisfile, where forSource() reads it
+        '''
+        arrays = {"keys": self.keys, "names": self.names, "addresses": self.addresses, "zipcodes": self.zipcodes}
+        arrays = dict((name, np.array(list(values), dtype=np.unicode_)) for name, values in arrays.items())
+        for field, (grams, starts, postings, sizes) in self.fields.items():
+            arrays.update({field + "_grams": np.array(list(grams), dtype=np.unicode_), field + "_starts": starts, field + "_postings": postings, field + "_sizes": sizes})
+        sourceCache.saveArrays(thisfile, "trigrams", arrays)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def similarity(self, field, text):
+        '''
+        Dice coefficient of the trigrams of text and of every document, for one field
+        '''
+        grams, starts, postings, sizes = self.fields[field]
+        queryGrams = trigrams(text)
+        found = np.searchsorted(grams, sorted(queryGrams)) if len(grams) > 0 else np.array([], dtype=np.int64)
+        found = [position for position, gram in zip(found, sorted(queryGrams)) if position < len(grams) and grams[position] == gram]
+        if len(found) == 0:
+            return np.zeros(len(self.keys))
+        shared = np.bincount(np.concatenate([postings[starts[position]:starts[position + 1]] for position in found]), minlength=len(self.keys))
+        return 2.0 * shared / (sizes + len(queryGrams))
+
+    def candidates(self, name, address=u"", zipcode=None, limit=5):
+        '''
+        Best matching establishments of a name and an address, best first.
+        Returns a list of dictionaries with "key", "DBA", "ADDRESS", "ZIPCODE" and "score" (0 to 1).
+        '''
+        score = NAME_WEIGHT * self.similarity("name", name)
+        if address:
+            score += ADDRESS_WEIGHT * self.similarity("address", address)
+            if zipcode is None:     #Yelp addresses may end with the zip code
+                found = re.findall(r"\b(\d{5})\b", unicode(address))
+                zipcode = found[-1] if found else None
+        if zipcode is not None:
+            score += ZIPCODE_WEIGHT * (self.zipcodes == unicode(zipcode))
+        matched = np.where(score > 0)[0]
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-score[matched], limit - 1)[:limit]]
+        matched = matched[np.argsort(-score[matched], kind='mergesort')]
+        return [{"key": self.keys[i], "DBA": self.names[i], "ADDRESS": self.addresses[i], "ZIPCODE": self.zipcodes[i], "score": float(score[i])}
+                for i in matched]
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  heatGrid.py
+#
+#  Sparse grids of the inspection data for the heatmaps of RestaurantData (OpenDataNYC.py):
+#  the count and the mean SCORE of any two dimensions (e.g. ZIPCODE x CUISINE DESCRIPTION or
+#  CUISINE DESCRIPTION x MONTH). The two columns are factorized, and only the cells that hold
+#  rows are kept (np.bincount of the cell codes, np.unique when there are more cells than rows). The labels come from the
+#  data, and gridPlotter() draws the cells that are not empty, nothing else.
+#
+##########################################################################################
+
+import numpy as np
+import pandas as pd
+from matplotlib.collections import PolyCollection
+
+from aggregationEngine import factorized     #aggregationEngine.py
+from timeline import parseDates     #timeline.py
+
+DIMENSION_NAMES = {"cuisine": "CUISINE DESCRIPTION", "boro": "BORO", "zipcode": "ZIPCODE", "month": "MONTH", "dba": "DBA", "grade": "GRADE"}
+MAX_TICKS = 60     #more labels than that and only every n-th one is written
+
+
+def dimensionCodes(frame, dimension):
+    '''
+    Codes and labels of a column, or of the month of INSPECTION DATE for "MONTH" ("2014-03")
+    '''
+    if dimension == "MONTH":
+        months = parseDates(frame["INSPECTION DATE"].values).astype('datetime64[M]')
+        codes, labels = pd.factorize(months)     #NaT gets -1
+        return np.asarray(codes, dtype=np.int64), np.array([str(month)[:7] for month in np.asarray(labels, dtype='datetime64[M]')], dtype=object)
+    return factorized(frame[dimension])
+
+
+def sortedCodes(codes, labels):
+    '''
+    The same codes and labels with the labels sorted (code -1 stays -1)
+    '''
+    order = np.argsort(labels, kind='mergesort')
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return np.append(rank, -1).take(codes), np.asarray(labels, dtype=object)[order]
+
+
+def cellCodes(composite, cellCount):
+    '''
+    Sorted distinct cell codes and the position of every row among them, like np.unique(composite, return_inverse=True)
+    '''
+    if cellCount <= len(composite):     #a table of every cell is no larger than the rows: count them instead of sorting
+        used = np.bincount(composite, minlength=cellCount) > 0
+        cells = np.where(used)[0]
+        position = np.cumsum(used) - 1
+        return cells, position.take(composite)
+    return np.unique(composite, return_inverse=True)
+
+
+class SparseGrid(object):
+
+    '''
+    Count and SCORE sum of the non-empty cells of a grid of two dimensions.
+
+    Attributes:
+      rowName, columnName (str): the two dimensions.
+      rowLabels, columnLabels (np.array): sorted labels, the code of a label is its position.
+      rows, columns (np.array): codes of the non-empty cells, sorted by row then column.
+      size (np.array): inspection rows of every cell.
+      count, total (np.array): count and sum of the known SCOREs of every cell.
+    '''
+
+    def __init__(self, rowName, columnName, rowLabels, columnLabels, rows, columns, size, count, total):
+        self.rowName = rowName
+        self.columnName = columnName
+        self.rowLabels = rowLabels
+        self.columnLabels = columnLabels
+        self.rows = rows
+        self.columns = columns
+        self.size = size
+        self.count = count
+        self.total = total
+
+    @classmethod
+    def fromFrame(cls, frame, rowName="CUISINE DESCRIPTION", columnName="BORO"):
+        '''
+        Grid of a cleaned inspection dataframe (see RestaurantData.setUpNYCRestaurantData)
+        '''
+        rows, rowLabels = sortedCodes(*dimensionCodes(frame, rowName))
+        columns, columnLabels = sortedCodes(*dimensionCodes(frame, columnName))
+        score = np.asarray(frame["SCORE"].values, dtype=np.float64)
+        valid = (rows >= 0) & (columns >= 0)
+        known = np.isnan(score[valid]) == False
+        cells, inverse = cellCodes(rows[valid] * len(columnLabels) + columns[valid], len(rowLabels) * len(columnLabels))
+        return cls(rowName, columnName, rowLabels, columnLabels, cells // len(columnLabels), cells % len(columnLabels),
+                   np.bincount(inverse, minlength=len(cells)),
+                   np.bincount(inverse, weights=known, minlength=len(cells)).astype(np.int64),
+                   np.bincount(inverse, weights=np.where(known, score[valid], 0.0), minlength=len(cells)))
+
+    @classmethod
+    def fromAggregates(cls, aggregates):
+        '''
+        CUISINE DESCRIPTION x BORO grid of a ViolationAggregates (no rows needed, e.g. in streaming mode)
+        '''
+        cuisines = np.argsort(aggregates.labels["CUISINE DESCRIPTION"], kind='mergesort')
+        boros = np.argsort(aggregates.labels["BORO"], kind='mergesort')
+        groupRows = aggregates.groupRows[np.ix_(cuisines, boros)]
+        rows, columns = np.nonzero(groupRows)
+        return cls("CUISINE DESCRIPTION", "BORO", aggregates.labels["CUISINE DESCRIPTION"][cuisines], aggregates.labels["BORO"][boros], rows, columns,
+                   groupRows[rows, columns], aggregates.scoreCount[np.ix_(cuisines, boros)][rows, columns],
+                   aggregates.scoreSum[np.ix_(cuisines, boros)][rows, columns])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def mean(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > 0, self.total / np.maximum(self.count, 1), np.nan)
+
+    def selected(self, cells):
+        '''
+        Grid of some of the cells (a boolean array), without the labels left with no cell
+        '''
+        usedRows = np.unique(self.rows[cells])
+        usedColumns = np.unique(self.columns[cells])
+        return SparseGrid(self.rowName, self.columnName, self.rowLabels[usedRows], self.columnLabels[usedColumns],
+                          np.searchsorted(usedRows, self.rows[cells]), np.searchsorted(usedColumns, self.columns[cells]),
+                          self.size[cells], self.count[cells], self.total[cells])
+
+    def masked(self, minCount=1):
+        '''
+        Grid of the cells with at least minCount known SCOREs (a mean of a few rows says little)
+        '''
+        return self.selected(self.count >= minCount)
+
+    def restricted(self, rowLabels):
+        '''
+        Grid of the rows of rowLabels only
+        '''
+        return self.selected(np.in1d(self.rowLabels, np.asarray(rowLabels, dtype=object))[self.rows])
+
+    def topRows(self, n):
+        '''
+        The n row labels with the most inspection rows
+        '''
+        totals = np.bincount(self.rows, weights=self.size, minlength=len(self.rowLabels))
+        order = np.argsort(-totals, kind='mergesort')[:n]
+        return self.rowLabels[order].tolist()
+
+    def cells(self):
+        '''
+        Data frame of the non-empty cells: the two labels, ROWS, COUNT and MEAN
+        '''
+        return pd.DataFrame({self.rowName: self.rowLabels[self.rows], self.columnName: self.columnLabels[self.columns],
+                             "ROWS": self.size, "COUNT": self.count, "MEAN": self.mean()},
+                            columns=[self.rowName, self.columnName, "ROWS", "COUNT", "MEAN"])
+
+    def frame(self):
+        '''
+        Dense data frame of the mean SCORE (NaN in the empty cells), for printing a small grid
+        '''
+        dense = np.empty((len(self.rowLabels), len(self.columnLabels)))
+        dense.fill(np.nan)
+        dense[self.rows, self.columns] = self.mean()
+        return pd.DataFrame(dense, index=pd.Index(self.rowLabels, name=self.rowName), columns=pd.Index(self.columnLabels, name=self.columnName))
+
+
+def tickLabels(labels):
+    '''
+    Positions and labels of the ticks, every label up to MAX_TICKS
+    '''
+    every = max(1, int(np.ceil(len(labels) / float(MAX_TICKS))))
+    positions = np.arange(0, len(labels), every)
+    return positions + 0.5, [labels[i] for i in positions]
+
+
+def gridPlotter(grid, ax, cmap):
+    '''
+    Draw the non-empty cells of grid on ax, colored by mean SCORE, and return the collection (for a colorbar)
+    '''
+    x = grid.columns.astype(np.float64)
+    y = grid.rows.astype(np.float64)
+    corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=np.float64)
+    cells = np.dstack([x[:, None] + corners[:, 0], y[:, None] + corners[:, 1]])     #one square per cell
+    collection = PolyCollection(cells, cmap=cmap, edgecolors="none")
+    collection.set_array(np.ma.masked_invalid(grid.mean()))
+    ax.add_collection(collection)
+    ax.set_xlim(0, len(grid.columnLabels))
+    ax.set_ylim(0, len(grid.rowLabels))
+    positions, labels = tickLabels(grid.columnLabels)
+    ax.set_xticks(positions, minor=False)
+    ax.set_xticklabels(labels, minor=False, rotation=90 if len(grid.columnLabels) > 12 else 0)
+    positions, labels = tickLabels(grid.rowLabels)
+    ax.set_yticks(positions, minor=False)
+    ax.set_yticklabels(labels, minor=False)
+    return collection
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  keeperRefresh.py
+#
+#  Refresh of the Restaurant Keeper (option 12 of restaurant.py). The snapshot of a restaurant
+#  is taken when it is added, so newer inspections never showed and "To be Updated" entries
+#  never resolved. Every restaurant of the Keeper is joined by PHONE (or by the establishment KEY
+#  chosen by name and address when it was added) with the snapshots of the current city data (snapshotTable.py) in one pass, the columns are compared as arrays and
+#  only the restaurants whose snapshot changed are written back.
+#
+##########################################################################################
+
+import numpy as np
+import pandas as pd
+
+from keeperStore import textOf     #keeperStore.py
+from phoneIndex import normalizePhone     #phoneIndex.py
+from snapshotTable import SNAPSHOT_COLUMNS, COUNT_COLUMNS     #snapshotTable.py
+
+PLACEHOLDER = "To be Updated"
+CHANGE_COLUMNS = ["DBA_fromYelp", "PHONE", "FOUND", "NEW INSPECTION", "NEW VIOLATIONS", "NEW CRITICAL", "OLD GRADE", "GRADE", "INSPECTION DATE"]
+
+
+def textColumn(values):
+    '''
+    Text of every value as the Keeper stores it (keeperStore.textOf), each distinct value converted once
+    '''
+    codes, distinct = pd.factorize(np.asarray(values, dtype=object))
+    return np.array([textOf(value) for value in distinct] + [u""], dtype=object).take(codes)     #code -1 (missing) takes the ""
+
+
+def countColumn(values):
+    return np.asarray(pd.Series(values).fillna(0).values, dtype=np.int64)
+
+
+def refreshPlan(keeper, snapshots):
+    '''
+    Compare the restaurants of the Keeper with the snapshots of the city data.
+
+    Args:
+      keeper (Pandas DataFrame): KeeperStore.frame(), one row per restaurant.
+      snapshots (SnapshotTable): snapshots of the current city data.
+
+    A restaurant is looked up by its KEY when it has one (it was matched by name and address), by its PHONE otherwise.
+
+    Returns (updates, report):
+      updates: PHONE and KEY (as stored) and SNAPSHOT_COLUMNS of the restaurants whose snapshot changed
+      report: counts of restaurants checked, updated, unchanged and not in the city data, and
+              "changes": one row per updated restaurant (CHANGE_COLUMNS)
+    A restaurant that is not in the city data keeps its snapshot.
+    '''
+    storedKeys = textColumn(keeper["KEY"].values)
+    keys = np.array([storedKey or normalizePhone(thisPhone) for storedKey, thisPhone in zip(storedKeys, keeper["PHONE"].values)], dtype=object)
+    positions = snapshots.frame.index.get_indexer(keys) if len(keys) > 0 else np.array([], dtype=np.int64)     #-1 when the phone number is not in the data
+    found = np.where(positions >= 0)[0]
+    old = keeper.iloc[found]
+    new = snapshots.frame.iloc[positions[found]]
+
+    changed = np.zeros(len(found), dtype=bool)
+    for column in SNAPSHOT_COLUMNS:
+        if column in COUNT_COLUMNS:
+            changed |= countColumn(old[column].values) != countColumn(new[column].values)
+        else:
+            changed |= textColumn(old[column].values) != textColumn(new[column].values)
+
+    old = old.iloc[np.where(changed)[0]]
+    new = new.iloc[np.where(changed)[0]]
+    updates = pd.DataFrame(dict([("PHONE", old["PHONE"].values), ("KEY", textColumn(old["KEY"].values))] + [(column, new[column].values) for column in SNAPSHOT_COLUMNS]),
+                           columns=["PHONE", "KEY"] + SNAPSHOT_COLUMNS)
+
+    oldDates = textColumn(old["INSPECTION DATE"].values)
+    oldCritical = countColumn(old["TOTAL CRITICAL"].values)
+    oldViolations = oldCritical + countColumn(old["TOTAL NOT CRITICAL"].values)
+    newCritical = countColumn(new["TOTAL CRITICAL"].values)
+    newViolations = newCritical + countColumn(new["TOTAL NOT CRITICAL"].values)
+    changes = pd.DataFrame({"DBA_fromYelp": old["DBA_fromYelp"].values, "PHONE": old["PHONE"].values,
+                            "FOUND": oldDates == PLACEHOLDER,     #was a placeholder, now in the city data
+                            "NEW INSPECTION": oldDates != textColumn(new["INSPECTION DATE"].values),
+                            "NEW VIOLATIONS": np.maximum(newViolations - oldViolations, 0),
+                            "NEW CRITICAL": np.maximum(newCritical - oldCritical, 0),
+                            "OLD GRADE": textColumn(old["GRADE"].values), "GRADE": textColumn(new["GRADE"].values),
+                            "INSPECTION DATE": textColumn(new["INSPECTION DATE"].values)}, columns=CHANGE_COLUMNS)
+    report = {"restaurants": len(keeper), "updated": len(updates), "unchanged": len(found) - len(updates),
+              "missing": len(keeper) - len(found), "changes": changes}
+    return updates, report
+
+
+def refreshReport(report):
+    '''
+    Print what a refresh changed
+    '''
+    changes = report["changes"]
+    print "*"*30
+    print "%i restaurants checked: %i updated, %i unchanged, %i not in the city data" % (report["restaurants"], report["updated"], report["unchanged"], report["missing"])
+    for i in xrange(len(changes)):
+        thisChange = changes.iloc[i]
+        if thisChange["FOUND"]:
+            print "%s is now found in the city data: grade %s, inspected %s" % (thisChange["DBA_fromYelp"], thisChange["GRADE"], thisChange["INSPECTION DATE"])
+            continue
+        if thisChange["NEW VIOLATIONS"] > 0:
+            print "%s has %i new violations (%i critical), latest inspection %s" % (thisChange["DBA_fromYelp"], thisChange["NEW VIOLATIONS"], thisChange["NEW CRITICAL"], thisChange["INSPECTION DATE"])
+        if thisChange["GRADE"] != thisChange["OLD GRADE"]:
+            print "%s changed grade: %s -> %s" % (thisChange["DBA_fromYelp"], thisChange["OLD GRADE"] or "none", thisChange["GRADE"] or "none")
+    print "*"*30
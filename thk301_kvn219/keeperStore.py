@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  keeperStore.py
+#
+#  SQLite store of the Restaurant Keeper (it used to be the tab separated restaurant_list.csv).
+#  Restaurants are keyed and indexed by PHONE and indexed by DBA_fromYelp, so adding or deleting
+#  a restaurant touches only its own rows instead of rewriting the whole list.
+#  Every restaurant keeps one snapshot of the city data (snapshotTable.py) instead of a copy of
+#  all its violation rows.
+#  An existing restaurant_list.csv, or an inspections table of an earlier store, is converted once
+#  by KeeperStore.upgrade(), which only the Keeper of restaurant.py calls.
+#
+##########################################################################################
+
+import os
+import sqlite3
+import pandas as pd
+
+from snapshotTable import SnapshotTable, SNAPSHOT_COLUMNS, COUNT_COLUMNS, placeholderSnapshot     #snapshotTable.py
+
+STORE_FILE = "restaurant_list.db"
+LEGACY_FILE = "restaurant_list.csv"
+
+RESTAURANT_COLUMNS = ["ADDRESS", "CITY", "DBA_fromYelp", "PHONE", "PRICE", "REVIEW", "WEB"]     #from Yelp
+KEEPER_COLUMNS = RESTAURANT_COLUMNS + SNAPSHOT_COLUMNS + ["KEY"]
+SNAPSHOT_INSERT = "INSERT OR REPLACE INTO snapshots (PHONE, KEY, %s) VALUES (?, ?, %s)" % (", ".join('"%s"' % column for column in SNAPSHOT_COLUMNS), ", ".join("?" * len(SNAPSHOT_COLUMNS)))
+
+
+def quoted(column):
+    return '"%s"' % column
+
+
+def textOf(value):
+    '''
+    Text stored in the database ("" for missing values)
+    '''
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float) and value.is_integer():     #e.g. a SCORE of 9.0 read back by pandas
+        return unicode(int(value))
+    return unicode(value)
+
+
+def snapshotValues(thisPhoneNum, snapshot):
+    '''
+    Row of the snapshots table of a phone number and its snapshot (dictionary, "KEY" if it was matched by name and address)
+    '''
+    return [textOf(thisPhoneNum), textOf(snapshot.get("KEY"))] + [int(snapshot.get(column, 0)) if column in COUNT_COLUMNS else textOf(snapshot.get(column)) for column in SNAPSHOT_COLUMNS]
+
+
+def snapshotOf(rows):
+    '''
+    Snapshot (dictionary) of the inspection rows of one restaurant
+    '''
+    if rows.empty:
+        return placeholderSnapshot()
+    return dict(SnapshotTable.fromFrame(rows, keys=[0] * len(rows)).frame.iloc[0])
+
+
+class KeeperStore(object):
+
+    '''
+    Restaurant Keeper backed by an SQLite file.
+
+    Tables:
+      restaurants: one row per restaurant found on Yelp, PHONE is the primary key.
+      snapshots: latest inspection and violation totals of a restaurant from the city data, PHONE is the primary key.
+                 KEY is the establishment key (snapshotTable.establishmentKeys) of a restaurant matched by name
+                 and address, "" when it is found by its phone number.
+    '''
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.createTables()
+
+    def upgrade(self, legacyPath=LEGACY_FILE):
+        '''
+        Bring in the data of earlier versions: the inspections table of the store and the legacy csv (None to skip it).
+        Only the Keeper of restaurant.py calls it, a store opened to read (charts, query server) is never changed.
+        '''
+        if self.hasTable("inspections"):
+            self.migrateInspections()
+        if legacyPath is not None and os.path.exists(legacyPath) and self.isMigrated() == False:
+            self.migrate(legacyPath)
+
+    def createTables(self):
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS restaurants (id INTEGER PRIMARY KEY AUTOINCREMENT, %s, UNIQUE (PHONE))"
+                                    % ", ".join(quoted(column) + " TEXT" for column in RESTAURANT_COLUMNS))
+            self.connection.execute("CREATE TABLE IF NOT EXISTS snapshots (PHONE TEXT PRIMARY KEY, KEY TEXT, %s)"
+                                    % ", ".join(quoted(column) + (" INTEGER" if column in COUNT_COLUMNS else " TEXT") for column in SNAPSHOT_COLUMNS))
+            if "KEY" not in [column[1] for column in self.connection.execute("PRAGMA table_info(snapshots)")]:     #a store of an earlier version
+                self.connection.execute("ALTER TABLE snapshots ADD COLUMN KEY TEXT")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS restaurants_name ON restaurants (DBA_fromYelp)")
+
+    def hasTable(self, table):
+        return self.connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+    def isMigrated(self):
+        return self.connection.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone() is not None
+
+    def migrate(self, legacyPath):
+        '''
+        One-time import of a restaurant_list.csv written by earlier versions
+        '''
+        legacy = pd.io.parsers.read_csv(legacyPath, sep="\t", dtype=object)
+        entries = []
+        for thisPhoneNum, rows in legacy.groupby("PHONE", sort=False):
+            entries.append((dict(rows.iloc[0][RESTAURANT_COLUMNS]), snapshotOf(rows)))
+        entries.reverse()     #the file lists the latest restaurant first
+        with self.connection:
+            self.insert(entries)
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('migrated', ?)", (legacyPath,))
+
+    def migrateInspections(self):
+        '''
+        One-time conversion of the inspection rows kept by earlier versions of the store into snapshots.
+        The rows are kept in the inspections_legacy table.
+        '''
+        inspections = pd.read_sql_query("SELECT * FROM inspections ORDER BY id", self.connection)
+        with self.connection:
+            for thisPhoneNum, rows in inspections.groupby("PHONE", sort=False):
+                self.insertSnapshot(thisPhoneNum, snapshotOf(rows))
+            self.connection.execute("ALTER TABLE inspections RENAME TO inspections_legacy")
+
+    def insertSnapshot(self, thisPhoneNum, snapshot):
+        self.connection.execute(SNAPSHOT_INSERT, snapshotValues(thisPhoneNum, snapshot))
+
+    def updateSnapshots(self, updates):
+        '''
+        Replace the snapshots of some restaurants in one transaction.
+        updates is a dataframe of PHONE, KEY and SNAPSHOT_COLUMNS (see keeperRefresh.refreshPlan).
+        '''
+        with self.connection:
+            self.connection.executemany(SNAPSHOT_INSERT, [snapshotValues(thisPhoneNum, dict(zip(["KEY"] + SNAPSHOT_COLUMNS, values)))
+                                                          for thisPhoneNum, values in zip(updates["PHONE"].values, updates[["KEY"] + SNAPSHOT_COLUMNS].values)])
+
+    def insert(self, entries):
+        for restaurant, snapshot in entries:
+            self.connection.execute("INSERT INTO restaurants (%s) VALUES (%s)" % (", ".join(quoted(column) for column in RESTAURANT_COLUMNS), ", ".join("?" * len(RESTAURANT_COLUMNS))),
+                                    [textOf(restaurant.get(column)) for column in RESTAURANT_COLUMNS])
+            self.insertSnapshot(restaurant["PHONE"], snapshot)
+
+    def add(self, entries):
+        '''
+        Add restaurants in one transaction.
+        entries is a list of (restaurant, snapshot): dictionaries of the Yelp information
+        and of the snapshot of the restaurant in the city data (snapshotTable.py).
+        '''
+        with self.connection:
+            self.insert(entries)
+
+    def hasPhone(self, thisPhoneNum):
+        return self.connection.execute("SELECT 1 FROM restaurants WHERE PHONE = ?", (textOf(thisPhoneNum),)).fetchone() is not None
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM restaurants").fetchone()[0]
+
+    def delete(self, thisPhoneNum):
+        '''
+        Remove one restaurant
+        '''
+        with self.connection:
+            self.connection.execute("DELETE FROM restaurants WHERE PHONE = ?", (textOf(thisPhoneNum),))
+            self.connection.execute("DELETE FROM snapshots WHERE PHONE = ?", (textOf(thisPhoneNum),))
+
+    def deleteAll(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM restaurants")
+            self.connection.execute("DELETE FROM snapshots")
+
+    def frame(self, phone=None, name=None):
+        '''
+        Dataframe of the restaurants and their snapshots, one row per restaurant, latest restaurant first.
+        phone or name keep only that restaurant (both use an index).
+        '''
+        query = "SELECT %s FROM restaurants r LEFT JOIN snapshots s ON s.PHONE = r.PHONE" % ", ".join(
+            ("r." if column in RESTAURANT_COLUMNS else "s.") + quoted(column) for column in KEEPER_COLUMNS)
+        params = []
+        if phone is not None:
+            query += " WHERE r.PHONE = ?"
+            params.append(textOf(phone))
+        elif name is not None:
+            query += " WHERE r.DBA_fromYelp = ?"
+            params.append(name)
+        query += " ORDER BY r.id DESC"
+        return pd.read_sql_query(query, self.connection, params=params)
+
+    def flagCounts(self, column):
+        '''
+        Violations of the restaurants by column (e.g. "DBA") and "CRITICAL FLAG", summed by SQLite from the snapshot totals
+        '''
+        counts = pd.read_sql_query('SELECT %s AS label, SUM("TOTAL CRITICAL") AS critical, SUM("TOTAL NOT CRITICAL") AS notCritical FROM snapshots GROUP BY label' % quoted(column), self.connection)
+        counts = pd.DataFrame({"Critical": counts["critical"].values, "Not Critical": counts["notCritical"].values},
+                              index=pd.Index(counts["label"].values, name=column), columns=["Critical", "Not Critical"])
+        counts = counts[counts.sum(axis=1) > 0]     #restaurants that are not in the city data have no violations to plot
+        counts.columns.name = "CRITICAL FLAG"
+        return counts
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  phoneIndex.py
+#
+#  Hash index from a phone number to its rows in the inspection data.
+#  The rows are grouped by phone number once, so finding the inspections of a restaurant
+#  is a dictionary lookup plus a slice instead of a scan of the whole city table.
+#
+##########################################################################################
+
+import re
+import numpy as np
+import pandas as pd
+
+import sourceCache     #sourceCache.py
+from compactTable import textColumn     #compactTable.py
+
+
+def normalizePhone(thisPhone):
+    '''
+    Digits of a phone number, e.g. "(212) 964-2525" -> "2129642525"
+    '''
+    return re.sub("[^0-9]", "", unicode(thisPhone))
+
+
+class PhoneIndex(object):
+
+    '''
+    Phone number -> row positions of the inspection data.
+
+    The row positions are sorted by phone number (keeping the original order within a phone number)
+    and every phone number keeps the start and the stop of its own range.
+    '''
+
+    def __init__(self, order, phones, starts, stops, positions=None):
+        self.order = order
+        self.phones = phones
+        self.starts = starts
+        self.stops = stops
+        self.positions = dict((phone, i) for i, phone in enumerate(phones)) if positions is None else positions
+
+    @classmethod
+    def fromFrame(cls, ratingList):
+        '''
+        Build the index from the PHONE column of ratingList
+        '''
+        rawCodes, rawPhones = pd.factorize(ratingList['PHONE'].values)
+        phoneCodes, phones = pd.factorize(np.array([normalizePhone(phone) for phone in textColumn('PHONE', rawPhones)], dtype=object))  #each distinct value is cleaned once
+        codes = phoneCodes.take(rawCodes)
+
+        order = np.argsort(codes, kind='mergesort')     #stable, rows of a restaurant stay in date order
+        counts = np.bincount(codes, minlength=len(phones))
+        stops = np.cumsum(counts)
+        starts = stops - counts
+        return cls(order, np.asarray(phones, dtype=object), starts, stops)
+
+    @classmethod
+    def forSource(cls, thisfile, ratingList):
+        '''
+        Index of ratingList read from thisfile, stored alongside the data cache of thisfile
+        '''
+        arrays = sourceCache.loadArrays(thisfile, "phoneindex")
+        if arrays is not None:
+            return cls(arrays["order"], arrays["phones"].astype(object), arrays["starts"], arrays["stops"])
+        index = cls.fromFrame(ratingList)
+        index.save(thisfile)
+        return index
+
+    def save(self, thisfile):
+        '''
+        Store the index with the data cache of thisfile, where forSource() reads it
+        '''
+        sourceCache.saveArrays(thisfile, "phoneindex", {"order": self.order, "phones": np.array(list(self.phones), dtype=np.unicode_), "starts": self.starts, "stops": self.stops})
+
+    def extended(self, rows, start):
+        '''
+        Index of the inspection data after the rows of the dataframe rows were appended to it at position start (deltaIngest.py).
+        A row of a known phone number goes at the end of its range and a new phone number gets a new range at the end,
+        the same index as fromFrame() of the longer table without grouping all its rows again.
+        '''
+        rawCodes, rawPhones = pd.factorize(rows['PHONE'].values)
+        rowPhones = [normalizePhone(phone) for phone in textColumn('PHONE', rawPhones)]
+        positions = dict(self.positions)
+        newPhones = []
+        for thisPhone in rowPhones:
+            if thisPhone not in positions:
+                positions[thisPhone] = len(self.phones) + len(newPhones)
+                newPhones.append(thisPhone)
+        codes = np.array([positions[thisPhone] for thisPhone in rowPhones], dtype=np.int64).take(rawCodes)
+
+        phones = np.concatenate([self.phones, np.array(newPhones, dtype=object)])
+        counts = np.r_[self.stops - self.starts, np.zeros(len(newPhones), dtype=np.int64)] + np.bincount(codes, minlength=len(phones))
+        stops = np.cumsum(counts)
+        rowOrder = np.argsort(codes, kind='mergesort')
+        ends = np.r_[self.stops, np.repeat(len(self.order), len(newPhones))]     #a new phone number starts after every stored row
+        order = np.insert(self.order, ends.take(codes[rowOrder]), start + rowOrder)
+        return PhoneIndex(order, phones, stops - counts, stops, positions)
+
+    def __len__(self):
+        return len(self.phones)
+
+    def __contains__(self, thisPhone):
+        return normalizePhone(thisPhone) in self.positions
+
+    def rows(self, thisPhone):
+        '''
+        Row positions of a phone number (empty when it is not in the data)
+        '''
+        i = self.positions.get(normalizePhone(thisPhone))
+        if i is None:
+            return self.order[:0]
+        return self.order[self.starts[i]:self.stops[i]]
+
+    def lookup(self, ratingList, thisPhone):
+        '''
+        Inspection rows of a phone number
+        '''
+        return ratingList.iloc[self.rows(thisPhone)]
+
+    def lookupMany(self, ratingList, phoneList):
+        '''
+        Inspection rows of many phone numbers in one dataframe, taken from ratingList in one step
+        '''
+        rows = [self.rows(thisPhone) for thisPhone in phoneList]
+        if len(rows) == 0:
+            return ratingList.iloc[self.order[:0]]
+        return ratingList.iloc[np.concatenate(rows)]
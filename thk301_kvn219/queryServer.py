@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  queryServer.py
+#
+#  Local JSON server of the city data and of the Restaurant Keeper. The data, its indexes and
+#  the aggregates of RestaurantData (OpenDataNYC.py) are loaded once, then every client is
+#  answered from memory by its own thread. After loading the shared data is only read.
+#
+#  GET /health                                        rows, establishments and restaurants in the Keeper
+#  GET /cuisines/top?n=20                             cuisines with the most violations
+#  GET /restaurants/top?n=10&by=critical&boro=&cuisine=   establishments with the most violations (by critical, violations or score)
+#  GET /top/dba?n=10&by=critical&boro=&cuisine=&min_rows=1   top values of a dimension (dba, cuisine, boro or zipcode) among the rows of boro and cuisine
+#  GET /grid?top=20&stat=mean                         mean, median, p90 or p99 SCORE per cuisine x borough (top: only the most frequent cuisines)
+#  GET /phone/2129642525                              latest inspection and every inspection row of a phone number
+#  GET /keeper                                        restaurants in the Keeper and their snapshots
+#
+#  Usage: python queryServer.py [--port 8015] [--host 127.0.0.1] [--data file.csv] [--keeper restaurant_list.db]
+#
+##########################################################################################
+
+import json
+import urllib
+import urlparse
+import threading
+import argparse
+import BaseHTTPServer
+import SocketServer
+import numpy as np
+import pandas as pd
+
+import restaurant as rt     #restaurant.py
+from keeperStore import KeeperStore, STORE_FILE     #keeperStore.py
+from timeline import parseDates     #timeline.py
+from aggregationEngine import topPositions     #aggregationEngine.py
+
+PORT = 8015
+HISTORY_COLUMNS = ["INSPECTION DATE", "VIOLATION DESCRIPTION", "CRITICAL FLAG", "SCORE", "GRADE", "GRADE DATE"]
+SORT_COLUMNS = {"critical": "TOTAL CRITICAL", "violations": "VIOLATIONS", "score": "SCORE"}
+WARM_STEPS = ["aggregates", "cuisine_and_boro_group", "restaurant_trends_mean", "top_20_cuisines_list", "top_index", "score_quantiles"]     #computed before the first client
+TOP_DIMENSIONS = {"dba": "DBA", "cuisine": "CUISINE DESCRIPTION", "boro": "BORO", "zipcode": "ZIPCODE"}
+GRID_STATS = ["mean", "median", "p90", "p99"]
+
+
+def records(frame):
+    '''
+    Rows of a dataframe as a list of dictionaries of JSON values (NaN becomes null)
+    '''
+    return json.loads(frame.to_json(orient="records"))
+
+
+class QueryError(Exception):
+
+    '''
+    A query that can not be answered, with its HTTP status
+    '''
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class QueryData(object):
+
+    '''
+    Everything the server answers from.
+
+    Attributes:
+      app (RestaurantData): the analysis of ratingList, its WARM_STEPS computed.
+      ratingList (Pandas DataFrame): inspection rows, as sourceReader() returns them.
+      phoneIndex (PhoneIndex), snapshots (SnapshotTable): indexes of ratingList.
+      keeperPath (str): SQLite file of the Restaurant Keeper, opened by every query that reads it.
+      establishments (Pandas DataFrame): the snapshots plus a SCORE number and a VIOLATIONS total, for the top restaurants.
+      answers (dict): JSON of the aggregate and top restaurant queries already answered (the data does not change).
+    '''
+
+    def __init__(self, app, ratingList, phoneIndex, snapshots, keeperPath=STORE_FILE):
+        self.app = app
+        self.ratingList = ratingList
+        self.phoneIndex = phoneIndex
+        self.snapshots = snapshots
+        self.keeperPath = keeperPath
+        self.lock = threading.Lock()
+        self.answers = {}
+        for artifact in WARM_STEPS:
+            app.require(artifact)
+        establishments = snapshots.frame.copy()
+        establishments["SCORE"] = pd.to_numeric(establishments["SCORE"], errors="coerce") if hasattr(pd, "to_numeric") else \
+            establishments["SCORE"].convert_objects(convert_numeric=True)
+        establishments["VIOLATIONS"] = establishments["TOTAL CRITICAL"] + establishments["TOTAL NOT CRITICAL"]
+        establishments["PHONE"] = establishments.index
+        self.establishments = establishments
+
+    def remembered(self, key, answer):
+        '''
+        Answer of an aggregate query, computed by answer() the first time it is asked
+        '''
+        with self.lock:
+            if key not in self.answers:
+                self.answers[key] = answer()
+            return self.answers[key]
+
+    def health(self):
+        return {"rows": len(self.ratingList), "establishments": len(self.snapshots), "keeper": len(self.keeperFrame())}
+
+    def topCuisines(self, n=20):
+        def answer():
+            aggregates = self.app.aggregates
+            cuisines = aggregates.topCuisines(n)
+            counts = aggregates.crosstab("CUISINE DESCRIPTION").reindex(cuisines).fillna(0)
+            totals = dict(zip(aggregates.labels["CUISINE DESCRIPTION"], aggregates.cuisineCounts))
+            return [dict([("CUISINE DESCRIPTION", cuisine), ("violations", int(totals[cuisine]))] +
+                         [(flag, int(counts.loc[cuisine, flag])) for flag in counts.columns]) for cuisine in cuisines]
+        return self.remembered(("cuisines", n), answer)
+
+    def topRestaurants(self, n=10, by="critical", boro=None, cuisine=None):
+        if by not in SORT_COLUMNS:
+            raise QueryError(400, "by must be one of %s" % ", ".join(sorted(SORT_COLUMNS)))
+
+        def answer():
+            establishments = self.establishments
+            mask = np.ones(len(establishments), dtype=bool)
+            if boro is not None:
+                mask &= establishments["BORO"].values == boro
+            if cuisine is not None:
+                mask &= establishments["CUISINE DESCRIPTION"].values == cuisine
+            rows = np.where(mask)[0]
+            rows = rows[topPositions([establishments[SORT_COLUMNS[by]].values[rows].astype(np.float64)], rows, n)]     #ties keep the order of the snapshots
+            return records(establishments.iloc[rows][["PHONE", "DBA", "BORO", "CUISINE DESCRIPTION", "SCORE", "GRADE", "INSPECTION DATE", "TOTAL CRITICAL", "TOTAL NOT CRITICAL", "VIOLATIONS"]])
+        return self.remembered(("restaurants", n, by, boro, cuisine), answer)
+
+    def topRanking(self, dimension, n=10, by="critical", boro=None, cuisine=None, minRows=1):
+        if dimension not in TOP_DIMENSIONS:
+            raise QueryError(404, "dimension must be one of %s" % ", ".join(sorted(TOP_DIMENSIONS)))
+        if by not in SORT_COLUMNS:
+            raise QueryError(400, "by must be one of %s" % ", ".join(sorted(SORT_COLUMNS)))
+        return records(self.app.topRanking(TOP_DIMENSIONS[dimension], by, n, boro, cuisine, minRows))
+
+    def grid(self, top=None, stat="mean"):
+        if stat not in GRID_STATS:
+            raise QueryError(400, "stat must be one of %s" % ", ".join(GRID_STATS))
+
+        def answer():
+            values = self.app.restaurant_trends_mean if stat == "mean" else self.app.score_quantiles[stat].unstack()
+            if top is not None:
+                values = values[values.index.isin(self.app.aggregates.topCuisines(top))]
+            cells = [[None if np.isnan(value) else float(value) for value in row] for row in values.values]
+            return {"cuisines": list(values.index), "boros": list(values.columns), stat: cells}
+        return self.remembered(("grid", top, stat), answer)
+
+    def phone(self, thisPhone):
+        thisSnapshot = self.snapshots.lookup(thisPhone)
+        if thisSnapshot is None:
+            raise QueryError(404, "%s is not in the city data" % thisPhone)
+        history = self.phoneIndex.lookup(self.ratingList, thisPhone)
+        history = history.iloc[np.argsort(parseDates(history["INSPECTION DATE"].values), kind='mergesort')]
+        return {"snapshot": records(pd.DataFrame([thisSnapshot]))[0], "inspections": records(history[HISTORY_COLUMNS])}
+
+    def keeperFrame(self):
+        keeper = KeeperStore(self.keeperPath)     #an SQLite connection can not be shared by threads
+        try:
+            return keeper.frame()
+        finally:
+            keeper.close()
+
+    def keeper(self):
+        return records(self.keeperFrame())
+
+
+def intArgument(query, name, default):
+    try:
+        return int(query.get(name, [default])[0])
+    except ValueError:
+        raise QueryError(400, "%s must be a number" % name)
+
+
+class QueryHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"     #clients may keep the connection open
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        query = urlparse.parse_qs(url.query)
+        data = self.server.data
+        parts = [part for part in url.path.split("/") if part]
+        try:
+            if parts == ["health"]:
+                answer = data.health()
+            elif parts == ["cuisines", "top"]:
+                answer = data.topCuisines(intArgument(query, "n", 20))
+            elif parts == ["restaurants", "top"]:
+                answer = data.topRestaurants(intArgument(query, "n", 10), query.get("by", ["critical"])[0],
+                                             query.get("boro", [None])[0], query.get("cuisine", [None])[0])
+            elif len(parts) == 2 and parts[0] == "top":
+                answer = data.topRanking(parts[1], intArgument(query, "n", 10), query.get("by", ["critical"])[0], query.get("boro", [None])[0],
+                                         query.get("cuisine", [None])[0], intArgument(query, "min_rows", 1))
+            elif parts == ["grid"]:
+                answer = data.grid(intArgument(query, "top", 0) or None, query.get("stat", ["mean"])[0])
+            elif len(parts) == 2 and parts[0] == "phone":
+                answer = data.phone(urllib.unquote(parts[1]))
+            elif parts == ["keeper"]:
+                answer = data.keeper()
+            else:
+                raise QueryError(404, "unknown query %s" % url.path)
+            self.reply(200, answer)
+        except QueryError as thisError:
+            self.reply(thisError.status, {"error": str(thisError)})
+        except Exception as thisError:     #the server keeps answering the other queries
+            self.reply(500, {"error": "%s: %s" % (type(thisError).__name__, thisError)})
+
+    def reply(self, status, answer):
+        body = json.dumps(answer)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class QueryServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    '''
+    One thread per client, all of them reading the same QueryData
+    '''
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, data):
+        BaseHTTPServer.HTTPServer.__init__(self, address, QueryHandler)
+        self.data = data
+
+
+def argumentParser():
+    parser = argparse.ArgumentParser(description="Local JSON server of the city data and of the Restaurant Keeper")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--data", default=rt.thisfile, help="csv of the city data")
+    parser.add_argument("--keeper", default=STORE_FILE, help="SQLite file of the Restaurant Keeper")
+    return parser
+
+
+if __name__ == '__main__':
+    options = argumentParser().parse_args()
+    rt.thisfile = options.data
+    rt.dataLoader()
+    server = QueryServer((options.host, options.port), QueryData(rt.app_user, rt.ratingList, rt.phoneIndex, rt.snapshots, options.keeper))
+    print "Serving %i inspection rows on http://%s:%i" % (len(rt.ratingList), options.host, server.server_address[1])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print "Bye"
+    server.server_close()
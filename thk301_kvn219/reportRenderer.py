@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  reportRenderer.py
+#
+#  Headless report mode: renders every chart of RestaurantData (OpenDataNYC.py) without
+#  a window, on the Agg backend, in parallel worker processes.
+#  The city data is read and analysed once in the parent process, the forked workers
+#  inherit it and only draw and save their chart.
+#
+#  Usage: python reportRenderer.py [--format pdf|png|svg] [--output folder] [--workers n] [chart ...]
+#
+##########################################################################################
+
+import matplotlib
+matplotlib.use("Agg")     #before pyplot is imported by OpenDataNYC.py, no display is needed
+
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+
+import restaurant as rt     #restaurant.py
+from OpenDataNYC import CHART_FILES     #OpenDataNYC.py
+
+FORMATS = ["pdf", "png", "svg"]
+CHARTS = ["AssessPopularRestaurantsViolations", "RiskyHotSpots", "AssessPopularCuisinesViolations",
+          "plotUserRestaurantGradeAndScore", "plotUserCuisineAndCriticalFlag"]     #the order of the report
+SHARED_STEPS = ["aggregates", "top_20_cuisines_list", "identified_dirty_restaurants_mean"]     #computed once, before the workers fork
+
+reportJob = {}     #app and output settings of the running report, inherited by the workers
+
+
+def chartRenderer(chart):
+    '''
+    Render one chart of reportJob, return a dictionary with "chart", "path", "error" and "seconds"
+    '''
+    start = time.time()
+    outputPath = os.path.join(reportJob["folder"], "%s.%s" % (CHART_FILES[chart], reportJob["format"]))
+    try:
+        getattr(reportJob["app"], chart)(outputPath=outputPath, show=False)
+        return {"chart": chart, "path": outputPath, "error": None, "seconds": time.time() - start}
+    except Exception as thisError:     #one broken chart does not stop the report
+        return {"chart": chart, "path": None, "error": "%s: %s" % (type(thisError).__name__, thisError), "seconds": time.time() - start}
+
+
+def reportRenderer(app, charts=CHARTS, folder=".", thisFormat="pdf", workers=None):
+    '''
+    Render charts of app (OpenDataNYC.RestaurantData) as files of thisFormat in folder.
+    With workers > 1 the charts are drawn by that many forked processes.
+    Returns one dictionary per chart (see chartRenderer), in the order of charts.
+    '''
+    if thisFormat not in FORMATS:
+        raise ValueError("Unknown format %s, use one of %s" % (thisFormat, ", ".join(FORMATS)))
+    if os.path.exists(folder) == False:
+        os.makedirs(folder)
+    if app.nyc_data is not None:
+        for artifact in SHARED_STEPS:
+            app.require(artifact)
+
+    reportJob.update({"app": app, "folder": folder, "format": thisFormat})
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(charts)))
+    if workers == 1:
+        return [chartRenderer(chart) for chart in charts]
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(chartRenderer, charts, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def renderReport(results):
+    '''
+    Print one line per chart: the saved file or the error
+    '''
+    print "*"*30
+    for result in results:
+        if result["error"] is None:
+            print "SAVED     %-36s ---> %s (%.1f s)" % (result["chart"], result["path"], result["seconds"])
+        else:
+            print "FAILED    %-36s ---> %s" % (result["chart"], result["error"])
+    print "*"*30
+
+
+def argumentParser():
+    parser = argparse.ArgumentParser(description="Render the charts of the Restaurant Keeper without a window")
+    parser.add_argument("charts", nargs="*", metavar="chart", help="charts to render (default: all), one of %s" % ", ".join(CHARTS))
+    parser.add_argument("--format", default="pdf", choices=FORMATS)
+    parser.add_argument("--output", default=".", help="folder of the rendered files")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--data", default=rt.thisfile, help="csv of the city data")
+    return parser
+
+
+if __name__ == '__main__':
+    parser = argumentParser()
+    options = parser.parse_args()
+    unknown = [chart for chart in options.charts if chart not in CHARTS]
+    if unknown:
+        parser.error("unknown chart %s" % ", ".join(unknown))
+    if os.path.exists(options.data) == False:
+        print "The required file %s is not in the folder, please check." % options.data
+        sys.exit(1)
+    rt.thisfile = options.data
+    rt.dataLoader()
+    results = reportRenderer(rt.app_user, options.charts or CHARTS, options.output, options.format, options.workers)
+    renderReport(results)
+    sys.exit(0 if all(result["error"] is None for result in results) else 1)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  responseCache.py
+#
+#  On-disk cache of the Yelp pages fetched by infoFinder() and bulkImport.py,
+#  together with the information parsed from them.
+#  A page younger than the time to live is served without touching the network,
+#  an older one is revalidated with ETag / Last-Modified, and the least recently used
+#  pages are removed when the cache grows over its size limit.
+#
+##########################################################################################
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+CACHE_FOLDER = os.path.join(".restaurant_cache", "http")
+TIME_TO_LIVE = 7 * 24 * 3600     #seconds, a restaurant page rarely changes within a week
+MAX_BYTES = 50 * 1024 * 1024     #size limit of the cached pages
+
+
+class ResponseCache(object):
+
+    '''
+    Page and parsed information cache keyed by url.
+
+    Attributes:
+      folder (str): where the pages and the index are kept.
+      ttl (float): seconds a page is used without asking the server again.
+      maxBytes (int): size limit of the stored pages, least recently used pages are removed first.
+      index (dict): url key -> url, fetched, used, etag, lastModified, size and the parsed info of a page.
+    '''
+
+    def __init__(self, folder=CACHE_FOLDER, ttl=TIME_TO_LIVE, maxBytes=MAX_BYTES):
+        self.folder = folder
+        self.ttl = ttl
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()     #held whenever the index or one of its entries is read or changed
+        self.pageLocks = {}     #url key -> lock held by the worker looking up that page
+        self.index = None     #read on first use
+
+    def keyOf(self, thisAddress):
+        return hashlib.md5(thisAddress.encode('utf-8')).hexdigest()
+
+    def pageLock(self, key):
+        with self.lock:
+            return self.pageLocks.setdefault(key, threading.Lock())
+
+    def pagePath(self, key):
+        return os.path.join(self.folder, key + ".html")
+
+    def loadIndex(self):
+        if self.index is None:
+            self.index = {}
+            indexPath = os.path.join(self.folder, "index.json")
+            if os.path.exists(indexPath):
+                try:
+                    with open(indexPath) as indexFile:
+                        self.index = json.load(indexFile)
+                except ValueError:     #broken index, start over
+                    self.index = {}
+        return self.index
+
+    def saveIndex(self):
+        try:
+            if os.path.exists(self.folder) == False:
+                os.makedirs(self.folder)
+            with open(os.path.join(self.folder, "index.json.tmp"), "w") as indexFile:
+                json.dump(self.index, indexFile)
+            os.rename(os.path.join(self.folder, "index.json.tmp"), os.path.join(self.folder, "index.json"))
+        except (IOError, OSError):     #the cache is optional
+            pass
+
+    def readPage(self, key):
+        try:
+            with open(self.pagePath(key), "rb") as page:
+                return page.read().decode('utf-8')
+        except (IOError, OSError):
+            return None
+
+    def cachedEntry(self, key):
+        '''
+        Copy of the index entry of a page and the page text, (None, None) when it is not cached (called with the lock held)
+        '''
+        entry = self.loadIndex().get(key)
+        pageText = None if entry is None else self.readPage(key)
+        if pageText is None:
+            return None, None
+        return dict(entry), pageText
+
+    def storePage(self, key, thisAddress, page, now):
+        '''
+        Store the body and the validators of a fresh response
+        '''
+        body = page.text.encode('utf-8')
+        try:
+            if os.path.exists(self.folder) == False:
+                os.makedirs(self.folder)
+            with open(self.pagePath(key), "wb") as pageFile:
+                pageFile.write(body)
+        except (IOError, OSError):
+            self.index.pop(key, None)     #never answer with the information of an older page
+            return
+        self.index[key] = {"url": thisAddress, "fetched": now, "used": now, "size": len(body), "info": None,
+                           "etag": page.headers.get("ETag"), "lastModified": page.headers.get("Last-Modified")}
+        self.evict()
+
+    def evict(self):
+        '''
+        Remove the least recently used pages until the cache fits in maxBytes
+        '''
+        total = sum(entry["size"] for entry in self.index.itervalues())
+        for key in sorted(self.index, key=lambda key: self.index[key]["used"]):
+            if total <= self.maxBytes:
+                break
+            total -= self.index[key]["size"]
+            del self.index[key]
+            if os.path.exists(self.pagePath(key)):
+                os.remove(self.pagePath(key))
+
+    def lookup(self, thisAddress, getter, parser=None):
+        '''
+        Text of a page (or what parser returns for it) through the cache.
+
+        Key Arguments:
+          getter(thisAddress, headers): returns a requests response, used only when the cache can not answer.
+          parser(pageText): parses the page, its result is cached with the page.
+        '''
+        key = self.keyOf(thisAddress)
+        with self.pageLock(key):     #workers asking for the same page wait for the first one and are served from the cache
+            now = time.time()
+            with self.lock:
+                entry, pageText = self.cachedEntry(key)
+            if entry is None or now - entry["fetched"] >= self.ttl:     #a fresh page costs no network at all
+                headers = {}
+                if entry is not None and entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry is not None and entry.get("lastModified"):
+                    headers["If-Modified-Since"] = entry["lastModified"]
+                page = getter(thisAddress, headers)
+                if entry is not None and page.status_code == 304:     #not modified, keep the stored page
+                    entry["fetched"] = now
+                else:
+                    page.raise_for_status()
+                    pageText = page.text
+                    with self.lock:
+                        self.storePage(key, thisAddress, page, now)
+                        entry = self.index.get(key)
+                        entry = None if entry is None else dict(entry)
+
+            if parser is None:
+                result = pageText
+            elif entry is not None and entry.get("info") is not None:
+                result = tuple(entry["info"])
+            else:
+                result = parser(pageText)
+                if entry is not None:
+                    entry["info"] = list(result)
+
+            with self.lock:
+                if entry is not None and key in self.index:     #not evicted meanwhile for the page of another worker
+                    entry["used"] = now
+                    self.index[key] = entry
+                self.saveIndex()
+        return result
+
+    def clear(self):
+        '''
+        Remove every cached page
+        '''
+        with self.lock:
+            for key in self.loadIndex().keys():
+                if os.path.exists(self.pagePath(key)):
+                    os.remove(self.pagePath(key))
+            self.index = {}
+            self.saveIndex()
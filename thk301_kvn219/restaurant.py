@@ -10,6 +10,9 @@
 #  Restaurant Keeper that saves a list of restaurants that you like and view its information.
 #  To add a restaurant, press 4 and copy and paste a yelp's link
 #  To view your restaurant list, press 5, and it will display information including violations.
+#  Commands can also be run without the menu, e.g.
+#  python restaurant.py add http://www.yelp.com/biz/bouley-new-york-2 \; render charts png \; print
+#  python restaurant.py --file commands.txt
 #
 ##########################################################################################
 
@@ -17,8 +20,11 @@ from lxml import html
 import requests
 import re
 import sys
+import shlex
+import argparse
 import json
 import pandas as pd
+import numpy as np
 import os.path
 import requests.exceptions
 import matplotlib
@@ -27,36 +33,80 @@ warnings.filterwarnings("ignore")
 
 
 from errorHandler import errorHandlerClass     #errorHandler.py
-from OpenDataNYC import RestaurantData   #OpenNYCData
-
+from OpenDataNYC import RestaurantData, CHART_FILES   #OpenNYCData
+import sourceCache     #sourceCache.py
+import compactTable     #compactTable.py
+from phoneIndex import PhoneIndex     #phoneIndex.py
+import bulkImport     #bulkImport.py
+from responseCache import ResponseCache     #responseCache.py
+from chartCache import ChartCache     #chartCache.py
+from keeperStore import KeeperStore, RESTAURANT_COLUMNS     #keeperStore.py
+from timeline import parseDates     #timeline.py
+from snapshotTable import SnapshotTable, placeholderSnapshot, LATEST_COLUMNS     #snapshotTable.py
+from fuzzyMatcher import TrigramIndex     #fuzzyMatcher.py
+import deltaIngest     #deltaIngest.py
+import stageTimer     #stageTimer.py
+import streamReader     #streamReader.py
+from heatGrid import DIMENSION_NAMES     #heatGrid.py
+import keeperRefresh     #keeperRefresh.py
+from stageTimer import stage     #stageTimer.py
+
+thisfile ="DOHMH_New_York_City_Restaurant_Inspection_Results.csv"    #global city data file
 myRestaurantList={}    #global restaurant list
-ratingList={}    #global rating list
-
-def sourceReader(thisfile):
+ratingList={}    #global rating list, read by dataLoader() on first use
+phoneIndex=None    #global phone index of ratingList
+snapshots=None    #global latest inspection of every establishment in ratingList
+establishments=None    #first row of every establishment in streaming mode, where ratingList is not kept (see matcherOpener())
+matcher=None    #global name and address index of ratingList, see matcherOpener()
+app_user=RestaurantData(None, ChartCache())    #global analysis, its steps run only when a chart needs them and its charts are cached
+pageCache=ResponseCache()    #global cache of the Yelp pages
+keeper=None    #global Restaurant Keeper store, see keeperOpener()
+streaming=False    #read the city data in chunks, keeping only its aggregates and snapshots (streamReader.py)
+compactData=False    #keep the city data in typed and categorical columns (compactTable.py)
+sourceCached=True    #False when the cache of thisfile misses new records (deltaLoader), the indexes are then built from ratingList
+
+@stage()
+def sourceReader(thisfile, useCache=True, compact=False):
     '''
-    Read a csv and return a dataframe after reindexing
+    Read a csv and return a dataframe sorted by inspection date after reindexing
+    The result is cached on disk (sourceCache.py) and reused until the csv changes
+    With compact=True the columns are typed and categorical (compactTable.py)
     '''
-    ratingList = pd.read_csv(thisfile,  usecols=['DBA', 'PHONE', 'BORO', 'ZIPCODE', 'CUISINE DESCRIPTION', 'VIOLATION DESCRIPTION','INSPECTION DATE', 'CRITICAL FLAG', 'SCORE', 'GRADE DATE', 'GRADE'],dtype='unicode').dropna()
-    ratingList = ratingList.sort_index(by=["INSPECTION DATE"], ascending=True)
+    if useCache:
+        ratingList = sourceCache.loadCache(thisfile, compact)
+        if ratingList is not None:     #warm start
+            return ratingList
+    ratingList = csvParser(thisfile)
+    ratingList = ratingList.iloc[np.argsort(parseDates(ratingList["INSPECTION DATE"].values), kind='mergesort')]     #chronological, not in MM/DD/YYYY text order
     ratingList.index =  xrange(len(ratingList))       #reindex because of removed rows
+    if useCache:
+        sourceCache.saveCache(thisfile, ratingList)
+    if compact:
+        ratingList = compactTable.compactFrame(ratingList)
     return ratingList
 
 
-def infoFinder(thisAddress):
+@stage()
+def csvParser(thisfile):
+    '''
+    Read the columns we use from a csv of the city data (the full file or a file of new records)
+    Rows missing a value are dropped, except for a missing address (BUILDING, STREET)
     '''
-    Parse the web for its information
+    thisData = pd.read_csv(thisfile,  usecols=streamReader.REQUIRED_COLUMNS + streamReader.ADDRESS_COLUMNS,dtype='unicode')
+    return streamReader.rowFilter(thisData)
+
+
+@stage()
+def pageParser(pageText):
     '''
-    page = requests.get(thisAddress)
-    tree = html.fromstring(page.text)       #get the html
+    Parse a Yelp page for its information
+    Raises IndexError when the page has no name or phone number
+    '''
+    tree = html.fromstring(pageText)       #get the html
 
     name_finder = tree.xpath('// h1[@itemprop="name"]/text()')
-    try:        #name needs cleaning
-        name_finder =  str(name_finder[0]).strip()
-        name_finder = str(name_finder).encode('ascii', 'ignore')      #Due to encoding, "'" might throw an error  e.g. Wendy's
-    except:
-        thisError = sys.exc_info()[0]
-        error = errorHandlerClass(thisError)
-        error.errorHandlerFunction()
+    name_finder =  str(name_finder[0]).strip()       #name needs cleaning
+    name_finder = str(name_finder).encode('ascii', 'ignore')      #Due to encoding, "'" might throw an error  e.g. Wendy's
 
     street_finder = tree.xpath('//span[@itemprop="streetAddress"]/text()')   #parse
     city_finder = tree.xpath('//span[@itemprop="addressLocality"]/text()')
@@ -75,6 +125,147 @@ def infoFinder(thisAddress):
     return name_finder, street_finder, city_finder, price_finder, phone_finder, web_finder, review_finder
 
 
+@stage("Yelp fetch")
+def pageGetter(thisAddress, headers):
+    '''
+    Fetch a page for the page cache (headers are used to revalidate a cached page)
+    '''
+    return requests.get(thisAddress, headers=headers, timeout=bulkImport.TIMEOUT)
+
+
+@stage()
+def pageInfo(thisAddress):
+    '''
+    Parse the web for its information, raising the error of a page that can not be fetched or parsed
+    Pages and their information are cached (responseCache.py), so a repeated lookup costs no network round trip
+    '''
+    return pageCache.lookup(thisAddress, pageGetter, pageParser)
+
+
+def infoFinder(thisAddress):
+    '''
+    Parse the web for its information (pageInfo), an error ends the program
+    '''
+    try:
+        return pageInfo(thisAddress)
+    except:
+        thisError = sys.exc_info()[0]
+        error = errorHandlerClass(thisError)
+        error.errorHandlerFunction()
+
+
+@stage(rows=lambda result: len(ratingList))
+def dataLoader():
+    '''
+    Read the city data, its phone index and its snapshots the first time an option needs them
+    In streaming mode only the aggregates, the snapshots and the first row of every establishment are kept, the rows are not
+    '''
+    global ratingList, phoneIndex, snapshots, establishments
+    if streaming and snapshots is None:
+        summary = streamReader.streamSummary(thisfile)
+        snapshots = summary.snapshots
+        establishments = summary.establishments
+        app_user.useAggregates(summary.aggregates)
+    elif streaming == False and phoneIndex is None:
+        ratingList = sourceReader(thisfile, compact=compactData)
+        phoneIndex = PhoneIndex.forSource(thisfile, ratingList)
+        snapshots = SnapshotTable.forSource(thisfile, ratingList)
+        app_user.setNYCData(ratingList)
+
+
+def keeperOpener():
+    '''
+    The Restaurant Keeper store (keeperStore.py), opened on first use
+    '''
+    global keeper
+    if keeper is None:
+        keeper = KeeperStore()
+        keeper.upgrade()     #data of earlier versions, once
+        app_user.keeper = keeper     #read by the user charts
+    return keeper
+
+
+@stage()
+def matcherOpener():
+    '''
+    The name and address index of the city data (fuzzyMatcher.py), built on first use
+    '''
+    global matcher
+    dataLoader()
+    if matcher is None and streaming:     #one document per establishment, from its first row
+        matcher = TrigramIndex.fromFrame(establishments)
+    elif matcher is None and sourceCached:
+        matcher = TrigramIndex.forSource(thisfile, ratingList)
+    elif matcher is None:     #the index stored with the cache is out of date
+        matcher = TrigramIndex.fromFrame(ratingList)
+    return matcher
+
+
+def snapshotFinder(thisPhoneNum, info=None, chooser=None):
+    '''
+    Latest inspection and violation totals of a phone number from the city data (snapshotTable.py)
+    When the phone number is not found, chooser (if any) picks one of the establishments whose name and address
+    are closest to info (the tuple returned by infoFinder)
+    '''
+    dataLoader()
+    thisSnapshot=snapshots.lookup(thisPhoneNum)
+    if thisSnapshot is None and chooser is not None and info is not None:
+        candidates = matcherOpener().candidates(info[0], info[1])
+        thisKey = chooser(info, candidates) if len(candidates) > 0 else None
+        if thisKey is not None:
+            thisSnapshot = snapshots.lookupKey(thisKey)
+        if thisSnapshot is not None:
+            thisSnapshot["KEY"] = thisKey     #kept by the Keeper, so a refresh finds the establishment again
+    if thisSnapshot is None:  #in case the phone number on Yelp can not be found in NYC Inspection data
+        thisSnapshot=placeholderSnapshot()
+    return thisSnapshot
+
+
+def candidatePicker(info, candidates):
+    '''
+    Ask the user which establishment of the city data is the restaurant found on Yelp
+    Returns the key of the chosen establishment, or None
+    '''
+    print "The phone number of %s (%s) is not in the city data. Is it one of these?" %(info[0], info[1])
+    for i, candidate in enumerate(candidates):
+        print "Type in %i for %s, %s %s (%i%% match)" %(i+1, candidate["DBA"], candidate["ADDRESS"], candidate["ZIPCODE"], round(100*candidate["score"]))
+    print "Type in 0 for none of them"
+    try:
+        thisChoice = int(raw_input("---->  "))
+    except ValueError:
+        return None
+    if 1 <= thisChoice <= len(candidates):
+        return candidates[thisChoice-1]["key"]
+    return None
+
+
+@stage(rows=lambda result: len(result[0]))
+def restaurantAdder(infoList, chooser=None):
+    '''
+    Join the information from Yelp (tuples returned by infoFinder) with the snapshot of the restaurant in the city data
+    and save it in the Restaurant Keeper in one transaction
+    chooser picks an establishment by name and address when the phone number is not in the city data (see snapshotFinder)
+    Returns the names that are added and the names that are already stored
+    '''
+    added = []
+    alreadyStored = []
+    newRestaurants = []
+    newPhones = set()
+    for info in infoList:
+        name_finder, street_finder, city_finder, price_finder, phone_finder, web_finder, review_finder = info
+        thisPhoneNum = re.sub("[()-]", '', phone_finder).replace(' ','')
+        if thisPhoneNum in newPhones or keeperOpener().hasPhone(thisPhoneNum):  #previously stored
+            alreadyStored.append(name_finder)
+            continue
+        myRestaurant = {"DBA_fromYelp":name_finder, "ADDRESS":street_finder, "CITY":city_finder, "PRICE":price_finder, "PHONE":thisPhoneNum, "WEB":web_finder, "REVIEW":review_finder}
+        newRestaurants.append((myRestaurant, snapshotFinder(thisPhoneNum, info, chooser)))
+        newPhones.add(thisPhoneNum)
+        added.append(name_finder)
+
+    keeperOpener().add(newRestaurants)
+    return added, alreadyStored
+
+
 def listBuilder():
     '''
     Compare the information from Yelp and join it with violation information from the city data
@@ -94,92 +285,144 @@ def listBuilder():
         print ("e.g. http://www.yelp.com/biz/bouley-new-york-2")
         thisLink = str(raw_input("---->  ")).replace(" ", "")
 
-        name_finder, street_finder, city_finder, price_finder, phone_finder, web_finder, review_finder = infoFinder(thisLink)
-        thisPhoneNum = re.sub("[()-]", '', phone_finder).replace(' ','')
-
-        if os.path.exists("restaurant_list.csv")==True :        #in case if the user has used the program before to save a restaurant
-                myRestaurantFromFile = pd.io.parsers.read_csv('restaurant_list.csv',sep="\t")   #read the file
-                if myRestaurantFromFile['PHONE'].isin([int(thisPhoneNum)]).sum()>=1:  #previously stored
-                    print "%s is already stored" %name_finder
-                    askInput()       #data is already stored
-                else:   #new entry
-                    thisRating=ratingList[ratingList['PHONE'].isin([thisPhoneNum])]
-                    if thisRating.empty:  #in case the phone number on Yelp can not be found in NYC Inspection data
-                        thisRating=pd.DataFrame([{"DBA":"To be Updated", "BORO":"To be Updated", "ZIPCODE":"To be Updated", "PHONE":thisPhoneNum, "CUISINE DESCRIPTION":"To be Updated", "INSPECTION DATE":"To be Updated", "VIOLATION DESCRIPTION":"To be Updated", "CRITICAL FLAG":"To be Updated", "SCORE":"To be Updated", "GRADE":"To be Updated", "GRADE DATE":"To be Updated"}])
-                    myRestaurantPD = pd.DataFrame([{"DBA_fromYelp":name_finder, "ADDRESS":street_finder, "CITY":city_finder, "PRICE":price_finder, "PHONE":thisPhoneNum, "WEB":web_finder, "REVIEW":review_finder}])
-                    myRestaurantPD = pd.merge(myRestaurantPD, thisRating, on=["PHONE"], how='inner')
-                    new = myRestaurantPD.append(myRestaurantFromFile, ignore_index=True, verify_integrity=False)
-                    new.to_csv('restaurant_list.csv', sep='\t', encoding='utf-8', index=False)
-                    print "%s is successfully added" %name_finder
-        else:    #the user is new
-                    thisRating=ratingList[ratingList['PHONE'].isin([thisPhoneNum])]
-                    if thisRating.empty:  #in case the phone number on Yelp can not be found in NYC Inspection data
-                         thisRating=pd.DataFrame([{"DBA":"To be Updated", "BORO":"To be Updated", "ZIPCODE":"To be Updated", "PHONE":thisPhoneNum, "CUISINE DESCRIPTION":"To be Updated", "INSPECTION DATE":"To be Updated", "VIOLATION DESCRIPTION":"To be Updated", "CRITICAL FLAG":"To be Updated", "SCORE":"To be Updated", "GRADE":"To be Updated", "GRADE DATE":"To be Updated"}])
-                    myRestaurantPD = pd.DataFrame([{"DBA_fromYelp":name_finder, "ADDRESS":street_finder, "CITY":city_finder, "PRICE":price_finder, "PHONE":thisPhoneNum, "WEB":web_finder, "REVIEW":review_finder}])
-                    myRestaurantPD = pd.merge(myRestaurantPD, thisRating, on=["PHONE"], how='inner')                                                    #the user is new
-                    myRestaurantPD.to_csv('restaurant_list.csv', sep='\t', encoding='utf-8', index=False)
-                    print "%s is successfully added" %name_finder
-        myRestaurantPD.drop(myRestaurantPD.index[:])   #clear the dataframe
-        askInput()
+        added, alreadyStored = restaurantAdder([infoFinder(thisLink)], candidatePicker)
+        for name_finder in alreadyStored:
+            print "%s is already stored" %name_finder
+        for name_finder in added:
+            print "%s is successfully added" %name_finder
+            thisSnapshot = keeperOpener().frame(name=name_finder).iloc[0]
+            print "Latest inspection: %s, grade %s, score %s, %s critical and %s not critical violations" %(thisSnapshot["INSPECTION DATE"], thisSnapshot["GRADE"], thisSnapshot["SCORE"], thisSnapshot["CRITICAL"], thisSnapshot["NOT CRITICAL"])
     except:
         thisError = sys.exc_info()[0]
         error = errorHandlerClass(thisError)
         error.errorHandlerFunction()
 
+
+def listImporter(thisFile=None):
+    '''
+    Add every Yelp link listed in a file (one link per line) to the Restaurant Keeper
+    The pages are fetched concurrently (bulkImport.py) and a link that fails does not stop the others
+    '''
+    if thisFile is None:
+        print "Please type in the file that lists the Yelp's links, one link per line"
+        thisFile = str(raw_input("---->  ")).strip()
+    if os.path.exists(thisFile)==False :
+        print "There is no file"
+        return
+
+    results = bulkImport.bulkFetch(bulkImport.linkReader(thisFile), pageParser, cache=pageCache)
+    added, alreadyStored = restaurantAdder([result["info"] for result in results if result["error"] is None])
+    bulkImport.importReport(results, added, alreadyStored)
+
+
+def deltaLoader(thisFile=None):
+    '''
+    Add new or changed inspection records from a csv in the layout of the city data
+    Only these rows are matched and aggregated (deltaIngest.py), the cache and the indexes of the city data are patched with them
+    '''
+    global ratingList, phoneIndex, snapshots, matcher, sourceCached
+    if thisFile is None:
+        print "Please type in the file of new inspection records"
+        thisFile = str(raw_input("---->  ")).strip()
+    if os.path.exists(thisFile)==False :
+        print "There is no file"
+        return
+
+    if streaming:
+        print "New records can not be added in streaming mode"
+        return
+    dataLoader()
+    deltaId = sourceCache.fileHash(thisFile)
+    if deltaId in sourceCache.appliedDeltas(thisfile):
+        print "The records of this file are already added"
+        return
+    ratingList, phoneIndex, snapshots, matcher, report = deltaIngest.ingestDelta(thisfile, csvParser(thisFile), ratingList, phoneIndex, snapshots,
+                                                                                 app_user, deltaId, matcher)
+    sourceCached = report["saved"]
+    deltaIngest.deltaReport(report)
+
+
+@stage(rows=lambda result: result["restaurants"])
+def keeperRefresher():
+    '''
+    Bring the snapshot of every restaurant in the Restaurant Keeper up to date with the city data
+    Only the restaurants whose snapshot changed are written (keeperRefresh.py)
+    '''
+    dataLoader()
+    updates, report = keeperRefresh.refreshPlan(keeperOpener().frame(), snapshots)
+    keeperOpener().updateSnapshots(updates)
+    keeperRefresh.refreshReport(report)
+    return report
+
+
 def listDelete():
     '''
-    Delete the restaurant list file
+    Delete every restaurant in the Restaurant Keeper
     '''
-    if os.path.exists("restaurant_list.csv")==True :
-        os.remove('restaurant_list.csv')
+    if len(keeperOpener()) > 0 :
+        keeperOpener().deleteAll()
         print "The list is successfully deleted"
     else:
-        print "There is no file"
-    askInput()
+        print "There is no restaurant in your Restaurant Keeper"
 
 
 def optionPicker(thisOption):
     '''
     Input from a user and delegate the tasks
+    Every task is timed as one stage when the stage timer is on (stageTimer.py)
+    Returns False when the user quits
+    '''
+    if thisOption ==  0:
+        print "Bye"
+        return False
+    if thisOption not in range(1, 13):
+        print "Invalid option"
+        return True
+    with stageTimer.measure("option %i" %thisOption):
+        optionRunner(thisOption)
+    return True
+
+
+def optionRunner(thisOption):
     '''
+    Run the task of an option of the menu
+    '''
+    if thisOption in [1, 2, 5]:     #charts of the city data
+        dataLoader()
+    if thisOption in [3, 4]:     #charts of the Restaurant Keeper
+        keeperOpener()
     if thisOption == 1:
         app_user.AssessPopularRestaurantsViolations()
-        askInput()
     elif thisOption ==  2:
         #app_user.AssessBoroughViolations()
         app_user.RiskyHotSpots()
-        askInput()
     elif thisOption ==  3:
         app_user.plotUserRestaurantGradeAndScore()
-        askInput()
     elif thisOption ==  4:
         app_user.plotUserCuisineAndCriticalFlag()
-        askInput()
     elif thisOption ==  5:
         app_user.AssessPopularCuisinesViolations()
-        askInput()
     elif thisOption ==  6:
         listBuilder()
-        infoFinder(thisOption)
     elif thisOption ==  7:
          quick_myRestaurantPrinter(myRestaurantList)
     elif thisOption ==  8:
         detail_myRestaurantPrinter(myRestaurantList)
     elif thisOption ==  9:
         listDelete()
-    elif thisOption ==  0:
-        print "Bye"
-        sys.exit(1)
-    else:
-        print "Invalid option"
+    elif thisOption ==  10:
+        listImporter()
+    elif thisOption ==  11:
+        deltaLoader()
+    elif thisOption ==  12:
+        keeperRefresher()
 
 
 def quick_myRestaurantPrinter(myRestaurantList):
     '''
-    Print out restaurant lists (short version)
+    Print out restaurant lists (short version), with the latest inspection of each restaurant
     '''
-    myRestaurantList =  pd.io.parsers.read_csv('restaurant_list.csv',sep="\t")
-    df_unique = myRestaurantList.groupby("DBA_fromYelp").first()
+    df_unique =  keeperOpener().frame()     #one row per restaurant
 
     lenOfRestaurant=len(df_unique)
     print "There are %i restaurants in your Restaurant Keeper" %lenOfRestaurant
@@ -193,17 +436,40 @@ def quick_myRestaurantPrinter(myRestaurantList):
         print "WEB: %s" %df_unique["WEB"].ix[i]
         print "PRICE: %s" %df_unique["PRICE"].ix[i]
         print "DESCRIPTION: %s" %df_unique["CUISINE DESCRIPTION"].ix[i]
+        print "GRADE: %s (score %s, inspected %s)" %(df_unique["GRADE"].ix[i], df_unique["SCORE"].ix[i], df_unique["INSPECTION DATE"].ix[i])
+        print "VIOLATIONS: %s critical and %s not critical at the latest inspection" %(df_unique["CRITICAL"].ix[i], df_unique["NOT CRITICAL"].ix[i])
         print ""
-    askInput()
+
+
+def keeperInspections():
+    '''
+    Every inspection row (violation descriptions included) of the restaurants in the Restaurant Keeper, with their Yelp columns
+    A restaurant that is not in the city data keeps one row, its snapshot ("To be Updated")
+    In streaming mode the rows of these restaurants are read again from the csv, chunk by chunk (streamReader.phoneRows)
+    '''
+    dataLoader()
+    keeperFrame = keeperOpener().frame()
+    phones = keeperFrame["PHONE"].values
+    if streaming:
+        rows = streamReader.phoneRows(thisfile, phones)
+        index = PhoneIndex.fromFrame(rows)
+    else:
+        rows, index = ratingList, phoneIndex
+    counts = np.array([len(index.rows(thisPhone)) for thisPhone in phones], dtype=np.int64)
+    inspections = index.lookupMany(rows, phones).drop("PHONE", axis=1)
+    yelp = keeperFrame[RESTAURANT_COLUMNS].iloc[np.repeat(np.arange(len(phones)), counts)]     #one copy per inspection row
+    yelp.index = inspections.index
+    found = pd.concat([yelp, inspections], axis=1)
+    missing = keeperFrame.iloc[np.where(counts == 0)[0]][RESTAURANT_COLUMNS + LATEST_COLUMNS]
+    return pd.concat([found, missing], ignore_index=True)[list(found.columns)]
 
 
 def detail_myRestaurantPrinter(myRestaurantList):
     '''
-    Print out restaurant lists (all dataframe)
+    Print out restaurant lists (all dataframe), every inspection of every restaurant
     '''
-    myRestaurantList =  pd.io.parsers.read_csv('restaurant_list.csv',sep="\t")
+    myRestaurantList =  keeperInspections()
     print myRestaurantList
-    askInput()
 
 
 
@@ -211,57 +477,190 @@ def askInput():
   '''
   Print out options and receives an input.
   '''
-  try:
-    print ""
-    print "*"*30
-    print "Please select from following:"
-    print "Type in 1 to See violations of popular restaurants in NYC"
-    print "Type in 2 to View the Heatmap of NYC restaurants"
-    print "Type in 3 to Explore the restaurant and the number of violations in your RestaurantKeeper"
-    print "Type in 4 to Explore restaurants in your RestaurantKeeper grouped by types and the number of violations"
-    print "Type in 5 to Explore violations of popular restaurants in NYC grouped by types"
-    print "Type in 6 to Add a restaurant to your Restaurant Keeper"
-    print "Type in 7 to Quick View of my Restaurant Keeper"
-    print "Type in 8 to Full View of my Restaurant Keeper"
-    print "Type in 9 to Reset my Restaurant Keeper"
-    print "Type in 0 to Quit"
-    print "*"*30
-    print ""
-    thisResponse = int(raw_input("What is your choice? "))
-    optionPicker(thisResponse)     #optionPicker will delegate tasks
-  except:
-        thisError = sys.exc_info()[0]
-        error = errorHandlerClass(thisError)
-        error.errorHandlerFunction()
+  print ""
+  print "*"*30
+  print "Please select from following:"
+  print "Type in 1 to See violations of popular restaurants in NYC"
+  print "Type in 2 to View the Heatmap of NYC restaurants"
+  print "Type in 3 to Explore the restaurant and the number of violations in your RestaurantKeeper"
+  print "Type in 4 to Explore restaurants in your RestaurantKeeper grouped by types and the number of violations"
+  print "Type in 5 to Explore violations of popular restaurants in NYC grouped by types"
+  print "Type in 6 to Add a restaurant to your Restaurant Keeper"
+  print "Type in 7 to Quick View of my Restaurant Keeper"
+  print "Type in 8 to Full View of my Restaurant Keeper"
+  print "Type in 9 to Reset my Restaurant Keeper"
+  print "Type in 10 to Add every restaurant listed in a file of Yelp's links"
+  print "Type in 11 to Add new inspection records of the city data from a file"
+  print "Type in 12 to Refresh my Restaurant Keeper with the latest inspections"
+  print "Type in 0 to Quit"
+  print "*"*30
+  print ""
+  return int(raw_input("What is your choice? "))
+
+
+def commandLoop():
+    '''
+    Ask for an option and run it until the user quits
+    Every option returns here, so a long session does not pile up stack frames and dataframes
+    '''
+    while True:
+        try:
+            if optionPicker(askInput()) == False:     #optionPicker will delegate tasks
+                break
+        except:
+            thisError = sys.exc_info()[0]
+            error = errorHandlerClass(thisError)
+            error.errorHandlerFunction()
+
+
+def addCommand(*links):
+    '''
+    Add the restaurants of Yelp's links to the Restaurant Keeper
+    '''
+    added, alreadyStored = restaurantAdder([pageInfo(thisLink) for thisLink in links])     #a bad link fails the command, see batchRunner()
+    for name_finder in alreadyStored:
+        print "%s is already stored" %name_finder
+    for name_finder in added:
+        print "%s is successfully added" %name_finder
+
+
+def renderCommand(folder=".", thisFormat="pdf"):
+    '''
+    Save every chart in folder without showing it
+    '''
+    dataLoader()
+    if os.path.exists(folder)==False :
+        os.makedirs(folder)
+    for chart in sorted(CHART_FILES):
+        if chart in ["plotUserRestaurantGradeAndScore", "plotUserCuisineAndCriticalFlag"] and len(keeperOpener()) == 0:
+            print "%s is skipped, there is no restaurant in your Restaurant Keeper" %chart
+            continue
+        thisPath = os.path.join(folder, "%s.%s" %(CHART_FILES[chart], thisFormat))
+        getattr(app_user, chart)(thisPath, show=False)
+        print "%s is saved" %thisPath
+
+
+def heatmapCommand(rows="cuisine", columns="boro", minCount="1", thisPath=None):
+    '''
+    Save a heatmap of the mean scores of two dimensions (cuisine, boro, zipcode, month, dba, grade) without showing it
+    '''
+    dataLoader()
+    rows, columns = DIMENSION_NAMES[rows], DIMENSION_NAMES[columns]
+    top = 20 if rows == "CUISINE DESCRIPTION" and columns == "BORO" else None
+    thisPath = thisPath or "Heatmap_%s_%s.pdf" %(rows.split()[0].lower(), columns.split()[0].lower())
+    app_user.RiskyHotSpots(thisPath, show=False, rows=rows, columns=columns, top=top, minCount=int(minCount))
+    print "%s is saved" %thisPath
+
+
+def printCommand(view="quick"):
+    '''
+    Print the Restaurant Keeper, "quick" or "full"
+    '''
+    if view == "full":
+        detail_myRestaurantPrinter(myRestaurantList)
+    else:
+        quick_myRestaurantPrinter(myRestaurantList)
+
+
+COMMANDS = {"add": addCommand,     #add URL [URL ...]
+            "import": listImporter,     #import FILE of Yelp's links
+            "delta": deltaLoader,     #delta FILE of new inspection records
+            "render": renderCommand,     #render [FOLDER] [FORMAT]
+            "heatmap": heatmapCommand,     #heatmap [ROWS] [COLUMNS] [MIN_COUNT] [FILE], e.g. heatmap zipcode cuisine 5
+            "print": printCommand,     #print [quick|full]
+            "refresh": keeperRefresher,
+            "reset": listDelete,
+            "option": lambda thisOption: optionPicker(int(thisOption))}     #option NUMBER of the menu
+
+
+def commandSplitter(words):
+    '''
+    Split the words of the command line into commands at ";" (e.g. add URL ; render charts ; print)
+    Every command is (where, words), where names it in the report of batchRunner()
+    '''
+    commands = [[]]
+    for word in words:
+        if word.endswith(";"):
+            if word.rstrip(";"):
+                commands[-1].append(word.rstrip(";"))
+            commands.append([])
+        else:
+            commands[-1].append(word)
+    return [("command %i" %(i + 1), command) for i, command in enumerate([command for command in commands if command])]
+
+
+def commandReader(thisFile):
+    '''
+    Commands of a file, one command per line (blank lines and lines starting with # are skipped)
+    Every command is (where, words), where is the file and the line number
+    '''
+    commands = []
+    with open(thisFile) as commandFile:
+        for lineNumber, line in enumerate(commandFile, 1):
+            if line.strip() and line.strip().startswith("#")==False :
+                commands.append(("%s line %i" %(thisFile, lineNumber), shlex.split(line)))
+    return commands
+
+
+def batchRunner(commands):
+    '''
+    Run commands ((where, words) pairs) one after the other in this process, so the city data is read once
+    Returns False, before running any of them, when a command is unknown
+    A command that fails is reported with where it comes from and the next one runs, False is returned at the end
+    '''
+    unknown = ["%s (%s)" %(words[0], where) for where, words in commands if words[0] not in COMMANDS]
+    if unknown:
+        print "Unknown command: %s, commands are %s" %(", ".join(unknown), ", ".join(sorted(COMMANDS)))
+        return False
+    failed = []
+    for where, words in commands:
+        print "---->  %s" %" ".join(words)
+        try:
+            with stageTimer.measure("command %s" %words[0]):
+                COMMANDS[words[0]](*words[1:])
+        except KeyboardInterrupt:     #CTRL + C stops the whole batch
+            thisError = sys.exc_info()[0]
+            error = errorHandlerClass(thisError)
+            error.errorHandlerFunction()
+        except BaseException as thisError:     #including the SystemExit of an option that ends the program on an error
+            print "FAILED    %s: %s ---> %s: %s" %(where, " ".join(words), type(thisError).__name__, thisError)
+            failed.append(where)
+    if failed:
+        print "%i of %i commands failed: %s" %(len(failed), len(commands), ", ".join(failed))
+        return False
+    return True
+
+
+def argumentParser():
+    parser = argparse.ArgumentParser(description="Restaurant Keeper. Without commands, the menu is shown.")
+    parser.add_argument("commands", nargs="*", help="commands separated by ';': %s" %", ".join(sorted(COMMANDS)))
+    parser.add_argument("--file", default=None, help="file of commands, one per line")
+    parser.add_argument("--profile", action="store_true", help="time every stage, see stageTimer.py")
+    parser.add_argument("--stream", action="store_true", help="read the city data in chunks, for files larger than memory")
+    parser.add_argument("--compact", action="store_true", help="keep the city data in typed and categorical columns, to use less memory")
+    parser.add_argument("--workers", type=int, default=1, help="processes aggregating the city data, 0 for every core")
+    return parser
+
 
 if __name__ == '__main__':
-    thisfile ="DOHMH_New_York_City_Restaurant_Inspection_Results.csv"
+    options = argumentParser().parse_args()
+    if options.profile:     #time every stage, see stageTimer.py
+        stageTimer.enable("table")
+    app_user.workers = options.workers or None
+    streaming = options.stream
+    compactData = options.compact
         #Due to the size of the file, I am not attaching the file to the github.
     if os.path.exists(thisfile)==True :
-        ratingList = sourceReader(thisfile)
-            # There are calling to initialize OpenDataNYC
-        app_user = RestaurantData(ratingList)
-        app_user.setUpNYCRestaurantData()
-        app_user.getFlags()
-        app_user.groupByCuisineAndBoro()
-        app_user.createTop20List()
-        app_user.filterTop20Cuisines()
-        app_user.getGroupByCuisineAndBoro()
-        app_user.UnstackDataset()
-        app_user.createMeanSeries()
-        app_user.getAverageScores()
+        # The city data is read by dataLoader() and analysed by OpenDataNYC only when an option needs it
+        commands = commandSplitter(options.commands) + (commandReader(options.file) if options.file else [])
+        if commands:
+            sys.exit(0 if batchRunner(commands) else 1)
 
         #Display options
-        askInput()
+        commandLoop()
     else:
         print "*"*30
         print "The required file is not in the folder, please check. "
         print "You can download the file from this link---> "
         print "https://data.cityofnewyork.us/Health/DOHMH-New-York-City-Restaurant-Inspection-Results/xx67-kt59"
         print "*"*30
-
-
-
-
-
-
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  scoreSketch.py
+#
+#  Quantile sketches of SCORE (median, p90, p99) for the aggregates of aggregationEngine.py.
+#  A sketch is a histogram over fixed bins: one bin per point from 0 to 255 (inspection
+#  scores are whole numbers, so their quantiles are exact), then bins growing by 5% for the
+#  rare larger scores. Every group keeps the same SCORE_BINS counters whatever the number of
+#  rows, and two sketches are merged (or a chunk of rows removed) by adding the counters.
+#
+##########################################################################################
+
+import numpy as np
+
+EXACT_BINS = 256     #one bin per point: 0, 1, ..., 255
+GROWTH = 1.05     #the next bins grow by 5% (a score above 255 is known within 5%)
+GROWING_BINS = 64     #up to 255 * 1.05 ** 64, about 5800; larger scores fall in the last bin
+SCORE_BINS = EXACT_BINS + GROWING_BINS
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def binEdges():
+    '''
+    Lower edge of every bin
+    '''
+    return np.concatenate([np.arange(EXACT_BINS, dtype=np.float64), EXACT_BINS * GROWTH ** np.arange(GROWING_BINS)])
+
+
+def binValues():
+    '''
+    Value reported for a quantile that falls in a bin: the score itself, or the middle (geometric) of a growing bin
+    '''
+    edges = binEdges()
+    values = edges.copy()
+    values[EXACT_BINS:] = edges[EXACT_BINS:] * np.sqrt(GROWTH)
+    return values
+
+
+def scoreBins(score):
+    '''
+    Bin of every score (-1 for a missing score); scores below 0 go to the bin of 0
+    '''
+    score = np.asarray(score, dtype=np.float64)
+    bins = np.full(len(score), -1, dtype=np.int64)
+    known = np.isnan(score) == False
+    value = np.maximum(score[known], 0)
+    exact = value < EXACT_BINS
+    growing = np.floor(np.log(np.maximum(value, EXACT_BINS) / EXACT_BINS) / np.log(GROWTH)).astype(np.int64)
+    bins[known] = np.where(exact, np.floor(value).astype(np.int64), EXACT_BINS + np.minimum(growing, GROWING_BINS - 1))
+    return bins
+
+
+def quantileName(quantile):
+    return "median" if quantile == 0.5 else "p%g" % (quantile * 100)
+
+
+def sketchQuantiles(histograms, quantiles=QUANTILES):
+    '''
+    Quantiles (nearest rank: the smallest score with at least quantile x count scores at or below it) of the sketches
+    in the last axis of histograms, NaN for an empty sketch. Returns an array with one more axis, one entry per quantile.
+    '''
+    cumulative = np.cumsum(histograms, axis=-1)
+    total = cumulative[..., -1:] if histograms.shape[-1] > 0 else np.zeros(histograms.shape[:-1] + (1,))
+    values = binValues()
+    result = np.empty(histograms.shape[:-1] + (len(quantiles),))
+    for i, quantile in enumerate(quantiles):
+        rank = np.maximum(np.ceil(quantile * total), 1)
+        position = np.minimum((cumulative < rank).sum(axis=-1), SCORE_BINS - 1)     #first bin reaching the rank
+        result[..., i] = np.where(total[..., 0] > 0, values.take(position), np.nan)
+    return result
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  snapshotTable.py
+#
+#  One row per establishment of the inspection data: its latest inspection (date, score,
+#  grade and number of critical and not critical violations) and its violation totals.
+#  Establishments are keyed by phone number, or by DBA and ZIPCODE when the phone number
+#  is missing. The table is built in one vectorized pass and a lookup is a dictionary access.
+#
+##########################################################################################
+
+import numpy as np
+import pandas as pd
+
+import sourceCache     #sourceCache.py
+from compactTable import textColumn     #compactTable.py
+from phoneIndex import normalizePhone     #phoneIndex.py
+from timeline import parseDates     #timeline.py
+
+LATEST_COLUMNS = ["DBA", "BORO", "ZIPCODE", "CUISINE DESCRIPTION", "INSPECTION DATE", "SCORE", "GRADE", "GRADE DATE"]     #taken from the latest inspection
+COUNT_COLUMNS = ["CRITICAL", "NOT CRITICAL", "TOTAL CRITICAL", "TOTAL NOT CRITICAL", "INSPECTIONS"]
+SNAPSHOT_COLUMNS = LATEST_COLUMNS + COUNT_COLUMNS
+
+
+def establishmentKeys(ratingList):
+    '''
+    Key of every row: the digits of PHONE, or "DBA|ZIPCODE" when PHONE has no digits
+    '''
+    rawCodes, rawPhones = pd.factorize(ratingList["PHONE"].values)
+    keys = np.array([normalizePhone(phone) for phone in textColumn("PHONE", rawPhones)], dtype=object).take(rawCodes)     #each distinct value is cleaned once
+    missing = np.where(keys == u"")[0]
+    if len(missing) > 0:
+        names = textColumn("DBA", ratingList["DBA"].iloc[missing].values)
+        zipcodes = textColumn("ZIPCODE", ratingList["ZIPCODE"].iloc[missing].values)
+        keys[missing] = [u"%s|%s" % (name, zipcode) for name, zipcode in zip(names, zipcodes)]
+    return keys
+
+
+def placeholderSnapshot():
+    '''
+    Snapshot of a restaurant that can not be found in the city data
+    '''
+    snapshot = dict((column, "To be Updated") for column in LATEST_COLUMNS)
+    snapshot.update(dict((column, 0) for column in COUNT_COLUMNS))
+    return snapshot
+
+
+class SnapshotTable(object):
+
+    '''
+    Latest inspection and violation totals per establishment.
+
+    Attributes:
+      frame (Pandas DataFrame): SNAPSHOT_COLUMNS, one row per establishment, indexed by its key.
+      positions (dict): key -> row of frame.
+    '''
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.positions = dict((key, i) for i, key in enumerate(frame.index))
+
+    @classmethod
+    def fromFrame(cls, ratingList, keys=None):
+        '''
+        Build the snapshots of the inspection rows in ratingList (as sourceReader() returns them, compact or not).
+        keys overrides the establishment key of every row. The snapshots hold the text of the csv in both cases.
+        '''
+        if keys is None:
+            keys = establishmentKeys(ratingList)
+        keyCodes, labels = pd.factorize(keys)
+        dates = parseDates(ratingList["INSPECTION DATE"].values).view(np.int64)     #NaT (not a date) is the smallest value
+        order = np.lexsort((np.arange(len(keyCodes)), dates, keyCodes))
+        sortedKeys = keyCodes[order]
+        sortedDates = dates[order]
+        last = order[np.r_[sortedKeys[1:] != sortedKeys[:-1], True]] if len(order) > 0 else order     #latest row of every key, in key order
+        latest = dates[last].take(keyCodes)
+        newInspection = np.r_[True, (sortedKeys[1:] != sortedKeys[:-1]) | (sortedDates[1:] != sortedDates[:-1])] if len(order) > 0 else order
+
+        flags = ratingList["CRITICAL FLAG"].values
+        critical = flags == "Critical"
+        notCritical = flags == "Not Critical"
+        latestRows = dates == latest
+        counts = {"CRITICAL": critical & latestRows, "NOT CRITICAL": notCritical & latestRows, "TOTAL CRITICAL": critical, "TOTAL NOT CRITICAL": notCritical}
+
+        columns = dict((column, textColumn(column, ratingList[column].iloc[last].values)) for column in LATEST_COLUMNS)
+        for column, mask in counts.items():
+            columns[column] = np.bincount(keyCodes[mask], minlength=len(labels))
+        columns["INSPECTIONS"] = np.bincount(sortedKeys[newInspection], minlength=len(labels))
+        return cls(pd.DataFrame(columns, index=pd.Index(labels, name="KEY"), columns=SNAPSHOT_COLUMNS))
+
+    @classmethod
+    def forSource(cls, thisfile, ratingList):
+        '''
+        Snapshots of ratingList read from thisfile, stored alongside the data cache of thisfile
+        '''
+        arrays = sourceCache.loadArrays(thisfile, "snapshots")
+        if arrays is not None:
+            columns = dict((column, arrays["column%i" % i] if column in COUNT_COLUMNS else arrays["column%i" % i].astype(object))
+                           for i, column in enumerate(SNAPSHOT_COLUMNS))
+            return cls(pd.DataFrame(columns, index=pd.Index(arrays["keys"].astype(object), name="KEY"), columns=SNAPSHOT_COLUMNS))
+        table = cls.fromFrame(ratingList)
+        table.save(thisfile)
+        return table
+
+    def save(self, thisfile):
+        '''
+        Store the snapshots with the data cache of thisfile, where forSource() reads them
+        '''
+        arrays = {"keys": np.array(list(self.frame.index), dtype=np.unicode_)}
+        for i, column in enumerate(SNAPSHOT_COLUMNS):
+            values = self.frame[column].values
+            arrays["column%i" % i] = values if column in COUNT_COLUMNS else np.array([unicode(value) for value in values], dtype=np.unicode_)
+        sourceCache.saveArrays(thisfile, "snapshots", arrays)
+
+    def merge(self, other):
+        '''
+        Snapshots of the rows of self and of other together (e.g. of two chunks of a file).
+        The latest inspection of a key is the later one of the two, violation totals are added.
+        INSPECTIONS is exact unless an inspection other than the latest has rows in both.
+        '''
+        frame = pd.concat([self.frame, other.frame])
+        keyCodes, labels = pd.factorize(frame.index.values)
+        dates = parseDates(frame["INSPECTION DATE"].values).view(np.int64)
+        order = np.lexsort((np.arange(len(keyCodes)), dates, keyCodes))
+        sortedKeys = keyCodes[order]
+        last = order[np.r_[sortedKeys[1:] != sortedKeys[:-1], True]] if len(order) > 0 else order
+        latestRows = dates == dates[last].take(keyCodes)
+
+        def total(column, mask=None):
+            mask = np.ones(len(keyCodes), dtype=bool) if mask is None else mask
+            return np.bincount(keyCodes[mask], weights=frame[column].values[mask].astype(np.float64), minlength=len(labels)).astype(np.int64)
+
+        columns = dict((column, frame[column].values.take(last)) for column in LATEST_COLUMNS)
+        columns.update({"CRITICAL": total("CRITICAL", latestRows), "NOT CRITICAL": total("NOT CRITICAL", latestRows),
+                        "TOTAL CRITICAL": total("TOTAL CRITICAL"), "TOTAL NOT CRITICAL": total("TOTAL NOT CRITICAL"),
+                        "INSPECTIONS": total("INSPECTIONS") - (np.bincount(keyCodes[latestRows], minlength=len(labels)) - 1)})     #a latest inspection in both is one inspection
+        return SnapshotTable(pd.DataFrame(columns, index=pd.Index(labels, name="KEY"), columns=SNAPSHOT_COLUMNS))
+
+    def refreshed(self, ratingList, phoneIndex, rows):
+        '''
+        Snapshots of ratingList after the rows of the dataframe rows were added to it or changed in it (deltaIngest.py).
+        Only the establishments of these rows are computed again, from all their rows (phoneIndex is the index of ratingList),
+        and merged with the snapshots of the other establishments.
+        '''
+        keys = pd.unique(establishmentKeys(rows))
+        phones = [key for key in keys if u"|" not in key]
+        stale = self.frame.index.isin(keys)
+        if len(phones) < len(keys):     #an establishment without a phone number is keyed by DBA and ZIPCODE, which may have changed
+            phones.append(u"")
+            stale |= np.array([u"|" in key for key in self.frame.index], dtype=bool)
+        positions = np.sort(np.concatenate([phoneIndex.rows(thisPhone) for thisPhone in phones] + [phoneIndex.order[:0]]))     #in the order of ratingList
+        return SnapshotTable(self.frame[~stale]).merge(SnapshotTable.fromFrame(ratingList.iloc[positions]))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __contains__(self, thisPhone):
+        return normalizePhone(thisPhone) in self.positions
+
+    def lookup(self, thisPhone=None, name=None, zipcode=None):
+        '''
+        Snapshot (dictionary) of a phone number, or of a DBA and ZIPCODE, None when it is not in the data
+        '''
+        return self.lookupKey(normalizePhone(thisPhone) if thisPhone is not None else u"%s|%s" % (name, zipcode))
+
+    def lookupKey(self, key):
+        '''
+        Snapshot (dictionary) of an establishment key (see establishmentKeys), None when it is not in the data
+        '''
+        i = self.positions.get(key)
+        if i is None:
+            return None
+        return dict(self.frame.iloc[i])
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  sourceCache.py
+#
+#  Columnar on-disk cache for the inspection data read by sourceReader() in restaurant.py.
+#  Every column is saved as NumPy integer codes (memory-mapped when loaded) plus its distinct values.
+#  The cache is keyed by the size, modification time and md5 hash of the source csv,
+#  so replacing the csv rebuilds the cache on the next start.
+#
+##########################################################################################
+
+import io
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+import compactTable     #compactTable.py
+
+CACHE_VERSION = 3     #bump whenever the layout or the content of the cached dataframe changes
+CACHE_FOLDER = ".restaurant_cache"
+
+
+def cacheDirectory(thisfile):
+    '''
+    Folder that holds the cache of thisfile (next to the csv itself)
+    '''
+    thisfile = os.path.abspath(thisfile)
+    return os.path.join(os.path.dirname(thisfile), CACHE_FOLDER, os.path.basename(thisfile))
+
+
+def fileHash(thisfile, blockSize=1 << 20):
+    '''
+    md5 of the whole file, read block by block
+    '''
+    md5 = hashlib.md5()
+    with open(thisfile, "rb") as source:
+        block = source.read(blockSize)
+        while block:
+            md5.update(block)
+            block = source.read(blockSize)
+    return md5.hexdigest()
+
+
+def sourceSignature(thisfile):
+    '''
+    Size and modification time of thisfile
+    '''
+    stat = os.stat(thisfile)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def readMeta(thisfile):
+    '''
+    Return the meta data of a valid cache of thisfile, or None when it is missing or out of date
+    '''
+    metaPath = os.path.join(cacheDirectory(thisfile), "meta.json")
+    if os.path.exists(metaPath) == False:
+        return None
+    try:
+        with open(metaPath) as metaFile:
+            meta = json.load(metaFile)
+    except ValueError:     #broken meta file, e.g. the program was killed while writing
+        return None
+    if meta.get("version") != CACHE_VERSION:
+        return None
+
+    signature = sourceSignature(thisfile)
+    if signature["size"] != meta["size"]:
+        return None
+    if signature["mtime"] != meta["mtime"]:     #touched or copied, check the content itself
+        if fileHash(thisfile) != meta["md5"]:
+            return None
+        meta.update(signature)
+        writeMeta(cacheDirectory(thisfile), meta)
+    return meta
+
+
+def writeMeta(folder, meta):
+    with open(os.path.join(folder, "meta.json"), "w") as metaFile:
+        json.dump(meta, metaFile)
+
+
+def loadCache(thisfile, compact=False):
+    '''
+    Return the cached dataframe of thisfile, or None when the cache has to be rebuilt
+    Every column is a categorical over the memory-mapped codes, its text is never expanded into one object per row
+    With compact=True the typed columns of compactTable.py are built straight from the cached codes
+    '''
+    meta = readMeta(thisfile)
+    if meta is None:
+        return None
+    folder = cacheDirectory(thisfile)
+    columns = {}
+    for i, column in enumerate(meta["columns"]):
+        codes = np.load(os.path.join(folder, "column%i_codes.npy" % i), mmap_mode="r")
+        values = np.load(os.path.join(folder, "column%i_values.npy" % i)).astype(object)
+        if compact:
+            columns[column] = compactTable.compactColumn(column, codes, values)
+        else:
+            columns[column] = pd.Categorical.from_codes(codes, values)     #code -1 is a missing value (e.g. no BUILDING)
+    return pd.DataFrame(columns, columns=meta["columns"])
+
+
+def saveCache(thisfile, ratingList, deltas=()):
+    '''
+    Save ratingList as the cache of thisfile.
+    deltas lists the md5 of the delta files (deltaIngest.py) already applied to ratingList.
+    The cache is written to a temporary folder first, so a half written cache is never read.
+    Returns False when the cache could not be written.
+    '''
+    folder = cacheDirectory(thisfile)
+    temporary = folder + ".tmp"
+    try:
+        if os.path.exists(temporary):
+            shutil.rmtree(temporary)
+        os.makedirs(temporary)
+        for i, column in enumerate(ratingList.columns):
+            codes, values = pd.factorize(ratingList[column].values)
+            np.save(os.path.join(temporary, "column%i_codes.npy" % i), codes.astype(np.int32))
+            np.save(os.path.join(temporary, "column%i_values.npy" % i), np.array(list(values), dtype=np.unicode_))
+
+        meta = sourceSignature(thisfile)
+        meta.update({"version": CACHE_VERSION, "md5": fileHash(thisfile), "rows": len(ratingList), "columns": list(ratingList.columns), "deltas": list(deltas)})
+        writeMeta(temporary, meta)
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+        os.rename(temporary, folder)
+        return True
+    except (IOError, OSError):     #read-only folder or full disk, the program still works without the cache
+        if os.path.exists(temporary):
+            shutil.rmtree(temporary, ignore_errors=True)
+        return False
+
+
+def appendCodes(codesPath, codes):
+    '''
+    Append codes at the end of a .npy file of codes.
+    Only the length in its header is written again, unless the new length does not fit in the header: the file is then saved again.
+    '''
+    with open(codesPath, "r+b") as codesFile:
+        version = np.lib.format.read_magic(codesFile)
+        if version == (1, 0):
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_1_0(codesFile)
+            offset = codesFile.tell()
+            header = io.BytesIO()
+            np.lib.format.write_array_header_1_0(header, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": fortranOrder,
+                                                          "shape": (shape[0] + len(codes),)})
+            if len(header.getvalue()) == offset:
+                codesFile.seek(offset + shape[0] * dtype.itemsize)
+                codes.astype(dtype).tofile(codesFile)
+                codesFile.seek(0)
+                codesFile.write(header.getvalue())
+                return
+    np.save(codesPath, np.concatenate([np.load(codesPath), codes.astype(np.int32)]))
+
+
+def appendCache(thisfile, rows, replaced, replacing, added, deltas=()):
+    '''
+    Bring the cache of thisfile, saved for a table of `rows` rows, up to date with a delta (deltaIngest.py):
+    the rows at positions replaced take the values of replacing and the rows of added are appended (both in the text of the csv).
+    Only what changes is written: the codes of a column are patched in place and grow at their end, its distinct values
+    are saved again only when the delta brings new ones, and the csv is not hashed again.
+    The meta data is removed while the files change, so a half written cache is never read; the arrays stored
+    with saveArrays() are removed, they are out of date.
+    Returns False when there is no cache of `rows` rows to update or it could not be written.
+    '''
+    meta = readMeta(thisfile)
+    if meta is None or meta["rows"] != rows or meta["columns"] != list(added.columns):
+        return False
+    folder = cacheDirectory(thisfile)
+    try:
+        os.remove(os.path.join(folder, "meta.json"))
+        for name in os.listdir(folder):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(folder, name))
+        for i, column in enumerate(meta["columns"]):
+            valuesPath = os.path.join(folder, "column%i_values.npy" % i)
+            codesPath = os.path.join(folder, "column%i_codes.npy" % i)
+            values = pd.Index(np.load(valuesPath).astype(object))
+            newValues = np.concatenate([np.asarray(replacing[column].values, dtype=object), np.asarray(added[column].values, dtype=object)])
+            unseen = pd.unique(newValues[pd.notnull(newValues)])
+            unseen = unseen[values.get_indexer(unseen) == -1]
+            if len(unseen) > 0:
+                values = values.append(pd.Index(unseen))
+                np.save(valuesPath, np.array(list(values), dtype=np.unicode_))
+            codes = values.get_indexer(newValues).astype(np.int32)     #a missing value gets -1
+
+            if len(replaced) > 0:
+                stored = np.load(codesPath, mmap_mode="r")
+                changed = stored[replaced] != codes[:len(replaced)]
+                del stored
+                if changed.any():
+                    stored = np.load(codesPath, mmap_mode="r+")
+                    stored[replaced[changed]] = codes[:len(replaced)][changed]
+                    stored.flush()
+                    del stored
+            if len(added) > 0:
+                appendCodes(codesPath, codes[len(replaced):])
+
+        meta.update({"rows": rows + len(added), "deltas": list(deltas)})
+        writeMeta(folder, meta)
+        return True
+    except (IOError, OSError):     #the cache is left without its meta data, it is rebuilt on the next start
+        return False
+
+
+def appliedDeltas(thisfile):
+    '''
+    md5 of the delta files applied to the cache of thisfile (empty when there is no valid cache)
+    '''
+    meta = readMeta(thisfile)
+    if meta is None:
+        return []
+    return meta.get("deltas", [])
+
+
+def loadArrays(thisfile, name):
+    '''
+    Return a dictionary of NumPy arrays stored with saveArrays() next to a valid cache of thisfile,
+    or None when they are missing or the cache is out of date
+    '''
+    arrayPath = os.path.join(cacheDirectory(thisfile), name + ".npz")
+    if readMeta(thisfile) is None or os.path.exists(arrayPath) == False:
+        return None
+    stored = np.load(arrayPath)
+    return dict((key, stored[key]) for key in stored.files)
+
+
+def saveArrays(thisfile, name, arrays):
+    '''
+    Store derived NumPy arrays (e.g. an index) with the cache of thisfile.
+    They are removed together with the cache whenever the csv changes.
+    '''
+    if readMeta(thisfile) is None:     #no valid cache to attach to
+        return
+    try:
+        np.savez(os.path.join(cacheDirectory(thisfile), name + ".npz"), **arrays)
+    except (IOError, OSError):
+        pass
+
+
+def clearCache(thisfile):
+    '''
+    Remove the cache of thisfile
+    '''
+    folder = cacheDirectory(thisfile)
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
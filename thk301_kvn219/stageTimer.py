@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  stageTimer.py
+#
+#  Timing of the stages of the program: wall time, CPU time, rows and peak memory of every
+#  analysis step, file read, Yelp fetch, chart and menu option.
+#  Off unless RESTAURANT_PROFILE is set ("json", or "table" for any other value) or `restaurant.py --profile` is used.
+#  "json" writes one JSON line per stage (to RESTAURANT_PROFILE_FILE, or to stderr),
+#  "table" prints a summary per stage when the program ends.
+#  When it is off, a timed function costs one attribute check per call.
+#
+##########################################################################################
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+
+try:
+    import resource
+except ImportError:     #not on Windows
+    resource = None
+
+ENV_VARIABLE = "RESTAURANT_PROFILE"
+FILE_VARIABLE = "RESTAURANT_PROFILE_FILE"
+MODES = ["json", "table"]
+
+
+def cpuTime():
+    '''
+    User and system CPU seconds of this process
+    '''
+    times = os.times()
+    return times[0] + times[1]
+
+
+def peakMemory():
+    '''
+    Peak resident memory of this process in MB, None when it can not be measured
+    '''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0     #bytes on OS X, kilobytes on Linux
+
+
+def rowCount(result):
+    '''
+    Number of rows of a dataframe, series, array or list, None for anything else
+    '''
+    if hasattr(result, "shape"):
+        return int(result.shape[0]) if len(result.shape) > 0 else None
+    if isinstance(result, (list, tuple, dict)):
+        return len(result)
+    return None
+
+
+class StageRecorder(object):
+
+    '''
+    Where the timed stages go.
+
+    Attributes:
+      mode (str): "json", "table", or None when timing is off.
+      output (file): stream of the JSON lines.
+      records (list): every stage of the "table" mode, as dictionaries.
+      stack (list): names of the stages running now in this thread (a stage may run inside another one).
+    '''
+
+    def __init__(self):
+        self.mode = None
+        self.output = None
+        self.records = []
+        self.local = threading.local()     #stages of a ThreadPool (e.g. bulk import) run at the same time
+        self.lock = threading.Lock()
+        self.reported = False
+
+    @property
+    def stack(self):
+        if hasattr(self.local, "stack") == False:
+            self.local.stack = []
+        return self.local.stack
+
+    def enable(self, mode="table", path=None):
+        if mode not in MODES:
+            raise ValueError("%s must be one of %s" % (ENV_VARIABLE, ", ".join(MODES)))
+        self.mode = mode
+        self.output = open(path, "a") if path else sys.stderr
+        if mode == "table" and self.reported == False:
+            self.reported = True
+            atexit.register(self.summaryPrinter)
+
+    def disable(self):
+        if self.output is not None and self.output is not sys.stderr:
+            self.output.close()
+        self.mode = None
+        self.output = None
+
+    def record(self, thisRecord):
+        with self.lock:
+            if self.mode == "json":
+                self.output.write(json.dumps(thisRecord, sort_keys=True) + "\n")
+                self.output.flush()
+            else:
+                self.records.append(thisRecord)
+
+    def summary(self):
+        '''
+        Calls, total wall and CPU seconds, total rows and highest peak memory of every stage, slowest first
+        '''
+        stages = {}
+        for thisRecord in self.records:
+            total = stages.setdefault(thisRecord["stage"], {"stage": thisRecord["stage"], "calls": 0, "wall": 0.0, "cpu": 0.0, "rows": None, "peak_mb": None})
+            total["calls"] += 1
+            total["wall"] += thisRecord["wall"]
+            total["cpu"] += thisRecord["cpu"]
+            if thisRecord["rows"] is not None:
+                total["rows"] = (total["rows"] or 0) + thisRecord["rows"]
+            if thisRecord["peak_mb"] is not None:
+                total["peak_mb"] = max(total["peak_mb"] or 0, thisRecord["peak_mb"])
+        return sorted(stages.values(), key=lambda total: -total["wall"])
+
+    def summaryPrinter(self):
+        if self.mode != "table" or len(self.records) == 0:
+            return
+        print "*"*30
+        print "%-44s %6s %10s %10s %10s %9s" % ("stage", "calls", "wall (s)", "cpu (s)", "rows", "peak (MB)")
+        for total in self.summary():
+            rows = "" if total["rows"] is None else "%i" % total["rows"]
+            peak = "" if total["peak_mb"] is None else "%.0f" % total["peak_mb"]
+            print "%-44s %6i %10.3f %10.3f %10s %9s" % (total["stage"][:44], total["calls"], total["wall"], total["cpu"], rows, peak)
+        print "*"*30
+
+
+recorder = StageRecorder()     #global recorder, see enable()
+
+
+def enable(mode="table", path=None):
+    recorder.enable(mode, path)
+
+
+def disable():
+    recorder.disable()
+
+
+def isEnabled():
+    return recorder.mode is not None
+
+
+class measure(object):
+
+    '''
+    Time the block of a with statement as one stage. Set `rows` on the returned object
+    to record the rows it processed.
+    '''
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.active = False
+
+    def __enter__(self):
+        if recorder.mode is None:
+            return self
+        self.active = True
+        self.parent = recorder.stack[-1] if recorder.stack else None
+        recorder.stack.append(self.name)
+        self.startMemory = peakMemory()
+        self.started = time.time()
+        self.startCpu = cpuTime()
+        return self
+
+    def __exit__(self, errorType, thisError, traceback):
+        if self.active == False:
+            return False
+        wall = time.time() - self.started
+        cpu = cpuTime() - self.startCpu
+        recorder.stack.pop()
+        peak = peakMemory()
+        recorder.record({"stage": self.name, "parent": self.parent, "depth": len(recorder.stack), "start": self.started,
+                         "wall": wall, "cpu": cpu, "rows": self.rows, "peak_mb": peak,
+                         "peak_growth_mb": None if peak is None else peak - self.startMemory,
+                         "error": None if errorType is None else errorType.__name__, "pid": os.getpid()})
+        return False
+
+
+def stage(name=None, rows=rowCount):
+    '''
+    Decorator timing every call of a function as the stage name (default: the function name).
+    rows(result) is the number of rows the call processed.
+    '''
+    def decorate(function):
+        label = name or function.__name__
+
+        @functools.wraps(function)
+        def run(*args, **kwargs):
+            if recorder.mode is None:     #timing is off
+                return function(*args, **kwargs)
+            with measure(label) as thisStage:
+                result = function(*args, **kwargs)
+                thisStage.rows = rows(result)
+            return result
+        run.__wrapped__ = function     #the code of the function itself, see chartCache.codeFingerprint
+        return run
+    return decorate
+
+
+if os.environ.get(ENV_VARIABLE):
+    thisMode = os.environ[ENV_VARIABLE].lower()
+    enable(thisMode if thisMode in MODES else "table", os.environ.get(FILE_VARIABLE))     #e.g. RESTAURANT_PROFILE=1
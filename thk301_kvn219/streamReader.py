@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  streamReader.py
+#
+#  Streaming mode for inspection files larger than memory. The csv is read in chunks of
+#  a bounded number of rows; every chunk is cleaned (OpenDataNYC.cleanFrame), aggregated
+#  (aggregationEngine.py) and summarized per establishment (snapshotTable.py), then dropped.
+#  Only the merged aggregates and snapshots are kept, plus the name and address of every
+#  establishment (for fuzzyMatcher.py) and one integer per distinct inspection for its exact count.
+#  The peak memory is O(chunk rows + establishments + distinct inspections), not O(rows): an
+#  establishment takes one snapshot row and a few inspections of 8 bytes each.
+#  The inspection rows of a few phone numbers (the full view of the Restaurant Keeper) are
+#  read again chunk by chunk by phoneRows(), keeping only the rows of those phones.
+#
+##########################################################################################
+
+import numpy as np
+import pandas as pd
+
+from OpenDataNYC import cleanFrame     #OpenDataNYC.py
+from aggregationEngine import ViolationAggregates     #aggregationEngine.py
+from snapshotTable import SnapshotTable, SNAPSHOT_COLUMNS, establishmentKeys     #snapshotTable.py
+from timeline import parseDates     #timeline.py
+from phoneIndex import normalizePhone     #phoneIndex.py
+from stageTimer import stage     #stageTimer.py
+
+REQUIRED_COLUMNS = ['DBA', 'PHONE', 'BORO', 'ZIPCODE', 'CUISINE DESCRIPTION', 'VIOLATION DESCRIPTION','INSPECTION DATE', 'CRITICAL FLAG', 'SCORE', 'GRADE DATE', 'GRADE']
+ADDRESS_COLUMNS = ['BUILDING', 'STREET']     #may be missing
+DOCUMENT_COLUMNS = ['DBA', 'PHONE', 'ZIPCODE'] + ADDRESS_COLUMNS     #what fuzzyMatcher.TrigramIndex indexes of an establishment
+DAY = 24 * 3600 * 10 ** 9     #nanoseconds
+CHUNK_ROWS = 200000
+
+
+def rowFilter(thisData):
+    '''
+    Drop the rows missing a value, except for a missing address (BUILDING, STREET)
+    '''
+    thisData = thisData.dropna(subset=REQUIRED_COLUMNS)
+    return thisData.fillna(dict((column, '') for column in ADDRESS_COLUMNS))
+
+
+def chunkReader(thisfile, chunkRows=CHUNK_ROWS):
+    '''
+    The rows of a csv of the city data, chunkRows rows at a time, filtered like restaurant.csvParser()
+    '''
+    for chunk in pd.read_csv(thisfile, usecols=REQUIRED_COLUMNS + ADDRESS_COLUMNS, dtype='unicode', chunksize=chunkRows):
+        yield rowFilter(chunk)
+
+
+def phoneRows(thisfile, phones, chunkRows=CHUNK_ROWS):
+    '''
+    Inspection rows of some phone numbers, read chunk by chunk and sorted by date like restaurant.sourceReader()
+    Only the rows of these phones are kept, so the memory used does not depend on the size of thisfile
+    '''
+    wanted = set(normalizePhone(thisPhone) for thisPhone in phones)
+    found = []
+    for chunk in chunkReader(thisfile, chunkRows):
+        codes, distinct = pd.factorize(chunk["PHONE"].values)
+        keep = np.array([normalizePhone(thisPhone) in wanted for thisPhone in distinct] + [False], dtype=bool)     #code -1 takes the False at the end
+        found.append(chunk[keep.take(codes)])
+    rows = pd.concat(found, ignore_index=True) if found else pd.DataFrame(columns=REQUIRED_COLUMNS + ADDRESS_COLUMNS)
+    rows = rows.iloc[np.argsort(parseDates(rows["INSPECTION DATE"].values), kind='mergesort')]
+    rows.index = xrange(len(rows))
+    return rows
+
+
+class StreamSummary(object):
+
+    '''
+    What the charts and the Restaurant Keeper need from a file read in chunks.
+
+    Attributes:
+      aggregates (ViolationAggregates): counts and score sums of the clean rows.
+      snapshots (SnapshotTable): latest inspection and violation totals per establishment.
+      establishments (Pandas DataFrame): DOCUMENT_COLUMNS of the first row of every establishment, to build a fuzzyMatcher.TrigramIndex.
+      rows (int): rows read (after the rows missing a value are dropped).
+      chunks (int): chunks read.
+
+    The snapshots of the chunks are merged like a binary counter (two tables of the same
+    number of chunks are merged into one), so every chunk is merged about log2(chunks) times
+    rather than once per later chunk. An inspection may have rows in two chunks, so INSPECTIONS
+    is counted from the sorted distinct (establishment, INSPECTION DATE) codes of every table,
+    which are merged (np.union1d) along with the tables.
+
+    Memory: besides the chunk being read, O(establishments) for the snapshots, the key ids and
+    the first rows, and 8 bytes per distinct inspection for the codes. Nothing is kept per row.
+    '''
+
+    def __init__(self):
+        self.aggregates = ViolationAggregates.empty()
+        self.tables = []     #(chunks, SnapshotTable, inspection codes) not merged yet, the most chunks first
+        self.keyIds = {}     #establishment key -> integer id, for the inspection codes
+        self.documents = []     #first rows of the establishments new in every chunk
+        self.merged = None
+        self.rows = 0
+        self.chunks = 0
+
+    def add(self, chunk):
+        '''
+        Add the rows of a chunk (as chunkReader() returns them)
+        '''
+        if len(chunk) == 0:
+            return self
+        self.aggregates.merge(ViolationAggregates.fromFrame(cleanFrame(chunk)))
+        keys = establishmentKeys(chunk)
+        self.tables.append((1, SnapshotTable.fromFrame(chunk, keys), self.inspectionCodes(keys, chunk)))
+        while len(self.tables) > 1 and self.tables[-1][0] == self.tables[-2][0]:
+            chunks, newer, newerCodes = self.tables.pop()
+            olderChunks, older, olderCodes = self.tables.pop()
+            self.tables.append((2 * chunks, older.merge(newer), np.union1d(olderCodes, newerCodes)))     #the rows of newer are the later ones
+        self.merged = None
+        self.rows += len(chunk)
+        self.chunks += 1
+        return self
+
+    def inspectionCodes(self, keys, chunk):
+        '''
+        Sorted distinct codes of the inspections of a chunk: the id of the establishment key in the high 32 bits, the day in the low ones
+        The first row of an establishment seen for the first time is kept in documents
+        '''
+        keyCodes, labels = pd.factorize(keys)
+        known = len(self.keyIds)
+        labelIds = np.array([self.keyIds.setdefault(key, len(self.keyIds)) for key in labels], dtype=np.int64)
+        first = np.unique(keyCodes, return_index=True)[1]     #first row of every label, in label order
+        self.documents.append(chunk[DOCUMENT_COLUMNS].iloc[first[labelIds >= known]])
+        ids = labelIds.take(keyCodes)
+        nanoseconds = parseDates(chunk["INSPECTION DATE"].values).view(np.int64)
+        days = np.where(nanoseconds == np.iinfo(np.int64).min, 0xFFFFFFFF, (nanoseconds // DAY) & 0xFFFFFFFF)     #NaT counts as one date, like in SnapshotTable
+        return np.unique((ids << 32) | days)
+
+    @property
+    def establishments(self):
+        if len(self.documents) != 1:
+            self.documents = [pd.concat(self.documents, ignore_index=True) if self.documents else pd.DataFrame(columns=DOCUMENT_COLUMNS)]
+        return self.documents[0]
+
+    @property
+    def snapshots(self):
+        '''
+        Snapshots of all the chunks read so far, the tables left are merged on first use
+        '''
+        if self.merged is not None:
+            return self.merged
+        if len(self.tables) == 0:
+            return SnapshotTable(pd.DataFrame(columns=SNAPSHOT_COLUMNS))
+        chunks, merged, codes = self.tables[-1]
+        for olderChunks, older, olderCodes in reversed(self.tables[:-1]):
+            merged = older.merge(merged)
+            codes = np.union1d(olderCodes, codes)     #an inspection in two chunks counts once
+            chunks += olderChunks
+        self.tables = [(chunks, merged, codes)]
+        counts = np.bincount(codes >> 32, minlength=len(self.keyIds))
+        frame = merged.frame.copy()
+        frame["INSPECTIONS"] = counts.take(np.array([self.keyIds[key] for key in frame.index], dtype=np.int64))
+        self.merged = SnapshotTable(frame)
+        return self.merged
+
+
+@stage(rows=lambda summary: summary.rows)
+def streamSummary(thisfile, chunkRows=CHUNK_ROWS):
+    '''
+    Read thisfile chunk by chunk and return its StreamSummary
+    '''
+    summary = StreamSummary()
+    for chunk in chunkReader(thisfile, chunkRows):
+        summary.add(chunk)
+    return summary
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  timeline.py
+#
+#  Date index of the inspection data. INSPECTION DATE is parsed once (one parse per distinct
+#  date) and the row positions are kept sorted by date, so any date range is two binary
+#  searches and a slice. Monthly and rolling trends of SCORE and of the critical violation
+#  rate per cuisine and borough are computed with np.bincount and np.cumsum.
+#
+##########################################################################################
+
+import numpy as np
+import pandas as pd
+
+from aggregationEngine import factorized     #aggregationEngine.py
+
+
+def parseDates(values):
+    '''
+    datetime64 array of a column of MM/DD/YYYY text, every distinct date is parsed once
+    '''
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):     #already parsed, e.g. a compact table
+        return values.astype('datetime64[ns]')
+    codes, dates = pd.factorize(values)
+    try:
+        parsed = pd.to_datetime(pd.Series(dates)).values
+    except ValueError:     #e.g. the "To be Updated" rows of the Restaurant Keeper
+        parsed = np.array([dateOrNaT(date) for date in dates], dtype='datetime64[ns]')
+    return parsed.take(codes)
+
+
+def dateOrNaT(value):
+    try:
+        return np.datetime64(pd.Timestamp(value).value, 'ns')
+    except ValueError:
+        return np.datetime64('NaT', 'ns')
+
+
+def toDate(value):
+    return np.datetime64(pd.Timestamp(value).value, 'ns')
+
+
+class InspectionTimeline(object):
+
+    '''
+    Row positions of the inspection data sorted by INSPECTION DATE.
+
+    Attributes:
+      order (np.array): row positions, in date order (rows of the same day keep their order).
+      dates (np.array): datetime64 INSPECTION DATE of the rows in `order`, sorted.
+    '''
+
+    def __init__(self, order, dates):
+        self.order = order
+        self.dates = dates
+
+    @classmethod
+    def fromFrame(cls, ratingList):
+        dates = parseDates(ratingList["INSPECTION DATE"].values)
+        order = np.argsort(dates, kind='mergesort')
+        return cls(order, dates[order])
+
+    def __len__(self):
+        return len(self.order)
+
+    def bounds(self, start=None, end=None):
+        '''
+        Slice of `order` holding the rows from start to end (both days included, None is open)
+        '''
+        low = 0 if start is None else np.searchsorted(self.dates, toDate(start), side='left')
+        high = len(self.dates) if end is None else np.searchsorted(self.dates, toDate(end) + np.timedelta64(1, 'D'), side='left')
+        return slice(low, max(low, high))
+
+    def rows(self, start=None, end=None):
+        '''
+        Row positions inspected from start to end, in date order
+        '''
+        return self.order[self.bounds(start, end)]
+
+    def window(self, ratingList, start=None, end=None):
+        '''
+        Rows of ratingList inspected from start to end
+        '''
+        return ratingList.iloc[self.rows(start, end)]
+
+    def lastDays(self, days, end=None):
+        '''
+        (start, end) of the last days days up to end (default: the latest inspection)
+        '''
+        if end is None:
+            end = self.dates[-1]
+        end = toDate(end).astype('datetime64[D]')
+        return end - np.timedelta64(days - 1, 'D'), end
+
+    def trendTables(self, frame, start, end, period):
+        '''
+        Codes of the rows from start to end: cuisine x borough group, period (days or months from the first one),
+        and the labels, SCOREs and critical flags of these rows
+        '''
+        window = self.bounds(start, end)
+        positions = self.order[window]
+        dates = self.dates[window]
+        cuisine, cuisines = factorized(frame["CUISINE DESCRIPTION"].iloc[positions])
+        boro, boros = factorized(frame["BORO"].iloc[positions])
+        group = np.where((cuisine >= 0) & (boro >= 0), cuisine * len(boros) + boro, -1)
+        periods = dates.astype('datetime64[%s]' % period).astype(np.int64)
+        first = periods.min() if len(periods) > 0 else 0
+        score = np.asarray(frame["SCORE"].iloc[positions].values, dtype=np.float64)
+        critical = np.asarray(frame["CRITICAL FLAG"].iloc[positions].values == "Critical", dtype=np.float64)
+        return group, periods - first, first, cuisines, boros, score, critical
+
+    def monthlyTrends(self, frame, start=None, end=None):
+        '''
+        Rows, mean SCORE and critical violation rate per CUISINE DESCRIPTION x BORO x month of a cleaned frame
+        (see RestaurantData.setUpNYCRestaurantData), only for the months that have rows
+        '''
+        group, month, first, cuisines, boros, score, critical = self.trendTables(frame, start, end, 'M')
+        months = int(month.max()) + 1 if len(month) > 0 else 0
+        valid = group >= 0
+        bins = group[valid] * months + month[valid]
+        size = len(cuisines) * len(boros) * months
+        known = np.isnan(score[valid]) == False
+        rows = np.bincount(bins, minlength=size)
+        scoreCount = np.bincount(bins[known], minlength=size)
+        scoreSum = np.bincount(bins[known], weights=score[valid][known], minlength=size)
+        criticalCount = np.bincount(bins, weights=critical[valid], minlength=size)
+
+        cells = np.where(rows > 0)[0]
+        cellGroup, cellMonth = cells // max(months, 1), cells % max(months, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(scoreCount[cells] > 0, scoreSum[cells] / scoreCount[cells], np.nan)
+        index = pd.MultiIndex.from_arrays([cuisines[cellGroup // len(boros)], boros[cellGroup % len(boros)],
+                                           pd.DatetimeIndex((cellMonth + first).astype('datetime64[M]').astype('datetime64[ns]'))],
+                                          names=["CUISINE DESCRIPTION", "BORO", "MONTH"])
+        trends = pd.DataFrame({"rows": rows[cells], "mean": mean, "critical_rate": criticalCount[cells] / rows[cells]},
+                              index=index, columns=["rows", "mean", "critical_rate"])
+        return trends.sort_index()
+
+    def rollingTrends(self, frame, days=90, start=None, end=None):
+        '''
+        Mean SCORE and critical violation rate over the days days up to every day from start to end,
+        per CUISINE DESCRIPTION x BORO of a cleaned frame (see RestaurantData.setUpNYCRestaurantData).
+        Returns a dictionary of two dataframes, "mean" and "critical_rate": one row per day, one column per group.
+        '''
+        group, day, first, cuisines, boros, score, critical = self.trendTables(frame, start, end, 'D')
+        groups = len(cuisines) * len(boros)
+        span = int(day.max()) + 1 if len(day) > 0 else 0
+        valid = group >= 0
+        known = valid & (np.isnan(score) == False)
+
+        def dailyTotals(mask, weights=None):
+            totals = np.bincount(group[mask] * span + day[mask], weights=None if weights is None else weights[mask], minlength=groups * span)
+            totals = np.cumsum(totals.reshape(groups, span).astype(np.float64), axis=1)
+            totals = np.hstack([np.zeros((groups, 1)), totals])     #totals[:, t] holds the days before day t
+            return totals[:, 1:] - totals[:, np.maximum(np.arange(1, span + 1) - days, 0)]
+
+        rows = dailyTotals(valid)
+        scoreCount = dailyTotals(known)
+        scoreSum = dailyTotals(known, score)
+        criticalCount = dailyTotals(valid, critical)
+
+        used = np.where(rows.sum(axis=1) > 0)[0]
+        columns = pd.MultiIndex.from_arrays([cuisines[used // len(boros)], boros[used % len(boros)]], names=["CUISINE DESCRIPTION", "BORO"])
+        index = pd.DatetimeIndex((np.arange(span) + first).astype('datetime64[D]').astype('datetime64[ns]'), name="INSPECTION DATE")
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(scoreCount[used] > 0, scoreSum[used] / scoreCount[used], np.nan)
+            rate = np.where(rows[used] > 0, criticalCount[used] / rows[used], np.nan)
+        return {"mean": pd.DataFrame(mean.T, index=index, columns=columns).sort_index(axis=1),
+                "critical_rate": pd.DataFrame(rate.T, index=index, columns=columns).sort_index(axis=1)}
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+##########################################################################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  topIndex.py
+#
+#  Top-K queries over the clean inspection data of RestaurantData (OpenDataNYC.py), e.g.
+#  "top 50 Brooklyn pizza places by critical flags". For a dimension (DBA, CUISINE DESCRIPTION,
+#  BORO, ZIPCODE) and the filters of a query, the rows are counted once per
+#  (BORO, CUISINE DESCRIPTION, dimension) in a table sorted by the filters, so a query is a
+#  binary search for the range of its filters plus a partial selection (np.argpartition) in it.
+#
+##########################################################################################
+
+import threading
+import numpy as np
+import pandas as pd
+
+from aggregationEngine import factorized, topPositions     #aggregationEngine.py
+
+DIMENSIONS = ["DBA", "CUISINE DESCRIPTION", "BORO", "ZIPCODE"]
+FILTERS = ["BORO", "CUISINE DESCRIPTION"]     #in the order of the table sort
+METRICS = {"critical": "TOTAL CRITICAL", "violations": "VIOLATIONS", "score": "SCORE"}
+
+
+class TopTable(object):
+
+    '''
+    Counts of a dimension for one set of filters, sorted by the codes of the filters.
+
+    Attributes:
+      prefixes (np.array): code of the filter values of every entry, sorted.
+      keys (np.array): code of the dimension of every entry.
+      critical, violations (np.array): Critical rows and rows of every entry.
+      scoreSum, scoreCount (np.array): sum and count of the known SCOREs of every entry.
+    '''
+
+    def __init__(self, prefixes, keys, critical, violations, scoreSum, scoreCount):
+        self.prefixes = prefixes
+        self.keys = keys
+        self.critical = critical
+        self.violations = violations
+        self.scoreSum = scoreSum
+        self.scoreCount = scoreCount
+
+    def entries(self, prefix):
+        '''
+        Slice of the entries of the filter values coded as prefix (binary search)
+        '''
+        return slice(np.searchsorted(self.prefixes, prefix, side='left'), np.searchsorted(self.prefixes, prefix, side='right'))
+
+
+class TopIndex(object):
+
+    '''
+    Row codes of the DIMENSIONS, and the TopTables already built from them.
+
+    A TopTable is built the first time a query needs its dimension and filters, then
+    every query with the same dimension and filters only reads it.
+    '''
+
+    def __init__(self, codes, labels, critical, score):
+        self.codes = codes
+        self.labels = labels
+        self.critical = critical
+        self.score = score
+        self.positions = dict((dimension, dict((label, i) for i, label in enumerate(labels[dimension]))) for dimension in labels)
+        self.tables = {}
+        self.lock = threading.Lock()     #the query server reads the index from many threads
+
+    @classmethod
+    def fromFrame(cls, frame):
+        '''
+        Index of a cleaned inspection dataframe (see RestaurantData.setUpNYCRestaurantData)
+        '''
+        codes = {}
+        labels = {}
+        for dimension in DIMENSIONS:
+            if dimension in frame.columns:
+                codes[dimension], labels[dimension] = factorized(frame[dimension])
+        critical = np.asarray(frame["CRITICAL FLAG"].values == "Critical", dtype=np.int64)
+        score = np.asarray(frame["SCORE"].values, dtype=np.float64)
+        return cls(codes, labels, critical, score)
+
+    def table(self, dimension, filters):
+        '''
+        TopTable of dimension per value of the filters (a tuple of FILTERS), built on first use
+        '''
+        with self.lock:
+            if (dimension, filters) not in self.tables:
+                self.tables[(dimension, filters)] = self.tableBuilder(dimension, filters)
+            return self.tables[(dimension, filters)]
+
+    def tableBuilder(self, dimension, filters):
+        valid = self.codes[dimension] >= 0
+        composite = np.zeros(len(valid), dtype=np.int64)
+        for column in filters:
+            valid &= self.codes[column] >= 0
+            composite = composite * len(self.labels[column]) + self.codes[column]
+        size = len(self.labels[dimension])
+        composite = composite * size + self.codes[dimension]
+        entries, inverse = np.unique(composite[valid], return_inverse=True)     #sorted, so sorted by the filters first
+        known = np.isnan(self.score[valid]) == False
+        return TopTable(entries // size, entries % size,
+                        np.bincount(inverse, weights=self.critical[valid]).astype(np.int64),
+                        np.bincount(inverse, minlength=len(entries)),
+                        np.bincount(inverse, weights=np.where(known, self.score[valid], 0.0), minlength=len(entries)),
+                        np.bincount(inverse, weights=known, minlength=len(entries)).astype(np.int64))
+
+    def top(self, dimension="DBA", by="critical", k=10, boro=None, cuisine=None, minRows=1):
+        '''
+        The k values of dimension with the highest metric `by` (critical, violations or score), among the rows of boro and cuisine.
+
+        Return Attribute:
+          - Data frame with one row per value, largest first: dimension, TOTAL CRITICAL, VIOLATIONS, SCORE (mean) and ROWS WITH SCORE
+        '''
+        if dimension not in self.codes:
+            raise ValueError("dimension must be one of %s" % ", ".join(sorted(self.codes)))
+        if by not in METRICS:
+            raise ValueError("by must be one of %s" % ", ".join(sorted(METRICS)))
+        values = dict(zip(FILTERS, [boro, cuisine]))
+        filters = tuple(column for column in FILTERS if values[column] is not None)
+        prefix = 0
+        for column in filters:
+            code = self.positions[column].get(values[column])
+            if code is None:     #not in the data, nothing to rank
+                return self.frame(dimension, None, np.array([], dtype=np.int64))
+            prefix = prefix * len(self.labels[column]) + code
+        thisTable = self.table(dimension, filters)
+        entries = np.arange(len(thisTable.keys))[thisTable.entries(prefix)]
+        entries = entries[thisTable.violations[entries] >= minRows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = thisTable.scoreSum[entries] / thisTable.scoreCount[entries]
+        metric = {"critical": thisTable.critical[entries], "violations": thisTable.violations[entries], "score": mean}
+        ranked = topPositions([metric[by], thisTable.violations[entries]], self.labels[dimension][thisTable.keys[entries]], k)
+        return self.frame(dimension, thisTable, entries[ranked])
+
+    def frame(self, dimension, thisTable, entries):
+        if thisTable is None:
+            return pd.DataFrame(columns=[dimension, "TOTAL CRITICAL", "VIOLATIONS", "SCORE", "ROWS WITH SCORE"])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = thisTable.scoreSum[entries] / thisTable.scoreCount[entries]
+        return pd.DataFrame({dimension: self.labels[dimension][thisTable.keys[entries]], "TOTAL CRITICAL": thisTable.critical[entries],
+                             "VIOLATIONS": thisTable.violations[entries], "SCORE": mean, "ROWS WITH SCORE": thisTable.scoreCount[entries]},
+                            columns=[dimension, "TOTAL CRITICAL", "VIOLATIONS", "SCORE", "ROWS WITH SCORE"])
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+###################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  unittest_bulkImport.py
+#
+#  1. testing bulkFetch against a local stand-in for Yelp
+#  2. testing retries and the per link error report
+#
+###################################
+
+import matplotlib
+matplotlib.use("Agg")     #before any module of the project imports pyplot, the tests draw no window
+import unittest
+import threading
+import BaseHTTPServer
+import SocketServer
+import restaurant as rt
+import bulkImport
+
+FIXTURE_PAGE = '''<html><body>
+<h1 itemprop="name">  %s  </h1>
+<span itemprop="streetAddress">163 Duane St</span>
+<span itemprop="addressLocality">New York</span>
+<span itemprop="priceRange">$$$$</span>
+<span itemprop="telephone"> %s </span>
+<div class="biz-website"><a href="http://example.com">example.com</a></div>
+<li class="tab inline-block js-language-link selected"><span class="count">99</span></li>
+</body></html>'''
+
+FIXTURE_PAGES = {
+    "/biz/bouley-new-york-2": FIXTURE_PAGE % ("Bouley", "(212) 964-2525"),
+    "/biz/le-bernardin-new-york": FIXTURE_PAGE % ("Le Bernardin", "(212) 554-1515"),
+    "/biz/closed": "<html><body><h1>Not a restaurant page</h1></body></html>",
+}
+
+
+class FixtureHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"     #keep-alive, like the real site
+    requestCount = {}
+
+    def do_GET(self):
+        FixtureHandler.requestCount[self.path] = FixtureHandler.requestCount.get(self.path, 0) + 1
+        if self.path == "/biz/flaky" and FixtureHandler.requestCount[self.path] == 1:     #fails once, then works
+            self.reply(503, "busy")
+        elif self.path == "/biz/flaky":
+            self.reply(200, FIXTURE_PAGE % ("Flaky", "(718) 555-0000"))
+        elif self.path == "/biz/etag" and self.headers.get("If-None-Match") == '"v1"':     #revalidation of a cached page
+            self.reply(304, "")
+        elif self.path == "/biz/etag":
+            self.reply(200, FIXTURE_PAGE % ("Etag", "(718) 555-1111"), {"ETag": '"v1"'})
+        elif self.path in FIXTURE_PAGES:
+            self.reply(200, FIXTURE_PAGES[self.path])
+        else:
+            self.reply(404, "not found")
+
+    def reply(self, status, body, headers={}):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        for header in headers:
+            self.send_header(header, headers[header])
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FixtureServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class fixtureServerTest(unittest.TestCase):
+
+    '''
+    Runs the local stand-in for Yelp around every test
+    '''
+
+    def setUp(self):
+        FixtureHandler.requestCount = {}
+        self.server = FixtureServer(("127.0.0.1", 0), FixtureHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base = "http://127.0.0.1:%i" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class bulkImportTest(fixtureServerTest):
+
+    def testBulkFetch(self):
+        '''
+        Testing concurrent fetching and parsing, results keep the order of the links
+        '''
+        links = [self.base + "/biz/bouley-new-york-2", self.base + "/biz/le-bernardin-new-york"]
+        results = bulkImport.bulkFetch(links, rt.pageParser, workers=2, interval=0, backoff=0)
+        self.assertEqual([result["error"] for result in results], [None, None])
+        self.assertEqual(results[0]["info"][0:6], ('Bouley', '163 Duane St', 'New York', '$$$$', '(212) 964-2525', 'example.com'))
+        self.assertEqual(results[1]["info"][0], 'Le Bernardin')
+
+    def testErrorReport(self):
+        '''
+        Testing that failing links are reported and retried without stopping the others
+        '''
+        links = [self.base + "/biz/flaky", self.base + "/biz/missing", self.base + "/biz/closed", "www.yelp.com/biz/no-scheme"]
+        results = bulkImport.bulkFetch(links, rt.pageParser, workers=4, interval=0, backoff=0)
+        self.assertEqual(results[0]["info"][0], 'Flaky')
+        self.assertEqual(FixtureHandler.requestCount["/biz/flaky"], 2)
+        self.assertTrue(results[1]["error"].startswith("HTTPError"))
+        self.assertEqual(FixtureHandler.requestCount["/biz/missing"], 1)     #404 is not retried
+        self.assertTrue(results[2]["error"].startswith("IndexError"))
+        self.assertTrue(results[3]["error"].startswith("MissingSchema"))
+
+    def testRateLimiter(self):
+        '''
+        Testing the spacing of requests to the same host
+        '''
+        limiter = bulkImport.HostRateLimiter(0.05)
+        start = bulkImport.time.time()
+        for i in xrange(3):
+            limiter.wait(self.base + "/biz/bouley-new-york-2")
+        self.assertTrue(bulkImport.time.time() - start >= 0.1)
+
+if __name__ == '__main__':
+   unittest.main()
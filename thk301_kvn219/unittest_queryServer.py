@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+###################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  unittest_queryServer.py
+#
+#  1. testing every query of the local server
+#  2. testing many clients at the same time
+#
+###################################
+
+import matplotlib
+matplotlib.use("Agg")     #before any module of the project imports pyplot, the tests draw no window
+import os
+import json
+import shutil
+import urllib2
+import tempfile
+import unittest
+import threading
+import pandas as pd
+from OpenDataNYC import RestaurantData
+from phoneIndex import PhoneIndex
+from snapshotTable import SnapshotTable
+from keeperStore import KeeperStore
+import queryServer
+
+SAMPLE_ROWS = pd.DataFrame({
+    "DBA": ["BOULEY", "BOULEY", "BOULEY", "JOE'S PIZZA", "JOE'S PIZZA", "WOK"],
+    "PHONE": ["2129642525", "2129642525", "2129642525", "7185551111", "7185551111", "2125550000"],
+    "BORO": ["MANHATTAN", "MANHATTAN", "MANHATTAN", "BROOKLYN", "BROOKLYN", "MANHATTAN"],
+    "ZIPCODE": ["10013", "10013", "10013", "11201", "11201", "10002"],
+    "BUILDING": ["163", "163", "163", "1", "1", "9"],
+    "STREET": ["DUANE STREET", "DUANE STREET", "DUANE STREET", "MAIN STREET", "MAIN STREET", "CANAL STREET"],
+    "CUISINE DESCRIPTION": ["French", "French", "French", "Pizza", "Pizza", "Chinese"],
+    "VIOLATION DESCRIPTION": ["a", "b", "c", "d", "e", "f"],
+    "INSPECTION DATE": ["01/05/2014", "03/02/2015", "03/02/2015", "06/01/2014", "06/01/2014", "02/02/2015"],
+    "CRITICAL FLAG": ["Critical", "Critical", "Not Critical", "Critical", "Critical", "Not Critical"],
+    "SCORE": ["30", "12", "12", "25", "25", "7"],
+    "GRADE": ["C", "A", "A", "B", "B", "A"],
+    "GRADE DATE": ["01/05/2014", "03/02/2015", "03/02/2015", "06/01/2014", "06/01/2014", "02/02/2015"]})
+
+
+class queryServerTest(unittest.TestCase):
+
+    '''
+    Runs the server on the sample rows around every test
+    '''
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        keeper = KeeperStore(os.path.join(self.folder, "keeper.db"))
+        keeper.add([({"DBA_fromYelp": "Bouley", "PHONE": "2129642525"}, {"DBA": "BOULEY", "GRADE": "A"})])
+        keeper.close()
+        data = queryServer.QueryData(RestaurantData(SAMPLE_ROWS), SAMPLE_ROWS, PhoneIndex.fromFrame(SAMPLE_ROWS),
+                                     SnapshotTable.fromFrame(SAMPLE_ROWS), os.path.join(self.folder, "keeper.db"))
+        self.server = queryServer.QueryServer(("127.0.0.1", 0), data)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base = "http://127.0.0.1:%i" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.folder)
+
+    def query(self, path):
+        try:
+            answer = urllib2.urlopen(self.base + path)
+            return answer.getcode(), json.loads(answer.read())
+        except urllib2.HTTPError as thisError:
+            return thisError.code, json.loads(thisError.read())
+
+    def testQueries(self):
+        '''
+        Testing the answer of every query
+        '''
+        self.assertEqual(self.query("/health"), (200, {"rows": 6, "establishments": 3, "keeper": 1}))
+
+        status, cuisines = self.query("/cuisines/top?n=2")
+        self.assertEqual([(cuisine["CUISINE DESCRIPTION"], cuisine["violations"], cuisine["Critical"]) for cuisine in cuisines], [("French", 3, 2), ("Pizza", 2, 2)])
+
+        status, restaurants = self.query("/restaurants/top?n=2")
+        self.assertEqual([restaurant["DBA"] for restaurant in restaurants], ["BOULEY", "JOE'S PIZZA"])
+        status, restaurants = self.query("/restaurants/top?by=score&boro=MANHATTAN")
+        self.assertEqual([(restaurant["DBA"], restaurant["SCORE"]) for restaurant in restaurants], [("BOULEY", 12), ("WOK", 7)])
+        self.assertEqual(self.query("/restaurants/top?by=name")[0], 400)
+        self.assertTrue(("restaurants", 2, "critical", None, None) in self.server.data.answers)     #asked again, it is not ranked again
+        self.assertEqual(self.query("/restaurants/top?n=2")[1], self.server.data.answers[("restaurants", 2, "critical", None, None)])
+
+        status, restaurants = self.query("/top/dba?boro=MANHATTAN&by=violations")
+        self.assertEqual([(restaurant["DBA"], restaurant["VIOLATIONS"]) for restaurant in restaurants], [("BOULEY", 3), ("WOK", 1)])
+        status, cuisines = self.query("/top/cuisine?by=score&n=1")
+        self.assertEqual([(cuisine["CUISINE DESCRIPTION"], cuisine["SCORE"]) for cuisine in cuisines], [("Pizza", 25.0)])
+        self.assertEqual(self.query("/top/grade")[0], 404)
+
+        status, grid = self.query("/grid")
+        mean = dict(((cuisine, boro), grid["mean"][i][j]) for i, cuisine in enumerate(grid["cuisines"]) for j, boro in enumerate(grid["boros"]))
+        self.assertEqual(mean[("French", "MANHATTAN")], 18.0)
+        self.assertEqual(mean[("French", "BROOKLYN")], None)
+        self.assertEqual(self.query("/grid?top=1")[1]["cuisines"], ["French"])
+        status, grid = self.query("/grid?stat=p90&top=1")
+        self.assertEqual((grid["boros"], grid["p90"]), (["BROOKLYN", "MANHATTAN"], [[None, 30.0]]))
+        self.assertEqual(self.query("/grid?stat=mode")[0], 400)
+
+        status, history = self.query("/phone/(212)%20964-2525")
+        self.assertEqual(history["snapshot"]["GRADE"], "A")
+        self.assertEqual([row["VIOLATION DESCRIPTION"] for row in history["inspections"]], ["a", "b", "c"])
+        self.assertEqual(self.query("/phone/6465550000")[0], 404)
+
+        status, keeper = self.query("/keeper")
+        self.assertEqual([(restaurant["DBA_fromYelp"], restaurant["GRADE"]) for restaurant in keeper], [("Bouley", "A")])
+        self.assertEqual(self.query("/nothing")[0], 404)
+        self.assertEqual(self.query("/cuisines/top?n=many")[0], 400)
+
+    def testConcurrentClients(self):
+        '''
+        Testing many clients querying at the same time get the same answers as one client
+        '''
+        paths = ["/cuisines/top", "/restaurants/top", "/grid", "/phone/2129642525", "/keeper", "/health"]
+        expected = dict((path, self.query(path)) for path in paths)
+        answers = []
+
+        def client(i):
+            for path in paths[i % len(paths):] + paths[:i % len(paths)]:
+                answers.append((path, self.query(path)))
+
+        clients = [threading.Thread(target=client, args=(i,)) for i in xrange(16)]
+        for thisClient in clients:
+            thisClient.start()
+        for thisClient in clients:
+            thisClient.join()
+        self.assertEqual(len(answers), 16 * len(paths))
+        for path, answer in answers:
+            self.assertEqual(answer, expected[path])
+
+
+if __name__ == '__main__':
+    unittest.main()
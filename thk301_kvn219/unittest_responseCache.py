@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+###################################
+#
+#  Team:Tae Kim + Kevin Nguyen
+#
+#  unittest_responseCache.py
+#
+#  1. testing that cached pages cost no request
+#  2. testing revalidation with ETag and the size limit
+#  3. testing that workers asking for the same page fetch it once
+#
+###################################
+
+import unittest
+import shutil
+import time
+import threading
+import tempfile
+import requests
+import restaurant as rt
+from responseCache import ResponseCache
+from unittest_bulkImport import FixtureHandler, fixtureServerTest
+
+
+class responseCacheTest(fixtureServerTest):
+
+    def tearDown(self):
+        fixtureServerTest.tearDown(self)
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def cacheMaker(self, **kwargs):
+        self.folder = tempfile.mkdtemp()
+        return ResponseCache(self.folder, **kwargs)
+
+    def getter(self, thisAddress, headers):
+        return requests.get(thisAddress, headers=headers)
+
+    def testRepeatedLookup(self):
+        '''
+        Testing that a fresh page and its information are served from the cache
+        '''
+        cache = self.cacheMaker()
+        thisAddress = self.base + "/biz/bouley-new-york-2"
+        first = cache.lookup(thisAddress, self.getter, rt.pageParser)
+        second = ResponseCache(self.folder).lookup(thisAddress, self.getter, rt.pageParser)     #read back from disk
+        self.assertEqual(first[0:6], ('Bouley', '163 Duane St', 'New York', '$$$$', '(212) 964-2525', 'example.com'))
+        self.assertEqual(first, second)
+        self.assertEqual(FixtureHandler.requestCount["/biz/bouley-new-york-2"], 1)
+
+    def testRevalidation(self):
+        '''
+        Testing that an expired page is revalidated with its ETag instead of downloaded again
+        '''
+        cache = self.cacheMaker(ttl=0)
+        thisAddress = self.base + "/biz/etag"
+        first = cache.lookup(thisAddress, self.getter, rt.pageParser)
+        second = cache.lookup(thisAddress, self.getter, rt.pageParser)
+        self.assertEqual(first, second)
+        self.assertEqual(FixtureHandler.requestCount["/biz/etag"], 2)
+
+    def testEviction(self):
+        '''
+        Testing that the least recently used page is removed over the size limit
+        '''
+        cache = self.cacheMaker(maxBytes=600)
+        cache.lookup(self.base + "/biz/bouley-new-york-2", self.getter)
+        cache.lookup(self.base + "/biz/le-bernardin-new-york", self.getter)
+        self.assertEqual([entry["url"] for entry in cache.index.values()], [self.base + "/biz/le-bernardin-new-york"])
+
+    def testConcurrentLookup(self):
+        '''
+        Testing that workers looking up the same page at once fetch and store it only once
+        '''
+        cache = self.cacheMaker()
+        thisAddress = self.base + "/biz/bouley-new-york-2"
+        start = threading.Event()
+        results = []
+
+        def slowGetter(thisAddress, headers):
+            time.sleep(0.05)     #the other workers ask meanwhile
+            return self.getter(thisAddress, headers)
+
+        def worker():
+            start.wait()
+            results.append(cache.lookup(thisAddress, slowGetter, rt.pageParser))
+
+        threads = [threading.Thread(target=worker) for i in xrange(6)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(FixtureHandler.requestCount["/biz/bouley-new-york-2"], 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(cache.index.keys(), [cache.keyOf(thisAddress)])
+        self.assertEqual(ResponseCache(self.folder).lookup(thisAddress, self.getter, rt.pageParser), results[0])     #the index on disk agrees
+
+if __name__ == '__main__':
+   unittest.main()
@@ -13,11 +13,46 @@
 #  
 ###################################
 
+import matplotlib
+matplotlib.use("Agg")     #before any module of the project imports pyplot, the tests draw no window
 import unittest
 import restaurant as rt
 import sys
+import os
+import shutil
+import tempfile
 import pandas as pd
-from OpenDataNYC import RestaurantData
+from OpenDataNYC import RestaurantData, CHART_FILES
+import sourceCache
+from phoneIndex import PhoneIndex
+from keeperStore import KeeperStore
+from aggregationEngine import ViolationAggregates, shardedAggregates
+from OpenDataNYC import cleanFrame
+import deltaIngest
+import compactTable
+import reportRenderer
+from chartCache import ChartCache
+import chartCache
+from timeline import InspectionTimeline
+from snapshotTable import SnapshotTable
+import snapshotTable
+from fuzzyMatcher import TrigramIndex
+import sqlite3
+import numpy as np
+import benchmark
+import stageTimer
+import streamReader
+import frameCleaner
+from topIndex import TopIndex
+from heatGrid import SparseGrid
+import heatGrid
+import keeperRefresh
+import scoreSketch
+import json
+import threading
+import StringIO
+from responseCache import ResponseCache
+from unittest_bulkImport import FixtureServer, FixtureHandler
 
 class restaurantTest(unittest.TestCase):
 
@@ -29,15 +64,32 @@ class restaurantTest(unittest.TestCase):
     
     def testInfoFinder(self):
         '''
-        Testing input
+        Testing input, against a local stand-in for Yelp (unittest_bulkImport.py) and an empty page cache
         '''
-        thisAddress1="http://www.yelp.com/biz/bouley-new-york-2"
-        self.assertEqual(rt.infoFinder(thisAddress1)[0:6], ('Bouley', '163 Duane St', 'New York', '$$$$', '(212) 964-2525', 'davidbouley.com'))  
-        
-        thisAddress2="http://www.yelp.com/biz/le-bernardin-new-york"
-        self.assertEqual(rt.infoFinder(thisAddress2)[0:6], ('Le Bernardin', 'The Equitable Bldg155 W 51st St', 'New York', '$$$$', '(212) 554-1515', 'le-bernardin.com'))  
-           
-        
+        FixtureHandler.requestCount = {}
+        server = FixtureServer(("127.0.0.1", 0), FixtureHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        base = "http://127.0.0.1:%i" % server.server_address[1]
+        folder = tempfile.mkdtemp()
+        pageCache = rt.pageCache
+        rt.pageCache = ResponseCache(folder)
+        try:
+            thisAddress1 = base + "/biz/bouley-new-york-2"
+            self.assertEqual(rt.infoFinder(thisAddress1)[0:6], ('Bouley', '163 Duane St', 'New York', '$$$$', '(212) 964-2525', 'example.com'))
+
+            thisAddress2 = base + "/biz/le-bernardin-new-york"
+            self.assertEqual(rt.infoFinder(thisAddress2)[0:6], ('Le Bernardin', '163 Duane St', 'New York', '$$$$', '(212) 554-1515', 'example.com'))
+
+            self.assertEqual(rt.infoFinder(thisAddress1)[0], 'Bouley')     #answered by the page cache
+            self.assertEqual(FixtureHandler.requestCount, {"/biz/bouley-new-york-2": 1, "/biz/le-bernardin-new-york": 1})
+        finally:
+            rt.pageCache = pageCache
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(folder)
+
     def testCsvReader(self):
         '''
         Testing countryCsvReader function
@@ -48,6 +100,933 @@ class restaurantTest(unittest.TestCase):
         self.assertEqual(phone, '1234567890')    
         self.assertEqual(violation, 'test violation')  
           
+    def testCsvReaderCache(self):
+        '''
+        Testing the columnar cache of sourceReader
+        '''
+        folder = tempfile.mkdtemp()
+        thisfile = os.path.join(folder, 'sample.csv')
+        shutil.copy('sample_data_for_unittesting.csv', thisfile)
+        try:
+            coldResult = rt.sourceReader(thisfile)
+            self.assertIsNotNone(sourceCache.loadCache(thisfile))
+            warmResult = rt.sourceReader(thisfile)
+            self.assertEqual(coldResult.values.tolist(), warmResult.values.tolist())
+            self.assertEqual(list(coldResult.columns), list(warmResult.columns))
+            self.assertEqual(set(str(dtype) for dtype in warmResult.dtypes), set(['category']))     #codes and categories, no object per row
+            self.assertFalse(compactTable.isCompact(warmResult))
+
+            with open(thisfile, 'a') as source:     #any change of the csv invalidates the cache
+                source.write('\n')
+            self.assertIsNone(sourceCache.loadCache(thisfile))
+        finally:
+            shutil.rmtree(folder)
+
+    def testCsvReaderCompact(self):
+        '''
+        Testing the typed columns of the compact load mode
+        '''
+        thisResult = rt.sourceReader('sample_data_for_unittesting.csv', useCache=False, compact=True)
+        self.assertEqual(str(thisResult["BORO"].dtype), 'category')
+        self.assertEqual(thisResult.PHONE.values[0], 1234567890)
+        self.assertEqual(thisResult.SCORE.values[0], 6.0)
+        self.assertEqual(pd.Timestamp(thisResult["INSPECTION DATE"].values[0]), pd.Timestamp('2015-02-09'))
+
+    def testCompactMode(self):
+        '''
+        Testing the phone index, the snapshots and a delta of the compact mode against the text mode
+        '''
+        size = 200
+        data = pd.DataFrame({"DBA": [u"name%i" % (i % 30) for i in xrange(size)],
+                             "PHONE": [u"21255500%02i" % (i % 30) if i % 30 != 29 else u"__________" for i in xrange(size)],
+                             "BORO": [[u"BROOKLYN", u"QUEENS", u"BRONX"][i % 3] for i in xrange(size)],
+                             "ZIPCODE": [u"100%02i" % (i % 30) for i in xrange(size)],
+                             "CUISINE DESCRIPTION": [[u"Thai", u"Pizza"][i % 2] for i in xrange(size)],
+                             "VIOLATION DESCRIPTION": [u"violation %i" % (i % 7) for i in xrange(size)],
+                             "INSPECTION DATE": [u"%02i/%02i/2014" % (1 + i % 12, 1 + i % 5) for i in xrange(size)],
+                             "CRITICAL FLAG": [[u"Critical", u"Not Critical", u"Not Applicable"][i % 3] for i in xrange(size)],
+                             "SCORE": [u"%i" % (i % 40) for i in xrange(size)],
+                             "GRADE": [[u"A", u"B"][i % 2] for i in xrange(size)],
+                             "BUILDING": u"1", "STREET": u"MAIN STREET"})
+        data["GRADE DATE"] = data["INSPECTION DATE"]
+        delta = data.iloc[[3, 4]].copy()
+        delta["SCORE"] = u"41"     #replaces two rows
+        delta = pd.concat([delta, data.iloc[[5, 6]]], ignore_index=True)     #already stored
+        delta.loc[2, "INSPECTION DATE"] = u"12/31/2014"     #a new inspection
+
+        folder = tempfile.mkdtemp()
+        textFile = os.path.join(folder, 'text.csv')
+        compactFile = os.path.join(folder, 'compact.csv')
+        try:
+            data[streamReader.REQUIRED_COLUMNS + streamReader.ADDRESS_COLUMNS].to_csv(textFile, index=False, encoding="utf-8")
+            shutil.copy(textFile, compactFile)
+            text = rt.sourceReader(textFile)
+            compact = rt.sourceReader(compactFile, compact=True)
+            self.assertTrue(compactTable.isCompact(compact))
+            self.assertFalse(compactTable.isCompact(text))
+
+            textIndex = PhoneIndex.fromFrame(text)
+            compactIndex = PhoneIndex.fromFrame(compact)
+            self.assertEqual(len(compactIndex), len(textIndex))
+            self.assertEqual(compactIndex.rows("(212) 555-0007").tolist(), textIndex.rows("2125550007").tolist())
+            self.assertFalse("0" in compactIndex)     #a PHONE of no digits is 0 in the compact mode
+
+            textSnapshots = SnapshotTable.fromFrame(text).frame
+            compactSnapshots = SnapshotTable.fromFrame(compact).frame
+            self.assertEqual(compactSnapshots.index.tolist(), textSnapshots.index.tolist())
+            self.assertTrue(u"name29|10029" in compactSnapshots.index)
+            self.assertEqual(compactSnapshots.values.tolist(), textSnapshots.values.tolist())
+
+            textApp = RestaurantData(text)
+            textApp.require("aggregates")
+            compactApp = RestaurantData(compact)
+            compactApp.require("aggregates")
+            textUpdated, textIndex, textSnapshots, _, textReport = deltaIngest.ingestDelta(textFile, delta, text, textIndex, SnapshotTable.fromFrame(text), textApp, "delta1")
+            compactUpdated, compactIndex, compactSnapshots, _, compactReport = deltaIngest.ingestDelta(compactFile, delta, compact, compactIndex, SnapshotTable.fromFrame(compact),
+                                                                                                        compactApp, "delta1")
+            self.assertEqual(compactReport, textReport)
+            self.assertEqual((compactReport["added"], compactReport["replaced"], compactReport["unchanged"]), (1, 2, 1))
+            self.assertTrue(compactTable.isCompact(compactUpdated))
+            self.assertEqual(str(compactUpdated["BORO"].dtype), 'category')
+            columns = [column for column in text.columns if column != "PHONE"]     #"__________" is "" in the text of a compact table
+            self.assertEqual(compactTable.textFrame(compactUpdated)[columns].values.tolist(), textUpdated[columns].values.tolist())
+            self.assertEqual(sourceCache.loadCache(compactFile)[columns].values.tolist(), textUpdated[columns].values.tolist())
+            self.assertEqual(compactIndex.rows("2125550003").tolist(), textIndex.rows("2125550003").tolist())
+            self.assertEqual(compactSnapshots.frame.sort_index().values.tolist(), textSnapshots.frame.sort_index().values.tolist())
+            self.assertTrue((compactApp.aggregates.crosstab("DBA") == textApp.aggregates.crosstab("DBA")).all().all())
+        finally:
+            shutil.rmtree(folder)
+
+    def testPhoneIndex(self):
+        '''
+        Testing phone lookups against a scan of the PHONE column
+        '''
+        ratingList = pd.DataFrame({"PHONE": ["2125550000", "7185551111", "2125550000", "__________"], "DBA": ["a", "b", "c", "d"]})
+        index = PhoneIndex.fromFrame(ratingList)
+        self.assertEqual(index.lookup(ratingList, "(212) 555-0000")["DBA"].tolist(), ["a", "c"])
+        self.assertTrue(index.lookup(ratingList, "6465552222").empty)
+        self.assertEqual(index.lookupMany(ratingList, ["7185551111", "2125550000", "6465552222"])["DBA"].tolist(), ["b", "a", "c"])
+        self.assertTrue("718-555-1111" in index)
+
+    def testKeeperStore(self):
+        '''
+        Testing the migration of restaurant_list.csv and adds and deletes in the Keeper store
+        '''
+        folder = tempfile.mkdtemp()
+        try:
+            keeper = KeeperStore(os.path.join(folder, 'keeper.db'))
+            keeper.upgrade('restaurant_list.csv')
+            legacy = pd.io.parsers.read_csv('restaurant_list.csv', sep="\t", dtype=object)
+            self.assertEqual(len(keeper), len(legacy['PHONE'].unique()))
+            self.assertEqual(keeper.frame()['PHONE'].tolist(), legacy['PHONE'].unique().tolist())
+            self.assertEqual(keeper.frame()['TOTAL CRITICAL'].sum(), (legacy['CRITICAL FLAG'] == 'Critical').sum())
+            self.assertTrue(keeper.hasPhone('2127521495'))
+
+            newSnapshot = {"DBA": "TEST DBA", "SCORE": "12", "CRITICAL": 1, "NOT CRITICAL": 0, "TOTAL CRITICAL": 1, "TOTAL NOT CRITICAL": 0, "INSPECTIONS": 1}
+            keeper.add([({"DBA_fromYelp": "Test", "PHONE": "1234567890"}, newSnapshot)])
+            self.assertEqual(keeper.frame()['DBA_fromYelp'].iloc[0], 'Test')     #latest restaurant first
+            self.assertEqual(keeper.frame(phone='1234567890')['SCORE'].tolist(), ['12'])
+            self.assertEqual(keeper.flagCounts("DBA").loc["TEST DBA", "Critical"], 1)
+            app = RestaurantData(None)
+            app.keeper = keeper     #the user charts read this store, not the default one
+            self.assertEqual(app.keeperFlagCounts("DBA").loc["TEST DBA", "Critical"], 1)
+            app.plotUserRestaurantGradeAndScore(os.path.join(folder, 'user.png'), show=False)
+            self.assertTrue(os.path.exists(os.path.join(folder, 'user.png')))
+
+            keeper.delete('1234567890')
+            self.assertFalse(keeper.hasPhone('1234567890'))
+            keeper.close()
+            keeper = KeeperStore(os.path.join(folder, 'keeper.db'))
+            keeper.upgrade('restaurant_list.csv')
+            self.assertEqual(len(keeper), len(legacy['PHONE'].unique()))     #migrated only once
+            keeper.close()
+        finally:
+            shutil.rmtree(folder)
+
+    def testKeeperInspectionsMigration(self):
+        '''
+        Testing the conversion of the inspection rows of an earlier Keeper store into snapshots
+        '''
+        folder = tempfile.mkdtemp()
+        try:
+            connection = sqlite3.connect(os.path.join(folder, 'keeper.db'))
+            connection.execute('CREATE TABLE inspections (id INTEGER PRIMARY KEY AUTOINCREMENT, PHONE TEXT, DBA TEXT, BORO TEXT, ZIPCODE TEXT, "CUISINE DESCRIPTION" TEXT, "INSPECTION DATE" TEXT, "VIOLATION DESCRIPTION" TEXT, "CRITICAL FLAG" TEXT, SCORE TEXT, GRADE TEXT, "GRADE DATE" TEXT)')
+            connection.executemany('INSERT INTO inspections (PHONE, DBA, "INSPECTION DATE", "CRITICAL FLAG", SCORE, GRADE) VALUES (?, ?, ?, ?, ?, ?)',
+                                   [("1234567890", "A", "03/05/2013", "Critical", "20", "B"), ("1234567890", "A", "11/05/2012", "Critical", "9", "A"),
+                                    ("1234567890", "A", "03/05/2013", "Not Critical", "20", "B")])
+            connection.execute('CREATE TABLE snapshots (PHONE TEXT PRIMARY KEY, %s)' % ", ".join('"%s" %s' % (column, "INTEGER" if column in snapshotTable.COUNT_COLUMNS else "TEXT") for column in snapshotTable.SNAPSHOT_COLUMNS))     #without KEY
+            connection.commit()
+            connection.close()
+
+            keeper = KeeperStore(os.path.join(folder, 'keeper.db'))     #opened to read, e.g. by a chart: nothing is migrated
+            self.assertTrue(keeper.frame()["KEY"].empty)
+            self.assertTrue(keeper.hasTable("inspections"))
+            self.assertEqual(len(pd.read_sql_query("SELECT * FROM snapshots", keeper.connection)), 0)
+            keeper.upgrade(None)
+            self.assertFalse(keeper.hasTable("inspections"))
+            self.assertEqual(len(pd.read_sql_query("SELECT * FROM inspections_legacy", keeper.connection)), 3)     #the rows are kept
+            snapshot = pd.read_sql_query("SELECT * FROM snapshots", keeper.connection).iloc[0]
+            self.assertEqual((snapshot["INSPECTION DATE"], snapshot["SCORE"], snapshot["GRADE"]), ("03/05/2013", "20", "B"))
+            self.assertEqual((snapshot["CRITICAL"], snapshot["NOT CRITICAL"], snapshot["TOTAL CRITICAL"], snapshot["INSPECTIONS"]), (1, 1, 2, 2))
+            keeper.close()
+        finally:
+            shutil.rmtree(folder)
+
+    def testKeeperRefresh(self):
+        '''
+        Testing that a refresh rewrites only the restaurants whose snapshot changed and reports new violations, grades and found restaurants
+        '''
+        rows = pd.DataFrame({"DBA": ["BOULEY", "BOULEY", "BOULEY", "WOK", "TACO"], "PHONE": ["2129642525", "2129642525", "2129642525", "2125550000", "7185551111"],
+                             "BORO": ["MANHATTAN"] * 4 + ["BROOKLYN"], "ZIPCODE": ["10013"] * 3 + ["10002", "11201"],
+                             "CUISINE DESCRIPTION": ["French"] * 3 + ["Chinese", "Mexican"],
+                             "INSPECTION DATE": ["01/05/2014", "03/02/2015", "03/02/2015", "02/02/2015", "04/04/2015"],
+                             "CRITICAL FLAG": ["Critical", "Critical", "Not Critical", "Not Critical", "Critical"],
+                             "SCORE": ["30", "12", "12", "7", "20"], "GRADE": ["C", "A", "A", "A", "B"],
+                             "GRADE DATE": ["01/05/2014", "03/02/2015", "03/02/2015", "02/02/2015", "04/04/2015"]})
+        current = SnapshotTable.fromFrame(rows)
+        folder = tempfile.mkdtemp()
+        try:
+            keeper = KeeperStore(os.path.join(folder, "keeper.db"))
+            keeper.add([({"DBA_fromYelp": "Bouley", "PHONE": "2129642525"}, SnapshotTable.fromFrame(rows.iloc[:1]).lookup("2129642525")),     #before the 2015 inspection
+                        ({"DBA_fromYelp": "Wok", "PHONE": "2125550000"}, current.lookup("2125550000")),     #up to date
+                        ({"DBA_fromYelp": "Taco", "PHONE": "7185551111"}, snapshotTable.placeholderSnapshot()),
+                        ({"DBA_fromYelp": "Nowhere", "PHONE": "6465550000"}, snapshotTable.placeholderSnapshot())])
+            updates, report = keeperRefresh.refreshPlan(keeper.frame(), current)
+            self.assertEqual((report["restaurants"], report["updated"], report["unchanged"], report["missing"]), (4, 2, 1, 1))
+            changes = report["changes"].set_index("DBA_fromYelp")
+            self.assertEqual(sorted(changes.index), ["Bouley", "Taco"])
+            self.assertEqual((changes.loc["Bouley", "NEW VIOLATIONS"], changes.loc["Bouley", "NEW CRITICAL"]), (2, 1))
+            self.assertEqual((changes.loc["Bouley", "OLD GRADE"], changes.loc["Bouley", "GRADE"]), ("C", "A"))
+            self.assertTrue(changes.loc["Taco", "FOUND"])
+            self.assertFalse(changes.loc["Bouley", "FOUND"])
+
+            keeper.updateSnapshots(updates)
+            stored = keeper.frame().set_index("DBA_fromYelp")
+            self.assertEqual(stored.loc["Bouley", "GRADE"], "A")
+            self.assertEqual(stored.loc["Bouley", "TOTAL CRITICAL"], 2)
+            self.assertEqual(stored.loc["Taco", "INSPECTION DATE"], "04/04/2015")
+            self.assertEqual(stored.loc["Nowhere", "INSPECTION DATE"], "To be Updated")
+            self.assertEqual(keeperRefresh.refreshPlan(keeper.frame(), current)[1]["updated"], 0)     #nothing left to change
+
+            chosen = snapshotTable.placeholderSnapshot()
+            chosen["KEY"] = "7185551111"     #matched by name and address when it was added (snapshotFinder)
+            keeper.add([({"DBA_fromYelp": "Taco Truck", "PHONE": "9175559999"}, chosen)])
+            updates, report = keeperRefresh.refreshPlan(keeper.frame(), current)
+            self.assertEqual((report["updated"], report["missing"]), (1, 1))
+            keeper.updateSnapshots(updates)
+            stored = keeper.frame(phone="9175559999").iloc[0]
+            self.assertEqual((stored["KEY"], stored["DBA"], stored["TOTAL CRITICAL"]), ("7185551111", "TACO", 1))
+            self.assertEqual(keeper.frame(phone="2129642525")["KEY"].iloc[0], "")
+            keeper.close()
+        finally:
+            shutil.rmtree(folder)
+
+    def testKeeperInspections(self):
+        '''
+        Testing the full view: every inspection row of the Keeper restaurants with their Yelp columns
+        '''
+        rows = pd.DataFrame({"DBA": ["BOULEY", "WOK", "BOULEY"], "PHONE": ["2129642525", "2125550000", "2129642525"],
+                             "INSPECTION DATE": ["01/05/2014", "02/02/2015", "03/02/2015"], "VIOLATION DESCRIPTION": ["mice", "flies", "no soap"],
+                             "CRITICAL FLAG": ["Critical", "Not Critical", "Critical"], "GRADE": ["C", "A", "A"],
+                             "BORO": "MANHATTAN", "ZIPCODE": "10013", "CUISINE DESCRIPTION": "French", "SCORE": "12", "GRADE DATE": "03/02/2015"})
+        folder = tempfile.mkdtemp()
+        state = (rt.keeper, rt.ratingList, rt.phoneIndex, rt.snapshots)
+        try:
+            rt.keeper = KeeperStore(os.path.join(folder, "keeper.db"))
+            rt.ratingList, rt.phoneIndex, rt.snapshots = rows, PhoneIndex.fromFrame(rows), SnapshotTable.fromFrame(rows)     #read by dataLoader()
+            rt.keeper.add([({"DBA_fromYelp": "Bouley", "PHONE": "(212) 964-2525", "WEB": "davidbouley.com"}, rt.snapshots.lookup("2129642525")),
+                           ({"DBA_fromYelp": "Nowhere", "PHONE": "6465550000"}, snapshotTable.placeholderSnapshot())])
+            full = rt.keeperInspections()
+            self.assertEqual(full["DBA_fromYelp"].tolist(), ["Bouley", "Bouley", "Nowhere"])
+            self.assertEqual(full["VIOLATION DESCRIPTION"].tolist()[:2], ["mice", "no soap"])
+            self.assertEqual(full["WEB"].tolist()[:2], ["davidbouley.com"] * 2)
+            self.assertEqual(full["PHONE"].tolist(), ["(212) 964-2525", "(212) 964-2525", "6465550000"])
+            self.assertEqual(full["INSPECTION DATE"].iloc[2], "To be Updated")
+            rt.keeper.close()
+        finally:
+            rt.keeper, rt.ratingList, rt.phoneIndex, rt.snapshots = state
+            shutil.rmtree(folder)
+
+    def testSnapshotTable(self):
+        '''
+        Testing the latest inspection of every establishment against a groupby of the rows
+        '''
+        data = self.timelineSample().fillna({"BORO": "Missing"})     #as read by sourceReader, without missing values
+        data["PHONE"] = [u"21255500%02i" % (i % 60) for i in xrange(len(data))]
+        data.loc[data.index[:50], "PHONE"] = u"__________"     #no phone number, keyed by DBA and ZIPCODE
+        data["ZIPCODE"] = u"10001"
+        data["SCORE"] = [u"%i" % i for i in xrange(len(data))]
+        data["GRADE"] = u"A"
+        data["GRADE DATE"] = data["INSPECTION DATE"]
+        snapshots = SnapshotTable.fromFrame(data)
+
+        rows = data[data["PHONE"] == u"2125550007"].copy()
+        rows["DATE"] = pd.to_datetime(rows["INSPECTION DATE"])
+        latest = rows[rows["DATE"] == rows["DATE"].max()]
+        snapshot = snapshots.lookup("(212) 555-0007")
+        self.assertEqual(snapshot["INSPECTION DATE"], latest["INSPECTION DATE"].iloc[-1])
+        self.assertEqual(snapshot["SCORE"], latest["SCORE"].iloc[-1])
+        self.assertEqual(snapshot["CRITICAL"], (latest["CRITICAL FLAG"] == "Critical").sum())
+        self.assertEqual(snapshot["NOT CRITICAL"], (latest["CRITICAL FLAG"] == "Not Critical").sum())
+        self.assertEqual(snapshot["TOTAL CRITICAL"], (rows["CRITICAL FLAG"] == "Critical").sum())
+        self.assertEqual(snapshot["INSPECTIONS"], rows["DATE"].nunique())
+
+        name = data["DBA"].iloc[0]
+        self.assertEqual(snapshots.lookup(name=name, zipcode=u"10001")["TOTAL CRITICAL"],
+                         ((data["PHONE"] == u"__________") & (data["DBA"] == name) & (data["CRITICAL FLAG"] == "Critical")).sum())
+        self.assertIsNone(snapshots.lookup("6465550000"))
+        self.assertEqual(snapshots.frame["TOTAL CRITICAL"].sum(), (data["CRITICAL FLAG"] == "Critical").sum())
+
+        folder = tempfile.mkdtemp()
+        thisfile = os.path.join(folder, 'sample.csv')
+        shutil.copy('sample_data_for_unittesting.csv', thisfile)
+        try:
+            sourceCache.saveCache(thisfile, data)
+            SnapshotTable.forSource(thisfile, data)
+            stored = SnapshotTable.forSource(thisfile, None)     #read back from the cache
+            self.assertEqual(stored.lookup("2125550007"), snapshot)
+        finally:
+            shutil.rmtree(folder)
+
+    def testLazyAnalysis(self):
+        '''
+        Testing that analysis steps run on first use only and again after the data changes
+        '''
+        nyc_data = pd.DataFrame({"DBA": ["a", "b", "c", "d"], "BORO": ["QUEENS", "BRONX", "QUEENS", "Missing"],
+                                 "CUISINE DESCRIPTION": ["Pizza", "Pizza", "Chinese", "Pizza"], "CRITICAL FLAG": ["Critical", "Not Critical", "Critical", "Critical"],
+                                 "SCORE": ["10", "20", "30", "40"], "GRADE": ["A", "B", "Not Yet Graded", "C"]})
+        app = RestaurantData(nyc_data)
+        self.assertEqual(app.require("top_20_cuisines_list"), ["Pizza", "Chinese"])
+        self.assertFalse(hasattr(app, "grouped_cuisine_and_boro"))     #not needed yet
+
+        mean = app.require("identified_dirty_restaurants_mean")
+        self.assertEqual(mean.loc["Pizza", "QUEENS"], 10.0)
+        versions = dict(app.versions)
+        app.require("identified_dirty_restaurants_mean")
+        self.assertEqual(app.versions, versions)     #memoized
+
+        app.setNYCData(nyc_data.iloc[1:])
+        self.assertTrue(pd.isnull(app.require("identified_dirty_restaurants_mean").loc["Pizza", "QUEENS"]))
+
+    def aggregationSample(self, rows=500, seed=0):
+        '''
+        Random clean inspection data with missing boroughs and scores
+        '''
+        random = np.random.RandomState(seed)
+        score = random.randint(0, 40, rows).astype(float)
+        score[random.rand(rows) < 0.1] = np.nan
+        return pd.DataFrame({"DBA": random.choice(["dba%i" % i for i in xrange(30)], rows),
+                             "CUISINE DESCRIPTION": random.choice(["Pizza", "Chinese", "Latin", "Cafe"], rows),
+                             "BORO": random.choice(np.array(["QUEENS", "BRONX", "BROOKLYN", np.nan], dtype=object), rows),
+                             "CRITICAL FLAG": random.choice(["Critical", "Not Critical"], rows), "SCORE": score})
+
+    def testAggregationEngine(self):
+        '''
+        Testing the single pass aggregates against pandas crosstab and groupby
+        '''
+        data = self.aggregationSample()
+        aggregates = ViolationAggregates.fromFrame(data)
+        self.assertTrue((aggregates.crosstab("DBA").values == pd.crosstab(data["DBA"], data["CRITICAL FLAG"]).values).all())
+        self.assertEqual(aggregates.topCuisines(2), data["CUISINE DESCRIPTION"].value_counts()[:2].index.tolist())
+
+        expected = data.groupby(["CUISINE DESCRIPTION", "BORO"])["SCORE"].agg([np.mean, np.std])
+        stats = aggregates.scoreStats()
+        self.assertEqual(stats.index.tolist(), expected.index.tolist())
+        self.assertTrue(np.allclose(stats["mean"].values, expected["mean"].values))
+        self.assertTrue(np.allclose(stats["std"].values, expected["std"].values))
+
+        merged = ViolationAggregates.fromFrame(data.iloc[:200]).merge(ViolationAggregates.fromFrame(data.iloc[200:]))
+        self.assertTrue(np.allclose(merged.scoreStats()["std"].values, expected["std"].values))
+        self.assertTrue((merged.crosstab("CUISINE DESCRIPTION") == aggregates.crosstab("CUISINE DESCRIPTION")).all().all())
+
+        quantiles = aggregates.scoreQuantiles()
+        self.assertEqual(list(quantiles.columns), ["median", "p90", "p99"])
+        for (cuisine, boro), scores in data.dropna(subset=["BORO"]).groupby(["CUISINE DESCRIPTION", "BORO"])["SCORE"]:
+            scores = np.sort(scores.dropna().values)
+            expected = [scores[int(np.ceil(quantile * len(scores))) - 1] for quantile in [0.5, 0.9, 0.99]]     #nearest rank
+            self.assertEqual(list(quantiles.loc[(cuisine, boro)]), expected)
+        self.assertTrue(merged.scoreQuantiles().equals(quantiles))
+        merged.merge(ViolationAggregates.fromFrame(data.iloc[200:]), sign=-1)
+        self.assertTrue(merged.scoreQuantiles().equals(ViolationAggregates.fromFrame(data.iloc[:200]).scoreQuantiles()))
+
+    def testScoreSketch(self):
+        '''
+        Testing the quantiles of the score sketches: exact for whole scores, within 5% above 255, bounded memory
+        '''
+        scores = np.array([0, 3, 3, 7, 12, 12, 12, 40, 41, 100], dtype=np.float64)
+        histogram = np.bincount(scoreSketch.scoreBins(scores), minlength=scoreSketch.SCORE_BINS)
+        self.assertEqual(list(scoreSketch.sketchQuantiles(histogram[None, :])[0]), [12.0, 41.0, 100.0])
+        self.assertTrue(np.isnan(scoreSketch.sketchQuantiles(np.zeros((1, scoreSketch.SCORE_BINS)))).all())
+        self.assertEqual(list(scoreSketch.scoreBins([np.nan, -2, 255, 256])), [-1, 0, 255, 256])
+        large = np.array([300.0, 1000.0, 1e6])
+        values = scoreSketch.sketchQuantiles(np.bincount(scoreSketch.scoreBins(large), minlength=scoreSketch.SCORE_BINS)[None, :], [0.3, 0.6])[0]
+        self.assertTrue(np.allclose(values, large[:2], rtol=0.05))
+
+        frame = cleanFrame(benchmark.syntheticChunk(np.random.RandomState(4), 4000, 300, 0))
+        serial = ViolationAggregates.fromFrame(frame)
+        self.assertTrue(shardedAggregates(frame, workers=3, shardRows=1).scoreQuantiles().equals(serial.scoreQuantiles()))
+        self.assertEqual(serial.scoreHistogram.shape[2], scoreSketch.SCORE_BINS)     #the same size whatever the number of rows
+
+    def testShardedAggregation(self):
+        '''
+        Testing that aggregates of blocks of rows computed by worker processes equal the one pass aggregates
+        '''
+        frame = cleanFrame(benchmark.syntheticChunk(np.random.RandomState(1), 2000, 150, 0))
+        serial = ViolationAggregates.fromFrame(frame)
+        sharded = shardedAggregates(frame, workers=3, shardRows=1)
+        for dimension in serial.labels:
+            self.assertEqual(list(sharded.labels[dimension]), list(serial.labels[dimension]))
+        for name in ViolationAggregates.TABLES:
+            self.assertTrue(np.array_equal(getattr(sharded, name), getattr(serial, name)))
+        self.assertTrue(sharded.scoreStats().equals(serial.scoreStats()))
+        self.assertEqual(shardedAggregates(frame, workers=4).topCuisines(), serial.topCuisines())     #too small to split
+
+    def testStreamSummary(self):
+        '''
+        Testing that a file read in chunks gives the aggregates and snapshots of the whole file
+        '''
+        folder = tempfile.mkdtemp()
+        thisfile = os.path.join(folder, 'sample.csv')
+        try:
+            benchmark.syntheticChunk(np.random.RandomState(2), 1000, 80, 0).to_csv(thisfile, index=False)
+            summary = streamReader.streamSummary(thisfile, chunkRows=170)
+            ratingList = rt.csvParser(thisfile)
+            phones = list(pd.unique(ratingList["PHONE"].values)[:3])
+            streamed = streamReader.phoneRows(thisfile, phones, chunkRows=170)
+            sortedRows = rt.sourceReader(thisfile, useCache=False)
+        finally:
+            shutil.rmtree(folder)
+        self.assertEqual((summary.rows, summary.chunks), (len(ratingList), 6))
+        self.assertEqual(streamed.values.tolist(), sortedRows[sortedRows["PHONE"].isin(phones)].values.tolist())     #only the rows of these phones, by date
+
+        expected = TrigramIndex.fromFrame(ratingList)
+        streamedIndex = TrigramIndex.fromFrame(summary.establishments)     #one row per establishment, not every row
+        self.assertEqual(len(summary.establishments), len(expected))
+        self.assertEqual((list(streamedIndex.keys), list(streamedIndex.names), list(streamedIndex.addresses)),
+                         (list(expected.keys), list(expected.names), list(expected.addresses)))
+
+        whole = ViolationAggregates.fromFrame(cleanFrame(ratingList.copy()))
+        for dimension in ["CUISINE DESCRIPTION", "DBA"]:
+            self.assertTrue(summary.aggregates.crosstab(dimension).equals(whole.crosstab(dimension)))
+        self.assertTrue(np.allclose(summary.aggregates.scoreStats().values, whole.scoreStats().values, equal_nan=True))
+        self.assertEqual(sorted(summary.aggregates.topCuisines()), sorted(whole.topCuisines()))
+        self.assertTrue(summary.aggregates.scoreQuantiles().equals(whole.scoreQuantiles()))
+
+        snapshots = SnapshotTable.fromFrame(ratingList)
+        merged = summary.snapshots.frame.loc[snapshots.frame.index]
+        self.assertEqual(len(summary.snapshots), len(snapshots))
+        self.assertEqual(merged.values.tolist(), snapshots.frame.values.tolist())     #INSPECTIONS too, though inspections are split across chunks
+        approximate = summary.tables[0][1].frame     #SnapshotTable.merge() alone counts some split inspections twice in this file
+        self.assertTrue((approximate["INSPECTIONS"] > snapshots.frame["INSPECTIONS"].loc[approximate.index]).any())
+
+        app = RestaurantData(None)
+        app.useAggregates(summary.aggregates)
+        self.assertEqual(app.require("top_20_cuisines_list"), summary.aggregates.topCuisines(20))
+        expected = RestaurantData(ratingList).require("identified_dirty_restaurants_mean")
+        self.assertTrue(np.allclose(app.require("identified_dirty_restaurants_mean").loc[expected.index].values, expected.values, equal_nan=True))
+
+    def testStreamingViews(self):
+        '''
+        Testing the full view of the Keeper and the name and address lookup in streaming mode, where no rows are kept
+        '''
+        folder = tempfile.mkdtemp()
+        thisfile = os.path.join(folder, 'sample.csv')
+        state = (rt.thisfile, rt.streaming, rt.keeper, rt.ratingList, rt.phoneIndex, rt.snapshots, rt.establishments, rt.matcher, rt.app_user)
+        try:
+            benchmark.syntheticChunk(np.random.RandomState(4), 600, 50, 0).to_csv(thisfile, index=False)
+            rows = rt.sourceReader(thisfile, useCache=False)
+            rt.thisfile, rt.streaming, rt.app_user = thisfile, True, RestaurantData(None)
+            rt.ratingList, rt.phoneIndex, rt.snapshots, rt.establishments, rt.matcher = {}, None, None, None, None
+            rt.keeper = KeeperStore(os.path.join(folder, "keeper.db"))
+            thisPhone = rows["PHONE"].values[0]
+            rt.keeper.add([({"DBA_fromYelp": "Yelp name", "PHONE": thisPhone}, {"DBA": rows["DBA"].values[0]})])
+            full = rt.keeperInspections()
+            self.assertEqual(full["VIOLATION DESCRIPTION"].tolist(), rows[rows["PHONE"] == thisPhone]["VIOLATION DESCRIPTION"].tolist())
+            self.assertEqual(type(rt.ratingList), dict)     #still no rows kept
+
+            other = rows.iloc[np.where(rows["PHONE"].values != thisPhone)[0][0]]
+            info = (other["DBA"].title(), u"%s %s" %(other["BUILDING"], other["STREET"].title()), "New York", "$", "(000) 000-0000", "", "1")
+            chosen = rt.snapshotFinder("0000000000", info, lambda info, candidates: candidates[0]["key"])
+            self.assertEqual(chosen["KEY"], rt.matcherOpener().candidates(info[0], info[1])[0]["key"])
+            self.assertEqual(chosen["DBA"], rt.snapshots.lookupKey(chosen["KEY"])["DBA"])
+            rt.keeper.close()
+        finally:
+            rt.thisfile, rt.streaming, rt.keeper, rt.ratingList, rt.phoneIndex, rt.snapshots, rt.establishments, rt.matcher, rt.app_user = state
+            shutil.rmtree(folder)
+
+    def testDeltaIngest(self):
+        '''
+        Testing the incremental aggregates of a delta against a full recompute
+        '''
+        data = self.aggregationSample(rows=300).fillna({"BORO": "Missing"})
+        data["SCORE"] = [u"%i" % score for score in data["SCORE"].fillna(0)]
+        for column in ["ZIPCODE", "VIOLATION DESCRIPTION", "GRADE DATE", "BUILDING", "STREET"]:
+            data[column] = u"x"
+        data["GRADE"] = u"Not Yet Graded"
+        data["PHONE"] = [u"21255500%02i" % (i % 40) for i in xrange(len(data))]
+        data["INSPECTION DATE"] = [u"day%i" % i for i in xrange(len(data))]
+        data = data[rt.csvParser('sample_data_for_unittesting.csv').columns]
+
+        changed = data.iloc[:5].copy()
+        changed["CUISINE DESCRIPTION"] = u"Thai"
+        delta = pd.concat([data.iloc[[3, 10, 11]], changed], ignore_index=True)
+        delta.loc[0, "SCORE"] = u"39"     #replaced again by the later row of the same inspection
+        delta.loc[2, "PHONE"] = u"(646) 555-0000"     #new
+        added = data.iloc[[0]].copy()
+        added["INSPECTION DATE"] = u"today"
+        delta = pd.concat([delta, added], ignore_index=True)
+
+        folder = tempfile.mkdtemp()
+        thisfile = os.path.join(folder, 'sample.csv')
+        shutil.copy('sample_data_for_unittesting.csv', thisfile)
+        fileHash = sourceCache.fileHash
+        try:
+            sourceCache.saveCache(thisfile, data)
+            data = sourceCache.loadCache(thisfile)     #categoricals, as the program reads it
+            app = RestaurantData(data)
+            app.require("aggregates")
+            cacheFolder = sourceCache.cacheDirectory(thisfile)
+            for name in os.listdir(cacheFolder):
+                os.utime(os.path.join(cacheFolder, name), (1, 1))
+            sourceCache.fileHash = None     #the csv did not change, it is not read again
+
+            updated, index, snapshots, matcher, report = deltaIngest.ingestDelta(thisfile, delta, data, PhoneIndex.fromFrame(data), SnapshotTable.fromFrame(data),
+                                                                                  app, "delta1", TrigramIndex.fromFrame(data))
+            self.assertEqual((report["added"], report["replaced"], report["unchanged"]), (2, 5, 1))
+            self.assertEqual(len(updated), len(data) + 2)
+            self.assertEqual(str(updated["DBA"].dtype), 'category')
+            self.assertEqual(sourceCache.appliedDeltas(thisfile), ["delta1"])
+            self.assertEqual(sourceCache.loadCache(thisfile).values.tolist(), updated.values.tolist())
+            self.assertEqual(len(index.lookup(updated, "6465550000")), 1)
+            newValues = [column for column in data.columns if delta[column].isin(np.asarray(data[column])).all() == False]
+            self.assertEqual(sorted(newValues), ["CUISINE DESCRIPTION", "INSPECTION DATE", "PHONE"])
+            untouched = [name for name in os.listdir(cacheFolder) if os.stat(os.path.join(cacheFolder, name)).st_mtime == 1]
+            self.assertEqual(sorted(untouched), sorted("column%i_values.npy" % i for i, column in enumerate(data.columns) if column not in newValues))
+
+            rebuilt = PhoneIndex.fromFrame(updated)     #the patched indexes are the ones of the updated rows
+            self.assertEqual([index.order.tolist(), index.phones.tolist(), index.starts.tolist(), index.stops.tolist()],
+                             [rebuilt.order.tolist(), rebuilt.phones.tolist(), rebuilt.starts.tolist(), rebuilt.stops.tolist()])
+            self.assertEqual(snapshots.frame.sort_index().values.tolist(), SnapshotTable.fromFrame(updated).frame.sort_index().values.tolist())
+            rebuilt = TrigramIndex.fromFrame(updated)
+            self.assertEqual(matcher.keys.tolist(), rebuilt.keys.tolist())
+            for field in ["name", "address"]:
+                self.assertEqual([array.tolist() for array in matcher.fields[field]], [array.tolist() for array in rebuilt.fields[field]])
+            self.assertEqual(SnapshotTable.forSource(thisfile, None).frame.values.tolist(), snapshots.frame.values.tolist())
+            self.assertEqual(PhoneIndex.forSource(thisfile, None).order.tolist(), index.order.tolist())
+            self.assertEqual(TrigramIndex.forSource(thisfile, None).keys.tolist(), matcher.keys.tolist())
+
+            replacing = pd.DataFrame([dict(updated.iloc[7])])     #one changed SCORE, already a score of another row
+            replacing["SCORE"] = updated["SCORE"].iloc[8]
+            for name in os.listdir(cacheFolder):
+                os.utime(os.path.join(cacheFolder, name), (1, 1))
+            again, index, snapshots, matcher, report = deltaIngest.ingestDelta(thisfile, replacing, updated, index, snapshots, app, "delta2", matcher)
+            self.assertEqual((report["added"], report["replaced"]), (0, 1))
+            touched = [name for name in os.listdir(cacheFolder) if name.endswith(".npy") and os.stat(os.path.join(cacheFolder, name)).st_mtime != 1]
+            self.assertEqual(touched, ["column%i_codes.npy" % list(data.columns).index("SCORE")])
+            self.assertEqual(sourceCache.loadCache(thisfile).values.tolist(), again.values.tolist())
+            sourceCache.fileHash = fileHash
+            updated = again
+
+            expected = ViolationAggregates.fromFrame(cleanFrame(updated))
+            self.assertFalse(app.isStale("aggregates"))
+            self.assertTrue((app.aggregates.crosstab("DBA") == expected.crosstab("DBA")).all().all())
+            self.assertTrue((app.aggregates.crosstab("CUISINE DESCRIPTION") == expected.crosstab("CUISINE DESCRIPTION")).all().all())
+            self.assertEqual(app.require("top_20_cuisines_list"), expected.topCuisines(20))
+            stats = app.require("cuisine_and_boro_group")
+            self.assertEqual(stats.index.tolist(), expected.scoreStats().index.tolist())
+            self.assertTrue(np.allclose(stats.values, expected.scoreStats().values, equal_nan=True))
+        finally:
+            sourceCache.fileHash = fileHash
+            shutil.rmtree(folder)
+
+    def testDeltaLoaderWithoutCache(self):
+        '''
+        Testing that the snapshots and the name index come from the updated rows when the cache could not be saved
+        '''
+        folder = tempfile.mkdtemp()
+        thisfile = os.path.join(folder, 'sample.csv')
+        deltaFile = os.path.join(folder, 'delta.csv')
+        shutil.copy('sample_data_for_unittesting.csv', thisfile)
+        delta = rt.csvParser(thisfile)
+        delta["PHONE"] = u"6465550000"
+        delta["DBA"] = u"NEW PLACE"
+        delta.to_csv(deltaFile, index=False, encoding="utf-8")
+        state = (rt.thisfile, rt.ratingList, rt.phoneIndex, rt.snapshots, rt.matcher, rt.sourceCached, rt.app_user, sourceCache.saveCache, sourceCache.appendCache)
+        try:
+            rt.thisfile, rt.phoneIndex, rt.snapshots, rt.matcher, rt.app_user = thisfile, None, None, None, RestaurantData(None)
+            rt.dataLoader()     #the cache and its snapshots are saved
+            self.assertIsNotNone(sourceCache.loadArrays(thisfile, "snapshots"))
+            sourceCache.saveCache = sourceCache.appendCache = lambda *arguments: False     #e.g. a full disk
+            rt.deltaLoader(deltaFile)
+            self.assertFalse(rt.sourceCached)
+            self.assertIsNotNone(rt.snapshots.lookup("6465550000"))
+            self.assertEqual(rt.matcherOpener().candidates(u"NEW PLACE", limit=1)[0]["key"], u"6465550000")
+            self.assertEqual(len(rt.phoneIndex.lookup(rt.ratingList, "6465550000")), 1)
+        finally:
+            rt.thisfile, rt.ratingList, rt.phoneIndex, rt.snapshots, rt.matcher, rt.sourceCached, rt.app_user, sourceCache.saveCache, sourceCache.appendCache = state
+            shutil.rmtree(folder)
+
+    def testReportRenderer(self):
+        '''
+        Testing the headless rendering of charts by worker processes
+        '''
+        folder = tempfile.mkdtemp()
+        try:
+            charts = ["AssessPopularRestaurantsViolations", "AssessPopularCuisinesViolations"]
+            results = reportRenderer.reportRenderer(RestaurantData(self.aggregationSample()), charts, folder, "png", workers=2)
+            self.assertEqual([result["chart"] for result in results], charts)
+            self.assertEqual([result["error"] for result in results], [None, None])
+            self.assertEqual(sorted(os.listdir(folder)), ["AssessPopularCuisinesViolations.png", "AssessPopularRestaurantsViolations.png"])
+            self.assertRaises(ValueError, reportRenderer.reportRenderer, RestaurantData(None), charts, folder, "gif")
+        finally:
+            shutil.rmtree(folder)
+
+    def testChartCache(self):
+        '''
+        Testing that a chart of unchanged data is served from the cache and a data change renders it again
+        '''
+        folder = tempfile.mkdtemp()
+        try:
+            app = RestaurantData(self.aggregationSample(), ChartCache(os.path.join(folder, "charts")))
+            outputPath = os.path.join(folder, "cuisines.png")
+            app.AssessPopularCuisinesViolations(outputPath, show=False)
+            trends = app.aggregates.crosstab("CUISINE DESCRIPTION").loc[sorted(app.top_20_cuisines_list)]
+            cached = app.chart_cache.fetch(app.chartKey("AssessPopularCuisinesViolations", trends, outputPath), "png")
+            self.assertIsNotNone(cached)
+            with open(cached, "wb") as chart:     #mark the cached file to see where the next chart comes from
+                chart.write(b"cached")
+
+            app.AssessPopularCuisinesViolations(outputPath, show=False)
+            with open(outputPath, "rb") as chart:
+                self.assertEqual(chart.read(), b"cached")
+
+            app.setNYCData(self.aggregationSample(seed=1))
+            app.AssessPopularCuisinesViolations(outputPath, show=False)
+            with open(outputPath, "rb") as chart:
+                self.assertNotEqual(chart.read(), b"cached")
+
+            keys = [app.chartKey(chart, trends, outputPath) for chart in sorted(CHART_FILES)]
+            self.assertEqual(len(set(keys)), len(keys))
+            self.assertEqual(keys, [app.chartKey(chart, trends, outputPath) for chart in sorted(CHART_FILES)])
+            edited = self.editedKeys(app.chartSaver.__wrapped__, app, trends, outputPath)
+            self.assertTrue(all(key != editedKey for key, editedKey in zip(keys, edited)))     #every chart is saved by chartSaver
+        finally:
+            shutil.rmtree(folder)
+
+    def editedKeys(self, helper, app, frame, outputPath):
+        '''
+        Keys of every chart while the source code of helper reads as if it had been edited
+        '''
+        getsource = chartCache.inspect.getsource
+        chartCache.inspect.getsource = lambda function: getsource(function) + ("#edited" if function == helper else "")
+        try:
+            return [app.chartKey(chart, frame, outputPath) for chart in sorted(CHART_FILES)]
+        finally:
+            chartCache.inspect.getsource = getsource
+
+    def testChronologicalOrder(self):
+        '''
+        Testing that sourceReader sorts by date, not by MM/DD/YYYY text
+        '''
+        folder = tempfile.mkdtemp()
+        thisfile = os.path.join(folder, 'sample.csv')
+        try:
+            sample = pd.read_csv('sample_data_for_unittesting.csv', dtype='unicode')
+            sample = pd.concat([sample] * 3, ignore_index=True)
+            sample["INSPECTION DATE"] = ["2/9/15", "10/1/14", "1/5/15"]
+            sample.to_csv(thisfile, index=False)
+            self.assertEqual(rt.sourceReader(thisfile, useCache=False)["INSPECTION DATE"].tolist(), ["10/1/14", "1/5/15", "2/9/15"])
+        finally:
+            shutil.rmtree(folder)
+
+    def timelineSample(self, rows=2000, seed=0):
+        '''
+        aggregationSample with unsorted inspection dates over two years
+        '''
+        data = self.aggregationSample(rows, seed)
+        days = np.random.RandomState(seed).randint(0, 730, rows)
+        data["INSPECTION DATE"] = [(pd.Timestamp("2013-01-01") + pd.Timedelta(days=int(day))).strftime("%m/%d/%Y") for day in days]
+        return data
+
+    def testTimeline(self):
+        '''
+        Testing date range queries and trends against boolean masks and groupby
+        '''
+        data = self.timelineSample()
+        dates = pd.to_datetime(data["INSPECTION DATE"])
+        timeline = InspectionTimeline.fromFrame(data)
+        window = timeline.window(data, "2013-03-15", "2013-06-30")
+        expected = data[(dates >= pd.Timestamp("2013-03-15")) & (dates <= pd.Timestamp("2013-06-30"))]
+        self.assertEqual(sorted(window.index.tolist()), expected.index.tolist())
+        self.assertEqual(len(timeline.window(data, "2016-01-01")), 0)
+        start, end = timeline.lastDays(90)
+        self.assertEqual(pd.Timestamp(end), dates.max())
+        self.assertEqual(len(timeline.window(data, start, end)), (dates > dates.max() - pd.Timedelta(days=90)).sum())
+
+        trends = timeline.monthlyTrends(data, "2013-02-01", "2014-06-30")
+        inWindow = data[(dates >= pd.Timestamp("2013-02-01")) & (dates <= pd.Timestamp("2014-06-30"))].copy()
+        inWindow["MONTH"] = [pd.Timestamp(date.year, date.month, 1) for date in pd.to_datetime(inWindow["INSPECTION DATE"])]
+        grouped = inWindow.groupby(["CUISINE DESCRIPTION", "BORO", "MONTH"])
+        self.assertEqual(trends.index.tolist(), grouped["SCORE"].mean().index.tolist())
+        self.assertTrue(np.allclose(trends["mean"].values, grouped["SCORE"].mean().values, equal_nan=True))
+        self.assertTrue(np.allclose(trends["critical_rate"].values, grouped["CRITICAL FLAG"].apply(lambda flags: (flags == "Critical").mean()).values))
+
+        rolling = timeline.rollingTrends(data, days=30)
+        day = pd.Timestamp("2014-05-20")
+        recent = data[(dates > day - pd.Timedelta(days=30)) & (dates <= day)]
+        recent = recent[(recent["CUISINE DESCRIPTION"] == "Pizza") & (recent["BORO"] == "QUEENS")]
+        self.assertTrue(np.isclose(rolling["mean"].loc[day, ("Pizza", "QUEENS")], recent["SCORE"].mean()))
+        self.assertTrue(np.isclose(rolling["critical_rate"].loc[day, ("Pizza", "QUEENS")], (recent["CRITICAL FLAG"] == "Critical").mean()))
+
+    def testFuzzyMatcher(self):
+        '''
+        Testing name and address candidates of a restaurant whose phone number is not in the data
+        '''
+        ratingList = pd.DataFrame({"PHONE": [u"2129642525", u"2129642525", u"2125541515", u"7185550000", u"__________"],
+                                   "DBA": [u"BOULEY", u"BOULEY", u"LE BERNARDIN", u"BOULEY BAKERY", u"DUANE PARK CAFE"],
+                                   "BUILDING": [u"163", u"163", u"155", u"130", u"157"],
+                                   "STREET": [u"DUANE STREET", u"DUANE STREET", u"WEST   51 STREET", u"WEST BROADWAY", u"DUANE STREET"],
+                                   "ZIPCODE": [u"10013", u"10013", u"10019", u"10013", u"10013"]})
+        index = TrigramIndex.fromFrame(ratingList)
+        self.assertEqual(len(index), 4)
+        candidates = index.candidates("Bouley", "163 Duane St")
+        self.assertEqual([candidate["key"] for candidate in candidates[:2]], [u"2129642525", u"7185550000"])
+        self.assertTrue(candidates[0]["score"] > candidates[1]["score"])
+        self.assertEqual(index.candidates("Le Bernardin", "155 W 51st St", limit=1)[0]["DBA"], u"LE BERNARDIN")
+        self.assertEqual(index.candidates("Duane Park Cafe", "157 Duane St New York, NY 10013", limit=1)[0]["key"], u"DUANE PARK CAFE|10013")
+        self.assertEqual(index.candidates("zzz"), [])
+
+    def testFrameCleaner(self):
+        '''
+        Testing the rule table cleans only its columns, like the replace() of every cell did, for text and category columns
+        '''
+        latin = "Latin (Cuban, Dominican, Puerto Rican, South & Central American)"
+        rows = pd.DataFrame({"DBA": ["Missing", "WOK", "TACO"], "BORO": ["MANHATTAN", "Missing", "BRONX"],
+                             "CUISINE DESCRIPTION": [latin, "Chinese", latin], "CRITICAL FLAG": ["Critical", "Not Critical", "Not Applicable"],
+                             "SCORE": ["12", "7", "n/a"], "GRADE": ["A", "Not Yet Graded", np.nan]}, columns=["DBA", "BORO", "CUISINE DESCRIPTION", "CRITICAL FLAG", "SCORE", "GRADE"])
+        before = rows.copy()
+        clean = cleanFrame(rows)
+        self.assertTrue((rows.fillna("") == before.fillna("")).all().all())
+        self.assertEqual(list(clean.columns), list(rows.columns))
+        self.assertEqual(list(clean["DBA"]), ["Missing", "WOK", "TACO"])
+        self.assertEqual(list(clean["BORO"].fillna("?")), ["MANHATTAN", "?", "BRONX"])
+        self.assertEqual(list(clean["CUISINE DESCRIPTION"]), ["Latin", "Chinese", "Latin"])
+        self.assertEqual(list(clean["GRADE"].fillna("?")), ["A", "?", "?"])
+        self.assertEqual(clean["SCORE"].dtype, np.float64)
+        self.assertEqual(list(clean["SCORE"].fillna(-1)), [12.0, 7.0, -1.0])
+
+        categories = rows.copy()
+        for column in ["BORO", "CUISINE DESCRIPTION", "GRADE"]:
+            categories[column] = categories[column].astype("category")
+        compact = cleanFrame(categories)
+        self.assertEqual(str(compact["CUISINE DESCRIPTION"].dtype), "category")
+        self.assertEqual(list(compact["CUISINE DESCRIPTION"].cat.categories), ["Chinese", "Latin"])
+        self.assertTrue((compact.astype(object).fillna("") == clean.astype(object).fillna("")).all().all())
+        self.assertEqual(list(frameCleaner.cleanFrame(rows, [("DBA", "missing", ["Missing"])])["DBA"].fillna("?")), ["?", "WOK", "TACO"])
+
+        app = RestaurantData(rows)
+        app.require("flags")
+        self.assertEqual(list(app.clean_nyc_restaurant_data["Critical"]), [1, 0, 0])
+        self.assertEqual(list(app.clean_nyc_restaurant_data["Non-Critical"]), [0, 1, 0])
+
+    def testTopIndex(self):
+        '''
+        Testing the top-K queries against a full groupby and sort, with and without filters
+        '''
+        frame = cleanFrame(benchmark.syntheticChunk(np.random.RandomState(2), 3000, 200, 0))
+        index = TopIndex.fromFrame(frame)
+        frame["TOTAL CRITICAL"] = (frame["CRITICAL FLAG"] == "Critical").astype(int)
+
+        def expected(dimension, by, k, rows, minRows=1):
+            grouped = rows.groupby(dimension)
+            counts = pd.DataFrame({"TOTAL CRITICAL": grouped["TOTAL CRITICAL"].sum(), "VIOLATIONS": grouped.size(), "SCORE": grouped["SCORE"].mean()})
+            counts = counts[counts["VIOLATIONS"] >= minRows]
+            metric = counts[{"critical": "TOTAL CRITICAL", "violations": "VIOLATIONS", "score": "SCORE"}[by]]
+            return sorted(counts.index, key=lambda label: (-metric[label], -counts["VIOLATIONS"][label], label))[:k]
+
+        self.assertEqual(list(index.top("DBA", "critical", 15)["DBA"]), expected("DBA", "critical", 15, frame))
+        self.assertEqual(list(index.top("ZIPCODE", "violations", 5)["ZIPCODE"]), expected("ZIPCODE", "violations", 5, frame))
+        self.assertEqual(list(index.top("BORO", "score", 3)["BORO"]), expected("BORO", "score", 3, frame))
+        rows = frame[(frame["BORO"] == "BROOKLYN") & (frame["CUISINE DESCRIPTION"] == "Pizza")]
+        top = index.top("DBA", "critical", 50, "BROOKLYN", "Pizza")
+        self.assertEqual(list(top["DBA"]), expected("DBA", "critical", 50, rows))
+        self.assertEqual(list(top["VIOLATIONS"]), [len(rows[rows["DBA"] == name]) for name in top["DBA"]])
+        rows = frame[frame["CUISINE DESCRIPTION"] == "Chinese"]
+        self.assertEqual(list(index.top("DBA", "score", 10, cuisine="Chinese", minRows=5)["DBA"]), expected("DBA", "score", 10, rows, 5))
+        self.assertEqual(len(index.top("DBA", "critical", 10, "ATLANTIS")), 0)
+        self.assertRaises(ValueError, index.top, "GRADE")
+
+        aggregates = ViolationAggregates.fromFrame(frame)
+        old = aggregates.crosstab("DBA").sort(["Critical", "Not Critical"], ascending=False)[:20]
+        self.assertTrue(aggregates.topRows("DBA", 20).equals(old))
+
+    def testHeatGrid(self):
+        '''
+        Testing the sparse grids against a dense groupby, by month and from the aggregates, and the heatmap of any two dimensions
+        '''
+        frame = cleanFrame(benchmark.syntheticChunk(np.random.RandomState(3), 3000, 300, 0))
+        grid = SparseGrid.fromFrame(frame, "ZIPCODE", "CUISINE DESCRIPTION")
+        expected = frame.groupby(["ZIPCODE", "CUISINE DESCRIPTION"])["SCORE"].agg(["size", "mean"])
+        cells = grid.cells().set_index(["ZIPCODE", "CUISINE DESCRIPTION"])
+        self.assertEqual(cells.index.tolist(), expected.index.tolist())
+        self.assertEqual(cells["ROWS"].tolist(), expected["size"].tolist())
+        self.assertTrue(np.allclose(cells["MEAN"].values, expected["mean"].values, equal_nan=True))
+        self.assertTrue(len(grid) < len(grid.rowLabels) * len(grid.columnLabels))     #most cells are empty
+        masked = grid.masked(3)
+        self.assertTrue((masked.count >= 3).all())
+        self.assertEqual(len(masked), (grid.count >= 3).sum())
+        self.assertEqual(list(masked.rowLabels), sorted(set(grid.rowLabels[grid.rows[grid.count >= 3]])))
+
+        months = SparseGrid.fromFrame(frame, "CUISINE DESCRIPTION", "MONTH")
+        self.assertEqual(list(months.columnLabels), sorted(set(date[6:10] + "-" + date[:2] for date in frame["INSPECTION DATE"])))
+        self.assertEqual(months.size.sum(), len(frame))
+
+        aggregated = SparseGrid.fromAggregates(ViolationAggregates.fromFrame(frame))
+        self.assertTrue(aggregated.cells().equals(SparseGrid.fromFrame(frame).cells()))
+        self.assertEqual(list(aggregated.restricted(["Pizza", "Chinese"]).rowLabels), ["Chinese", "Pizza"])
+
+        folder = tempfile.mkdtemp()
+        try:
+            app = RestaurantData(frame)
+            app.RiskyHotSpots(os.path.join(folder, "zipcode.png"), show=False, rows="ZIPCODE", columns="CUISINE DESCRIPTION", top=None, minCount=2)
+            app.RiskyHotSpots(os.path.join(folder, "month.png"), show=False, columns="MONTH")
+            app.RiskyHotSpots(os.path.join(folder, "Heatmap.png"), show=False)
+            self.assertEqual(sorted(os.listdir(folder)), ["Heatmap.png", "month.png", "zipcode.png"])
+
+            app.chart_cache = ChartCache(os.path.join(folder, "charts"))
+            outputPath = os.path.join(folder, "Heatmap.png")
+            keys = self.editedKeys(None, app, grid.cells(), outputPath)
+            heatmap = sorted(CHART_FILES).index("RiskyHotSpots")
+            for helper in [heatGrid.gridPlotter, heatGrid.tickLabels]:     #drawing helpers of the heatmap in heatGrid.py
+                edited = self.editedKeys(helper, app, grid.cells(), outputPath)
+                self.assertEqual([key == editedKey for key, editedKey in zip(keys, edited)], [i != heatmap for i in xrange(len(keys))])
+        finally:
+            shutil.rmtree(folder)
+
+    def testBenchmark(self):
+        '''
+        Testing the synthetic data and the regression check of the benchmark
+        '''
+        self.assertEqual([benchmark.rowCount(size) for size in ["100k", "1M", "2.5k", "300"]], [100000, 1000000, 2500, 300])
+        chunk = benchmark.syntheticChunk(np.random.RandomState(0), 1000, 100, 0)
+        self.assertEqual(list(chunk.columns), benchmark.SOURCE_COLUMNS)
+        self.assertEqual(len(chunk), 1000)
+        self.assertEqual(len(cleanFrame(chunk.copy())), 1000)
+        self.assertTrue((benchmark.syntheticChunk(np.random.RandomState(0), 1000, 100, 0) == chunk).all().all())
+        baseline = {"results": {"1M": {"stages": {"load": 1.0, "plot": 0.01, "lookup": 2.0}}}}
+        document = {"results": {"1M": {"stages": {"load": 1.5, "plot": 0.05, "lookup": 2.1}}, "10M": {"stages": {"load": 9.0}}}}
+        self.assertEqual(benchmark.regressionFinder(document, baseline), [("1M", "load", 1.0, 1.5)])
+        self.assertEqual(benchmark.regressionFinder(document, baseline, tolerance=1.0), [])
+
+    def testStageTimer(self):
+        '''
+        Testing the timing of the analysis steps and of decorated functions
+        '''
+        @stageTimer.stage("sample stage")
+        def sample(rows):
+            return pd.DataFrame({"A": range(rows)})
+
+        nyc_data = pd.DataFrame({"DBA": ["a", "b", "c"], "BORO": ["QUEENS", "BRONX", "QUEENS"], "CUISINE DESCRIPTION": ["Pizza", "Pizza", "Chinese"],
+                                 "CRITICAL FLAG": ["Critical", "Not Critical", "Critical"], "SCORE": ["10", "20", "30"], "GRADE": ["A", "B", "C"]})
+        folder = tempfile.mkdtemp()
+        try:
+            sample(3)
+            self.assertEqual(stageTimer.recorder.records, [])     #off by default
+            stageTimer.enable("json", os.path.join(folder, "stages.jsonl"))
+            try:
+                sample(4)
+                with stageTimer.measure("outer") as outer:
+                    RestaurantData(nyc_data).require("clean_nyc_restaurant_data")
+                    outer.rows = 1
+            finally:
+                stageTimer.disable()
+            sample(5)
+            with open(os.path.join(folder, "stages.jsonl")) as stages:
+                records = [json.loads(line) for line in stages]
+        finally:
+            shutil.rmtree(folder)
+        self.assertEqual([record["stage"] for record in records], ["sample stage", "step: clean_nyc_restaurant_data", "outer"])
+        self.assertEqual([record["rows"] for record in records], [4, 3, 1])
+        self.assertEqual(records[1]["parent"], "outer")
+        self.assertEqual(records[1]["depth"], 1)
+        for record in records:
+            self.assertTrue(record["wall"] >= 0 and record["cpu"] >= 0)
+
+        recorder = stageTimer.StageRecorder()
+        recorder.mode = "table"
+        for wall in [1.0, 2.0]:
+            recorder.record({"stage": "a", "wall": wall, "cpu": 0.5, "rows": 10, "peak_mb": wall * 100})
+        recorder.record({"stage": "b", "wall": 0.5, "cpu": 0.5, "rows": None, "peak_mb": None})
+        summary = recorder.summary()
+        self.assertEqual([(total["stage"], total["calls"], total["wall"], total["rows"], total["peak_mb"]) for total in summary],
+                         [("a", 2, 3.0, 20, 200.0), ("b", 1, 0.5, None, None)])
+
+        entered = [threading.Event(), threading.Event()]
+        def worker(name, mine, other):     #two stages in two threads at the same time, each with a stage inside
+            with stageTimer.measure(name):
+                entered[mine].set()
+                entered[other].wait(5)
+                with stageTimer.measure(name + " inner"):
+                    pass
+        stageTimer.enable("table")
+        try:
+            threads = [threading.Thread(target=worker, args=("first", 0, 1)), threading.Thread(target=worker, args=("second", 1, 0))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            records = dict((record["stage"], record) for record in stageTimer.recorder.records)
+        finally:
+            stageTimer.disable()
+            del stageTimer.recorder.records[:]
+        self.assertEqual((records["first inner"]["parent"], records["second inner"]["parent"]), ("first", "second"))
+        self.assertEqual([records[name]["depth"] for name in ["first", "second", "first inner", "second inner"]], [0, 0, 1, 1])
+
+    def testCommands(self):
+        '''
+        Testing the commands of the batch mode and the options of the menu loop
+        '''
+        self.assertEqual(rt.commandSplitter(["add", "http://a", "http://b", ";", "render", "charts", "png;", "print"]),
+                         [("command 1", ["add", "http://a", "http://b"]), ("command 2", ["render", "charts", "png"]), ("command 3", ["print"])])
+        folder = tempfile.mkdtemp()
+        state = (rt.keeper, rt.ratingList, rt.phoneIndex, rt.snapshots)
+        try:
+            rows = rt.csvParser('sample_data_for_unittesting.csv')
+            rt.ratingList, rt.phoneIndex, rt.snapshots = rows, PhoneIndex.fromFrame(rows), SnapshotTable.fromFrame(rows)     #read by dataLoader()
+            with open(os.path.join(folder, "commands.txt"), "w") as commandFile:
+                commandFile.write("# my commands\nprint full\n\nreset\nprint 'quick'\n")
+            commandFile = os.path.join(folder, "commands.txt")
+            self.assertEqual(rt.commandReader(commandFile), [(commandFile + " line 2", ["print", "full"]), (commandFile + " line 4", ["reset"]),
+                                                             (commandFile + " line 5", ["print", "quick"])])
+
+            rt.keeper = KeeperStore(os.path.join(folder, "keeper.db"))
+            rt.keeper.add([({"DBA_fromYelp": "Test", "PHONE": "1234567890"}, {"DBA": "TEST DBA"})])
+            self.assertTrue(rt.batchRunner(rt.commandSplitter(["print", "full;", "reset;", "option", "7"])))
+            self.assertEqual(len(rt.keeper), 0)
+            self.assertFalse(rt.batchRunner(rt.commandSplitter(["print;", "fly;", "reset"])))
+            rt.keeper.add([({"DBA_fromYelp": "Test", "PHONE": "1234567890"}, {"DBA": "TEST DBA"})])
+            self.assertFalse(rt.batchRunner(rt.commandSplitter(["reset;", "fly;", "print"])))
+            self.assertEqual(len(rt.keeper), 1)     #nothing runs when a command is unknown
+
+            with open(commandFile, "w") as thisFile:
+                thisFile.write("print full\n\nheatmap fly boro\nreset\n")
+            output = StringIO.StringIO()
+            stdout, sys.stdout = sys.stdout, output
+            try:
+                succeeded = rt.batchRunner(rt.commandReader(commandFile))
+            finally:
+                sys.stdout = stdout
+            self.assertFalse(succeeded)
+            self.assertEqual(len(rt.keeper), 0)     #the commands after a failed one still run
+            self.assertTrue("%s line 3: heatmap fly boro ---> KeyError" %commandFile in output.getvalue())
+            self.assertTrue("1 of 3 commands failed" in output.getvalue())
+            self.assertFalse(rt.optionPicker(0))
+            self.assertTrue(rt.optionPicker(42))
+            rt.keeper.close()
+        finally:
+            rt.keeper, rt.ratingList, rt.phoneIndex, rt.snapshots = state
+            shutil.rmtree(folder)
+
     def testClassInstance(self):
          '''Test if RestaurantClass is an instance of the class.'''
          self.assertIsInstance(self.RestaurantClass, RestaurantData)